@@ -0,0 +1,6 @@
+"""Kazoo benchmarks
+
+Benchmarks of kazoo's internals, each module can be run on its own with
+``python -m kazoo.bench.<module>``. They need Python 2.7 or above.
+
+"""
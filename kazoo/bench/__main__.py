@@ -0,0 +1,5 @@
+import sys
+
+from kazoo.bench.load import main
+
+main(sys.argv[1:])
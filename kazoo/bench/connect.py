@@ -0,0 +1,69 @@
+"""Benchmark of connection establishment past unresponsive hosts
+
+Connects to a host list starting with blackholed local ports (which
+never accept a connection, like a host that went away) followed by a
+listening one, trying the hosts one at a time the way the connection
+did before ``connection_stagger``, and racing them with
+``create_first_connection``.
+
+Run as::
+
+    python -m kazoo.bench.connect [timeout] [stagger]
+
+"""
+from __future__ import print_function
+
+import socket
+import sys
+import time
+
+from kazoo.handlers.threading import SequentialThreadingHandler
+from kazoo.tests.util import Blackhole
+
+
+def one_at_a_time(handler, hosts, timeout):
+    for address in hosts:
+        try:
+            return handler.create_connection(address, timeout), address
+        except socket.error:
+            pass
+    raise socket.error('no host accepted the connection')
+
+
+def first_to_accept(handler, hosts, timeout, stagger):
+    return handler.create_first_connection(hosts, timeout, stagger)
+
+
+def timed(func, *args):
+    start = time.time()
+    sock, address = func(*args)
+    elapsed = time.time() - start
+    sock.close()
+    return elapsed
+
+
+def main(args):
+    timeout = float(args[0]) if args else 2.0
+    stagger = float(args[1]) if len(args) > 1 else 0.25
+    handler = SequentialThreadingHandler()
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(50)
+    blackholes = [Blackhole() for i in range(3)]
+    try:
+        print('%12s %18s %18s' % (
+            'dead hosts', 'one at a time ms', 'first to accept ms'))
+        for dead in range(len(blackholes) + 1):
+            hosts = ([blackhole.address for blackhole in blackholes[:dead]] +
+                     [listener.getsockname()])
+            old = timed(one_at_a_time, handler, hosts, timeout)
+            new = timed(first_to_accept, handler, hosts, timeout, stagger)
+            print('%12d %18.1f %18.1f' % (dead, old * 1e3, new * 1e3))
+    finally:
+        for blackhole in blackholes:
+            blackhole.close()
+        listener.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
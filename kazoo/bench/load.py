@@ -0,0 +1,445 @@
+"""Load generation and latency benchmark
+
+Runs a mix of create, get, set, delete, exists and get_children
+requests from several clients against a ZooKeeper ensemble, and prints
+the throughput and latency percentiles of each run as JSON.
+
+Requests are sent one at a time and waited for (``sync``), kept
+``--depth`` deep in flight per client (``async``), or grouped
+``--batch`` at a time into a transaction for the writes and a
+``get_many``/``get_children_many`` for the reads (``transaction``).
+Every client works on nodes of its own, so requests don't fail for
+racing each other.
+
+The ensemble is a :class:`~kazoo.testing.server.StandInZooKeeper`
+started in-process unless ``--hosts`` is given, or ``--harness`` to
+use the test harness cluster (a real one when ``ZOOKEEPER_PATH`` or
+``ZOOKEEPER_CLASSPATH`` is set).
+
+Run as::
+
+    python -m kazoo.bench [--clients N] [--handler threading,gevent]
+                          [--mode sync,async,transaction]
+                          [--mix get=4,set=2] [--ops N | --duration S]
+
+A run is made for each combination of the given handlers and modes.
+Like the other benchmarks it needs Python 2.7 or above.
+
+"""
+from __future__ import print_function
+
+import argparse
+import importlib
+import json
+import random
+import sys
+import uuid
+
+from kazoo.client import KazooClient
+from kazoo.exceptions import ZookeeperError
+from kazoo.protocol.stats import LATENCY_BUCKETS, LatencyHistogram, now
+
+OPS = ('create', 'get', 'set', 'delete', 'exists', 'get_children')
+
+DEFAULT_MIX = 'create=1,get=4,set=2,delete=1,exists=1,get_children=1'
+
+MODES = ('sync', 'async', 'transaction')
+
+HANDLERS = {
+    'threading': ('kazoo.handlers.threading', 'SequentialThreadingHandler'),
+    'gevent': ('kazoo.handlers.gevent', 'SequentialGeventHandler'),
+    'eventlet': ('kazoo.handlers.eventlet', 'SequentialEventletHandler'),
+}
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def parse_mix(mix):
+    """Parse ``op=weight,...`` into a list of (op, weight)"""
+    weights = []
+    for item in mix.split(','):
+        op, _, weight = item.strip().partition('=')
+        if op not in OPS:
+            raise ValueError('unknown operation %r, expected one of %s' % (
+                op, ', '.join(OPS)))
+        weight = float(weight) if weight else 1.0
+        if weight < 0:
+            raise ValueError('negative weight for %s' % op)
+        if weight:
+            weights.append((op, weight))
+    if not weights:
+        raise ValueError('the mix has no operations')
+    return weights
+
+
+def handler_class(name):
+    """Import the handler class called `name`, raising ValueError when
+    its library isn't installed"""
+    module, cls = HANDLERS[name]
+    try:
+        return getattr(importlib.import_module(module), cls)
+    except ImportError as exc:
+        raise ValueError('the %s handler is unavailable: %s' % (name, exc))
+
+
+def merge(histograms):
+    merged = LatencyHistogram()
+    for histogram in histograms:
+        for index, count in enumerate(histogram.counts):
+            merged.counts[index] += count
+        merged.count += histogram.count
+        merged.max = max(merged.max, histogram.max)
+    return merged
+
+
+def summary(histogram, errors, elapsed):
+    result = {
+        'count': histogram.count,
+        'errors': errors,
+        'ops_per_sec': histogram.count / elapsed if elapsed else None,
+        'max': histogram.max,
+    }
+    for percent in PERCENTILES:
+        name = 'p' + ('%g' % percent).replace('.', '')
+        result[name] = histogram.percentile(percent)
+    return result
+
+
+class Worker(object):
+    """Runs the requests of one client on nodes of its own under
+    `root`"""
+    def __init__(self, client, root, mix, options, seed):
+        self.client = client
+        self.root = root
+        self.options = options
+        self.data = b'x' * options.data_size
+        self.random = random.Random(seed)
+        self.ops = [op for op, weight in mix]
+        self.cumulative = []
+        total = 0.0
+        for op, weight in mix:
+            total += weight
+            self.cumulative.append(total)
+        self.live = []
+        self.counter = 0
+        self.latency = dict((op, LatencyHistogram()) for op in OPS)
+        self.errors = dict((op, 0) for op in OPS)
+
+    def populate(self):
+        self.client.ensure_path(self.root)
+        paths = [self._new_path() for i in range(self.options.nodes)]
+        for start in range(0, len(paths), 100):
+            t = self.client.transaction()
+            for path in paths[start:start + 100]:
+                t.create(path, self.data)
+            t.commit()
+        self.live.extend(paths)
+
+    def _new_path(self):
+        self.counter += 1
+        return '%s/n%d' % (self.root, self.counter)
+
+    def pick(self, busy=()):
+        """Pick the next operation and the path it's on, avoiding the
+        paths in `busy`
+
+        Creates make new nodes and deletes take them out of the live
+        ones before the request is sent, so as requests of a client are
+        handled in order, none of them runs into a node missing or
+        already there. Requests sent together in a transaction and a
+        multiRead aren't, they each get a different node.
+
+        """
+        point = self.random.random() * self.cumulative[-1]
+        for op, bound in zip(self.ops, self.cumulative):
+            if point < bound:
+                break
+        if op == 'get_children':
+            return op, self.root
+        index = path = None
+        if op != 'create' and self.live:
+            for attempt in range(3):
+                index = self.random.randrange(len(self.live))
+                path = self.live[index]
+                if path not in busy:
+                    break
+            else:
+                path = None
+        if path is None:
+            path = self._new_path()
+            self.live.append(path)
+            return 'create', path
+        if op == 'delete':
+            self.live[index] = self.live[-1]
+            self.live.pop()
+        return op, path
+
+    def _send(self, op, path):
+        client = self.client
+        if op == 'create':
+            return client.create_async(path, self.data)
+        elif op == 'set':
+            return client.set_async(path, self.data)
+        return getattr(client, op + '_async')(path)
+
+    def _record(self, op, started, error=False):
+        self.latency[op].add(now() - started)
+        if error:
+            self.errors[op] += 1
+
+    def run(self, mode, ops, deadline):
+        getattr(self, 'run_' + mode)(ops, deadline)
+
+    def _done(self, sent, ops, deadline):
+        if deadline is not None:
+            return now() >= deadline
+        return sent >= ops
+
+    def run_sync(self, ops, deadline):
+        client = self.client
+        data = self.data
+        sent = 0
+        while not self._done(sent, ops, deadline):
+            op, path = self.pick()
+            started = now()
+            try:
+                if op == 'create':
+                    client.create(path, data)
+                elif op == 'set':
+                    client.set(path, data)
+                else:
+                    getattr(client, op)(path)
+            except ZookeeperError:
+                self._record(op, started, True)
+            else:
+                self._record(op, started)
+            sent += 1
+
+    def run_async(self, ops, deadline):
+        depth = self.options.depth
+        sent = 0
+        while not self._done(sent, ops, deadline):
+            count = depth if deadline is not None else min(depth, ops - sent)
+            window = []
+            for i in range(count):
+                op, path = self.pick()
+                window.append((op, now(), self._send(op, path)))
+            for op, started, result in window:
+                try:
+                    result.get()
+                except ZookeeperError:
+                    self._record(op, started, True)
+                else:
+                    self._record(op, started)
+            sent += count
+
+    def run_transaction(self, ops, deadline):
+        client = self.client
+        batch = self.options.batch
+        sent = 0
+        while not self._done(sent, ops, deadline):
+            count = batch if deadline is not None else min(batch, ops - sent)
+            t = client.transaction()
+            writes, gets, children, exists = [], [], [], []
+            busy = set()
+            for i in range(count):
+                op, path = self.pick(busy)
+                busy.add(path)
+                if op == 'create':
+                    t.create(path, self.data)
+                    writes.append(op)
+                elif op == 'set':
+                    t.set_data(path, self.data)
+                    writes.append(op)
+                elif op == 'delete':
+                    t.delete(path)
+                    writes.append(op)
+                elif op == 'get':
+                    gets.append(path)
+                elif op == 'get_children':
+                    children.append(path)
+                else:
+                    exists.append(path)
+
+            started = now()
+            requests = []
+            if writes:
+                requests.append((writes, t.commit_async()))
+            if gets:
+                requests.append((['get'] * len(gets),
+                                 client.get_many_async(gets)))
+            if children:
+                requests.append((['get_children'] * len(children),
+                                 client.get_children_many_async(children)))
+            for path in exists:
+                requests.append((['exists'], client.exists_async(path)))
+            for names, result in requests:
+                try:
+                    results = result.get()
+                except ZookeeperError:
+                    results = [True] * len(names)
+                if not isinstance(results, list):
+                    results = [results]
+                for op, outcome in zip(names, results):
+                    self._record(op, started,
+                                 isinstance(outcome, Exception))
+            sent += count
+
+
+def run(hosts, handler_name, mode, mix, options):
+    """Run the benchmark once, returning its results as a dict"""
+    cls = handler_class(handler_name)
+    root = '/kazoo-bench-%s' % uuid.uuid4().hex
+    clients = []
+    workers = []
+    try:
+        for i in range(options.clients):
+            client = KazooClient(hosts, handler=cls())
+            client.start()
+            clients.append(client)
+            workers.append(Worker(client, '%s/c%d' % (root, i), mix,
+                                  options, options.seed + i))
+        for worker in workers:
+            worker.populate()
+
+        started = now()
+        deadline = started + options.duration if options.duration else None
+        spawned = [worker.client.handler.spawn(worker.run, mode,
+                                               options.ops, deadline)
+                   for worker in workers]
+        for spawn in spawned:
+            spawn.join()
+        elapsed = now() - started
+
+        if options.cleanup:
+            clients[0].delete(root, recursive=True)
+    finally:
+        for client in clients:
+            client.stop()
+            client.close()
+
+    by_op = {}
+    for op in OPS:
+        histogram = merge(worker.latency[op] for worker in workers)
+        if histogram.count:
+            by_op[op] = summary(histogram,
+                                sum(w.errors[op] for w in workers), elapsed)
+    total = summary(merge(w.latency[op] for w in workers for op in OPS),
+                    sum(w.errors[op] for w in workers for op in OPS),
+                    elapsed)
+    total.update({
+        'handler': handler_name,
+        'mode': mode,
+        'clients': options.clients,
+        'elapsed': elapsed,
+        'ops': by_op,
+    })
+    return total
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m kazoo.bench',
+        description='Measure the throughput and latencies of kazoo '
+                    'clients, printing the results as JSON.')
+    server = parser.add_mutually_exclusive_group()
+    server.add_argument(
+        '--hosts', help='the ZooKeeper hosts to connect to, an in-process '
+                        'stand-in is used by default')
+    server.add_argument(
+        '--harness', action='store_true',
+        help='use the test harness cluster, see kazoo.testing')
+    parser.add_argument(
+        '--handler', default='threading',
+        help='comma separated handlers among %s (default: %%(default)s)' %
+             ', '.join(sorted(HANDLERS)))
+    parser.add_argument(
+        '--mode', default='sync',
+        help='comma separated modes among %s (default: %%(default)s)' %
+             ', '.join(MODES))
+    parser.add_argument(
+        '--mix', default=DEFAULT_MIX,
+        help='comma separated op=weight (default: %(default)s)')
+    parser.add_argument('--clients', type=int, default=1,
+                        help='client instances (default: %(default)s)')
+    parser.add_argument('--ops', type=int, default=10000,
+                        help='requests per client (default: %(default)s)')
+    parser.add_argument('--duration', type=float,
+                        help='seconds to run for instead of --ops')
+    parser.add_argument('--depth', type=int, default=100,
+                        help='requests in flight per client in async mode '
+                             '(default: %(default)s)')
+    parser.add_argument('--batch', type=int, default=10,
+                        help='requests per transaction in transaction mode '
+                             '(default: %(default)s)')
+    parser.add_argument('--data-size', type=int, default=64,
+                        help='bytes of data created and set '
+                             '(default: %(default)s)')
+    parser.add_argument('--nodes', type=int, default=100,
+                        help='nodes created per client before the run '
+                             '(default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random requests '
+                             '(default: %(default)s)')
+    parser.add_argument('--no-cleanup', dest='cleanup',
+                        action='store_false',
+                        help="leave the nodes created in place")
+    return parser
+
+
+def main(args):
+    parser = _parser()
+    options = parser.parse_args(args)
+    try:
+        mix = parse_mix(options.mix)
+        handlers = [name.strip() for name in options.handler.split(',')]
+        modes = [mode.strip() for mode in options.mode.split(',')]
+        for name in handlers:
+            if name not in HANDLERS:
+                raise ValueError('unknown handler %r' % name)
+            handler_class(name)
+        for mode in modes:
+            if mode not in MODES:
+                raise ValueError('unknown mode %r' % mode)
+        for name in ('clients', 'ops', 'depth', 'batch'):
+            if getattr(options, name) < 1:
+                raise ValueError('--%s must be at least 1' % name)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    server = None
+    if options.hosts:
+        hosts = options.hosts
+        server_name = hosts
+    elif options.harness:
+        from kazoo.testing.harness import get_global_cluster
+        cluster = get_global_cluster()
+        cluster.start()
+        hosts = ','.join(s.address for s in cluster)
+        server_name = 'harness'
+    else:
+        from kazoo.testing.server import StandInZooKeeper
+        server = StandInZooKeeper()
+        server.run()
+        hosts = server.address
+        server_name = 'standin'
+
+    try:
+        runs = [run(hosts, name, mode, mix, options)
+                for name in handlers for mode in modes]
+    finally:
+        if server is not None:
+            server.destroy()
+
+    json.dump({
+        'server': server_name,
+        'mix': dict(mix),
+        'data_size': options.data_size,
+        'latency_resolution': LATENCY_BUCKETS[1] / LATENCY_BUCKETS[0] - 1,
+        'runs': runs,
+    }, sys.stdout, indent=2, sort_keys=True)
+    print()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,62 @@
+"""Benchmark of the chroot path handling
+
+Times prefixing paths with a chroot, the way every request of a
+:class:`~kazoo.client.KazooClient` does, and stripping it from the paths
+of watch events: with ``_prefix_root`` as the client used to, and with
+the client's ``_Chroot``, for paths seen again (cache hits) and for new
+paths every time.
+
+Run as::
+
+    python -m kazoo.bench.paths [paths]
+
+"""
+from __future__ import print_function
+
+import sys
+import timeit
+from functools import partial
+
+from kazoo.protocol.paths import PATH_CACHE_SIZE, _Chroot, _prefix_root
+
+ROOT = '/kazoo/bench'
+
+
+def _unchroot(root, path):
+    # What KazooClient.unchroot used to do
+    if path.startswith(root):
+        return path[len(root):]
+    return path
+
+
+def per_path(func, paths):
+    """Nanoseconds per path of `func`, the best of 5 runs"""
+    def run():
+        for path in paths:
+            func(path)
+    return min(timeit.repeat(run, number=1, repeat=5)) / len(paths) * 1e9
+
+
+def main(args):
+    count = int(args[0]) if args else 100000
+    # Few enough to stay cached, and all different
+    hot = ['/queue/entry-%010d' % (i % (PATH_CACHE_SIZE // 2))
+           for i in range(count)]
+    cold = ['/queue/entry-%010d' % i for i in range(count)]
+    prefixed = [ROOT + path for path in hot]
+
+    print('%-24s %12s %12s' % ('case', 'before ns', 'after ns'))
+    for name, paths in (('prefix (cached)', hot), ('prefix (new)', cold)):
+        chroot = _Chroot(ROOT)
+        print('%-24s %12.0f %12.0f' % (
+            name, per_path(partial(_prefix_root, ROOT), paths),
+            per_path(chroot.prefix, paths)))
+    chroot = _Chroot(ROOT)
+    print('%-24s %12.0f %12.0f' % (
+        'strip (cached)',
+        per_path(partial(_unchroot, ROOT), prefixed),
+        per_path(chroot.strip, prefixed)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,130 @@
+"""Benchmark of the GetData read path
+
+Replays ``get()`` replies of various sizes through a
+:class:`~kazoo.protocol.connection.ConnectionHandler` reading from an
+in-memory socket, with and without ``zero_copy_reads``, and reports the
+bytes copied by kazoo and the time spent per read.
+
+Bytes copied are the ones kazoo moves around after they have been
+received: parts of a reply moved within or out of the read buffer, and
+the data of the reply when it's copied out of the read buffer.
+
+Run as::
+
+    python -m kazoo.bench.reads [reads per size]
+
+"""
+from __future__ import print_function
+
+import sys
+import time
+from collections import deque
+
+from kazoo.handlers.threading import SequentialThreadingHandler
+from kazoo.protocol.connection import ConnectionHandler
+from kazoo.protocol.serialization import (
+    GetData,
+    int_struct,
+    reply_header_struct,
+    stat_struct,
+)
+from kazoo.protocol.stats import now
+
+SIZES = (1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024)
+
+# Most a single recv returns on a loopback connection
+RECV_SIZE = 64 * 1024
+
+
+class _Client(object):
+    """The parts of :class:`~kazoo.client.KazooClient` reading replies
+    needs"""
+    def __init__(self, zero_copy_reads):
+        self.handler = SequentialThreadingHandler()
+        self.zero_copy_reads = zero_copy_reads
+        self.compact_stats = False
+        self.last_zxid = 0
+        self._pending = deque()
+        self._stopped = self.handler.event_object()
+
+    def _notify_room(self):
+        pass
+
+
+class _Socket(object):
+    """A socket receiving the same reply over and over"""
+    def __init__(self, reply):
+        self.reply = reply
+        self.sent = 0
+
+    def recv_into(self, buf):
+        size = min(len(buf), RECV_SIZE, len(self.reply) - self.sent)
+        buf[:size] = self.reply[self.sent:self.sent + size]
+        self.sent = (self.sent + size) % len(self.reply)
+        return size
+
+
+def _make_reply(size):
+    reply = (reply_header_struct.pack(0, 1, 0) + int_struct.pack(size) +
+             b'x' * size + stat_struct.pack(*range(11)))
+    return int_struct.pack(len(reply)) + reply
+
+
+def _make_connection(size, zero_copy_reads, moved):
+    handler = SequentialThreadingHandler()
+    handler.select = lambda r, w, x, timeout: (r, w, x)
+    client = _Client(zero_copy_reads)
+    client.handler = handler
+    conn = ConnectionHandler(client, None)
+    conn._socket = _Socket(_make_reply(size))
+
+    make_room = conn._make_room
+
+    def counting_make_room():
+        buf, start = conn._rbuf, conn._rstart
+        pending = conn._rend - start
+        make_room()
+        if pending and (start or conn._rbuf is not buf):
+            moved[0] += pending
+    conn._make_room = counting_make_room
+    return conn
+
+
+def read(size, zero_copy_reads, reads):
+    """Read `reads` replies of `size` bytes of data, returns the bytes
+    copied and the seconds spent per read"""
+    moved = [0]
+    conn = _make_connection(size, zero_copy_reads, moved)
+    client = conn.client
+    request = GetData('/node', None)
+    copied = 0
+
+    start = time.time()
+    for i in range(reads):
+        result = client.handler.async_result()
+        client._pending.append((request, result, 0, now()))
+        while not result.ready():
+            conn._read_socket(1)
+        data = result.get()[0]
+        if isinstance(data, bytes) or data.readonly:
+            # Not a view of the (bytearray) buffer it was received in
+            copied += len(data)
+    elapsed = time.time() - start
+
+    return (copied + moved[0]) / float(reads), elapsed / reads
+
+
+def main(args):
+    reads = int(args[0]) if args else 200
+    print('%10s %10s %14s %12s %10s' % (
+        'size', 'mode', 'copied/read', 'usec/read', 'MB/s'))
+    for size in SIZES:
+        for zero_copy_reads in (False, True):
+            copied, elapsed = read(size, zero_copy_reads, reads)
+            print('%10d %10s %14d %12.1f %10.1f' % (
+                size, 'zero-copy' if zero_copy_reads else 'copy',
+                copied, elapsed * 1e6, size / elapsed / 1e6))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
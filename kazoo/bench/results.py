@@ -0,0 +1,138 @@
+"""Benchmark of the threading handler's async results
+
+Compares :class:`kazoo.handlers.threading.AsyncResult` with the
+condition based :class:`kazoo.handlers.utils.AsyncResult` it replaced,
+creating results and setting them the ways the connection does: with
+nobody waiting, with callbacks linked, and with a thread blocked on
+them.
+
+Run as::
+
+    python -m kazoo.bench.results [results per run]
+
+"""
+from __future__ import print_function
+
+import sys
+import threading
+import time
+from collections import deque
+
+from kazoo.handlers.threading import AsyncResult, KazooTimeoutError
+from kazoo.handlers.utils import AsyncResult as ConditionAsyncResult
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: nocover
+    tracemalloc = None
+
+
+class _Queue(deque):
+    put = deque.append
+
+
+class _Handler(object):
+    """The parts of a handler async results use, running the
+    completions right away"""
+    def __init__(self):
+        self.completion_queue = _Queue()
+        self._result_lock = threading.Lock()
+
+    def run_completions(self):
+        queue = self.completion_queue
+        while queue:
+            queue.popleft()()
+
+
+def condition_result(handler):
+    return ConditionAsyncResult(handler, threading.Condition,
+                                KazooTimeoutError)
+
+
+def lean_result(handler):
+    return AsyncResult(handler, handler._result_lock)
+
+
+def set_get(factory, handler, count):
+    for i in range(count):
+        result = factory(handler)
+        result.set(i)
+        result.get()
+
+
+def callbacks(factory, handler, count):
+    def callback(result):
+        pass
+
+    def other_callback(result):
+        pass
+    for i in range(count):
+        result = factory(handler)
+        result.rawlink(callback)
+        result.rawlink(other_callback)
+        result.set(i)
+    handler.run_completions()
+
+
+def blocked(factory, handler, count):
+    results = [factory(handler) for i in range(count)]
+
+    def waiter():
+        for result in results:
+            result.get()
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    for i, result in enumerate(results):
+        result.set(i)
+    thread.join()
+
+
+def timed(func, factory, count, repeats=5):
+    best = None
+    for i in range(repeats):
+        handler = _Handler()
+        start = time.time()
+        func(factory, handler, count)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / count
+
+
+def allocated(factory, count):
+    """Bytes allocated per result created and set, or None without
+    tracemalloc"""
+    if tracemalloc is None:
+        return None
+    handler = _Handler()
+    tracemalloc.start()
+    results = []
+    for i in range(count):
+        result = factory(handler)
+        result.set(i)
+        results.append(result)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / float(count)
+
+
+def main(args):
+    count = int(args[0]) if args else 50000
+    print('%12s %14s %14s %8s' % (
+        'scenario', 'condition ns', 'lean ns', 'speedup'))
+    for name, func in (('set/get', set_get),
+                       ('callbacks', callbacks),
+                       ('blocked', blocked)):
+        old = timed(func, condition_result, count)
+        new = timed(func, lean_result, count)
+        print('%12s %14.0f %14.0f %7.2fx' % (
+            name, old * 1e9, new * 1e9, old / new))
+
+    old = allocated(condition_result, count)
+    if old is not None:
+        new = allocated(lean_result, count)
+        print('%12s %14.0f %14.0f' % ('bytes/result', old, new))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
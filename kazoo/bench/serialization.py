@@ -0,0 +1,481 @@
+"""Microbenchmarks of the jute serialization
+
+Times the encoding and decoding functions of
+:mod:`kazoo.protocol.serialization` on fixed byte fixtures: a 10k
+children listing (and a 100k one, against the per-name loop it
+replaced), 1MB payloads, 1000 operation transactions and
+multiRead replies, and a flood of 10k watch events. Replies are decoded
+from a memoryview of a bytearray, like the connection does.
+
+For each case it reports the time per call, the time per item (child,
+operation, event...) and, with tracemalloc, the memory blocks still
+held after a call (the objects returned) and the peak bytes allocated
+during one.
+
+The fixtures are generated from a fixed seed, their digest is saved
+along with the results so a comparison can tell when it isn't comparing
+like with like.
+
+Run as::
+
+    python -m kazoo.bench.serialization [--filter NAME] [--save FILE]
+                                        [--compare FILE]
+
+``--save`` writes the results to a JSON file, ``--compare`` prints the
+change of each case from such a file. Like the other benchmarks it
+needs Python 2.7 or above.
+
+"""
+from __future__ import print_function
+
+import argparse
+import hashlib
+import json
+import platform
+import random
+import sys
+import timeit
+
+from kazoo.protocol.serialization import (
+    CheckVersion,
+    Create,
+    Delete,
+    GetChildren,
+    GetChildren2,
+    GetData,
+    LazyGetChildren,
+    LazyGetChildren2,
+    MultiRead,
+    ReplyHeader,
+    SetData,
+    Transaction,
+    Watch,
+    append_buffer,
+    append_string,
+    int_int_struct,
+    int_struct,
+    multiheader_struct,
+    read_buffer,
+    read_compact_stat,
+    read_string,
+    reply_header_struct,
+    stat_struct,
+    write_request,
+)
+from kazoo.protocol.states import ZnodeStat
+from kazoo.security import OPEN_ACL_UNSAFE
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: nocover
+    tracemalloc = None
+
+SEED = 2314
+
+# Cases, in the order they're run
+CASES = []
+
+
+class Case(object):
+    """A benchmark: `setup` returns the fixture bytes and the function
+    to time, called with no arguments, and `items` is how many things
+    (children, operations...) one call handles"""
+    def __init__(self, name, items, setup):
+        self.name = name
+        self.items = items
+        self.setup = setup
+
+
+def case(name, items=1):
+    def register(setup):
+        CASES.append(Case(name, items, setup))
+        return setup
+    return register
+
+
+def _view(fixture):
+    return memoryview(bytearray(fixture))
+
+
+def _stat(rand):
+    return stat_struct.pack(*[rand.randrange(1, 2 ** 31)
+                              for i in range(11)])
+
+
+def _children_fixture(count, with_stat):
+    rand = random.Random(SEED)
+    b = bytearray(int_struct.pack(count))
+    for i in range(count):
+        if i % 100 == 0:
+            # Some non-ASCII names, which take longer to decode
+            name = u'\xe9l\xe9ment-%010d' % i
+        else:
+            name = u'entry-%010d' % rand.randrange(10 ** 10)
+        append_string(b, name)
+    if with_stat:
+        b += _stat(rand)
+    return bytes(b)
+
+
+def _data_fixture(size):
+    rand = random.Random(SEED)
+    b = bytearray()
+    append_buffer(b, bytes(bytearray(rand.randrange(256)
+                                     for i in range(256))) * (size // 256))
+    b += _stat(rand)
+    return bytes(b)
+
+
+@case('read_string')
+def _read_string():
+    b = bytearray()
+    append_string(b, u'/kazoo/queue/entry-0000012345/lock-0000000042')
+    view = _view(b)
+    return bytes(b), lambda: read_string(view, 0)
+
+
+@case('znodestat')
+def _znodestat():
+    fixture = _stat(random.Random(SEED))
+    view = _view(fixture)
+    unpack_from = stat_struct.unpack_from
+    make = ZnodeStat._make
+    return fixture, lambda: make(unpack_from(view, 0))
+
+
+@case('compact_stat')
+def _compact_stat():
+    fixture = _stat(random.Random(SEED))
+    view = _view(fixture)
+    return fixture, lambda: read_compact_stat(view, 0)
+
+
+@case('read_buffer/1MB')
+def _read_buffer():
+    fixture = _data_fixture(1024 * 1024)
+    view = _view(fixture)
+    return fixture, lambda: read_buffer(view, 0)
+
+
+@case('get_data/1MB')
+def _get_data():
+    fixture = _data_fixture(1024 * 1024)
+    view = _view(fixture)
+    return fixture, lambda: GetData.deserialize(view, 0)
+
+
+@case('get_data_view/1MB')
+def _get_data_view():
+    fixture = _data_fixture(1024 * 1024)
+    view = _view(fixture)
+    return fixture, lambda: GetData.deserialize_view(view, 0)
+
+
+@case('get_children/10k', 10000)
+def _get_children():
+    fixture = _children_fixture(10000, False)
+    view = _view(fixture)
+    return fixture, lambda: GetChildren.deserialize(view, 0)
+
+
+@case('get_children2/10k', 10000)
+def _get_children2():
+    fixture = _children_fixture(10000, True)
+    view = _view(fixture)
+    return fixture, lambda: GetChildren2.deserialize(view, 0)
+
+
+@case('get_children_lazy/10k', 10000)
+def _get_children_lazy():
+    fixture = _children_fixture(10000, False)
+    view = _view(fixture)
+    return fixture, lambda: LazyGetChildren.deserialize(view, 0)
+
+
+@case('get_children2_lazy/10k', 10000)
+def _get_children2_lazy():
+    fixture = _children_fixture(10000, True)
+    view = _view(fixture)
+    return fixture, lambda: LazyGetChildren2.deserialize(view, 0)
+
+
+def _read_names_loop(buffer, offset):
+    # How GetChildren used to decode the names, one read_string each
+    count = int_struct.unpack_from(buffer, offset)[0]
+    offset += int_struct.size
+    children = []
+    for i in range(count):
+        child, offset = read_string(buffer, offset)
+        children.append(child)
+    return children, offset
+
+
+@case('get_children_loop/100k', 100000)
+def _get_children_loop():
+    fixture = _children_fixture(100000, False)
+    view = _view(fixture)
+    return fixture, lambda: _read_names_loop(view, 0)
+
+
+@case('get_children/100k', 100000)
+def _get_children_100k():
+    fixture = _children_fixture(100000, False)
+    view = _view(fixture)
+    return fixture, lambda: GetChildren.deserialize(view, 0)
+
+
+@case('get_children_lazy/100k', 100000)
+def _get_children_lazy_100k():
+    fixture = _children_fixture(100000, False)
+    view = _view(fixture)
+    return fixture, lambda: LazyGetChildren.deserialize(view, 0)
+
+
+def _operations(count):
+    ops = []
+    for i in range(count):
+        path = u'/kazoo/bench/node-%06d' % i
+        kind = i % 4
+        if kind == 0:
+            ops.append(Create(path, b'x' * 64, OPEN_ACL_UNSAFE, 0))
+        elif kind == 1:
+            ops.append(SetData(path, b'y' * 64, i))
+        elif kind == 2:
+            ops.append(CheckVersion(path, i))
+        else:
+            ops.append(Delete(path, -1))
+    return ops
+
+
+@case('transaction_serialize/1000', 1000)
+def _transaction_serialize():
+    request = Transaction(_operations(1000))
+    out = bytearray()
+    write_request(out, request, 1)
+    fixture = bytes(out)
+
+    def serialize():
+        write_request(bytearray(), request, 1)
+    return fixture, serialize
+
+
+@case('transaction_deserialize/1000', 1000)
+def _transaction_deserialize():
+    rand = random.Random(SEED)
+    b = bytearray()
+    for op in _operations(1000):
+        b += multiheader_struct.pack(op.type, False, 0)
+        if op.type == Create.type:
+            append_string(b, op.path)
+        elif op.type == SetData.type:
+            b += _stat(rand)
+    b += multiheader_struct.pack(-1, True, -1)
+    fixture = bytes(b)
+    view = _view(fixture)
+    return fixture, lambda: Transaction.deserialize(view, 0)
+
+
+@case('multi_read/1000', 1000)
+def _multi_read():
+    rand = random.Random(SEED)
+    b = bytearray()
+    for i in range(1000):
+        if i % 2:
+            b += multiheader_struct.pack(GetData.type, False, 0)
+            append_buffer(b, b'v' * 100)
+            b += _stat(rand)
+        else:
+            b += multiheader_struct.pack(GetChildren.type, False, 0)
+            b += int_struct.pack(10)
+            for child in range(10):
+                append_string(b, u'child-%04d' % child)
+    b += multiheader_struct.pack(-1, True, -1)
+    fixture = bytes(b)
+    view = _view(fixture)
+    return fixture, lambda: MultiRead.deserialize(view, 0)
+
+
+@case('multi_read_children/10k', 10000)
+def _multi_read_children():
+    # The children of get_children/10k, followed by another read
+    b = bytearray(multiheader_struct.pack(GetChildren.type, False, 0))
+    b += _children_fixture(10000, False)
+    b += multiheader_struct.pack(GetData.type, False, 0)
+    append_buffer(b, b'v' * 100)
+    b += _stat(random.Random(SEED))
+    b += multiheader_struct.pack(-1, True, -1)
+    fixture = bytes(b)
+    view = _view(fixture)
+    return fixture, lambda: MultiRead.deserialize(view, 0)
+
+
+@case('watch_events/10k', 10000)
+def _watch_events():
+    b = bytearray()
+    for i in range(10000):
+        frame = bytearray(reply_header_struct.pack(-1, -1, 0))
+        frame += int_int_struct.pack(3, 3)
+        append_string(frame, u'/kazoo/watched/node-%06d' % i)
+        b += int_struct.pack(len(frame)) + frame
+    fixture = bytes(b)
+    view = _view(fixture)
+    end = len(fixture)
+
+    def read_events():
+        # Frame by frame, the way the connection reads them
+        offset = 0
+        events = []
+        while offset < end:
+            length = int_struct.unpack_from(view, offset)[0]
+            offset += int_struct.size
+            header, start = ReplyHeader.deserialize(view, offset)
+            events.append(Watch.deserialize(view, start)[0])
+            offset += length
+        return events
+    return fixture, read_events
+
+
+@case('set_data_serialize/1MB')
+def _set_data_serialize():
+    request = SetData(u'/kazoo/bench/large', b'z' * (1024 * 1024), -1)
+    out = bytearray()
+    write_request(out, request, 1)
+
+    def serialize():
+        write_request(bytearray(), request, 1)
+    return bytes(out), serialize
+
+
+def timed(func, min_time, repeats=5):
+    """Seconds per call of `func`, the best of `repeats` runs of
+    `min_time` seconds or so"""
+    timer = timeit.default_timer
+    loops = 1
+    while True:
+        start = timer()
+        for i in range(loops):
+            func()
+        elapsed = timer() - start
+        if elapsed >= min_time / repeats:
+            break
+        loops *= 2 if elapsed else 10
+    best = elapsed
+    for repeat in range(repeats - 1):
+        start = timer()
+        for i in range(loops):
+            func()
+        best = min(best, timer() - start)
+    return best / loops
+
+
+def allocations(func):
+    """Blocks held by the result of a call and the peak bytes allocated
+    during it, or None without tracemalloc"""
+    if tracemalloc is None:
+        return None, None
+    func()
+    tracemalloc.start()
+    try:
+        result = func()
+        current, peak = tracemalloc.get_traced_memory()
+        blocks = sum(stat.count for stat in
+                     tracemalloc.take_snapshot().statistics('filename'))
+    finally:
+        tracemalloc.stop()
+    del result
+    return blocks, peak
+
+
+def run(cases, min_time):
+    results = {}
+    for benchmark in cases:
+        fixture, func = benchmark.setup()
+        seconds = timed(func, min_time)
+        blocks, peak = allocations(func)
+        results[benchmark.name] = {
+            'ns': seconds * 1e9,
+            'ns_per_item': seconds * 1e9 / benchmark.items,
+            'items': benchmark.items,
+            'blocks': blocks,
+            'peak_bytes': peak,
+            'fixture': hashlib.sha1(fixture).hexdigest()[:16],
+        }
+    return results
+
+
+def _number(value, format):
+    return '-' if value is None else format % value
+
+
+def report(cases, results, baseline=None):
+    if baseline is None:
+        print('%-30s %14s %12s %10s %12s' % (
+            'case', 'ns/op', 'ns/item', 'blocks', 'peak bytes'))
+    else:
+        print('%-30s %14s %14s %9s %10s %10s' % (
+            'case', 'baseline ns', 'ns/op', 'change', 'blocks', 'was'))
+    for benchmark in cases:
+        result = results[benchmark.name]
+        if baseline is None:
+            print('%-30s %14.0f %12.1f %10s %12s' % (
+                benchmark.name, result['ns'], result['ns_per_item'],
+                _number(result['blocks'], '%d'),
+                _number(result['peak_bytes'], '%d')))
+            continue
+        old = baseline.get(benchmark.name)
+        if old is None:
+            print('%-30s %14s %14.0f %9s %10s %10s' % (
+                benchmark.name, '-', result['ns'], 'new',
+                _number(result['blocks'], '%d'), '-'))
+            continue
+        change = '%+.1f%%' % ((result['ns'] / old['ns'] - 1) * 100)
+        if old['fixture'] != result['fixture']:
+            # Timings of different inputs aren't comparable
+            change += '*'
+        print('%-30s %14.0f %14.0f %9s %10s %10s' % (
+            benchmark.name, old['ns'], result['ns'], change,
+            _number(result['blocks'], '%d'), _number(old['blocks'], '%d')))
+    if baseline is not None and any(
+            baseline[b.name]['fixture'] != results[b.name]['fixture']
+            for b in cases if b.name in baseline):
+        print('* the fixture changed since the baseline')
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        prog='python -m kazoo.bench.serialization',
+        description='Time kazoo\'s jute serialization on fixed fixtures.')
+    parser.add_argument('--filter', action='append', default=[],
+                        help='only run the cases with NAME in their name, '
+                             'can be repeated', metavar='NAME')
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help='seconds to spend timing each case '
+                             '(default: %(default)s)')
+    parser.add_argument('--save', metavar='FILE',
+                        help='save the results as JSON to FILE')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare the results with the ones saved '
+                             'in FILE')
+    options = parser.parse_args(args)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)['cases']
+
+    cases = [c for c in CASES if not options.filter or
+             any(name in c.name for name in options.filter)]
+    results = run(cases, options.min_time)
+    report(cases, results, baseline)
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'cases': results,
+            }, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,99 @@
+"""Benchmark of the memory and time per node stat
+
+Decodes the same Stat replies into :class:`~kazoo.protocol.states.ZnodeStat`
+and, like clients created with ``compact_stats=True`` do, into
+:class:`~kazoo.protocol.states.CompactStat`, keeping all of them the way a
+scan of a large tree would. For each it reports the bytes held per stat
+(measured with tracemalloc, so not on Python 2), the time to decode one
+and the time to read one field or all of them from it.
+
+Run as::
+
+    python -m kazoo.bench.stats [stats]
+
+"""
+from __future__ import print_function
+
+import random
+import sys
+import timeit
+
+from kazoo.protocol.serialization import (
+    read_compact_stat,
+    stat_struct,
+)
+from kazoo.protocol.states import ZnodeStat
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: nocover
+    tracemalloc = None
+
+SEED = 2314
+
+
+def _replies(count):
+    """Replies of `count` realistic stats: large zxids and times, small
+    versions and counts"""
+    rand = random.Random(SEED)
+    zxid = 0x100000000 * rand.randrange(1, 100)
+    mtime = 1500000000000
+    replies = []
+    for i in range(count):
+        zxid += rand.randrange(1, 1000)
+        mtime += rand.randrange(1000)
+        replies.append(memoryview(bytearray(stat_struct.pack(
+            zxid - rand.randrange(10000), zxid, mtime - 86400000, mtime,
+            rand.randrange(10), 0, 0, 0, rand.randrange(1024), 0, zxid))))
+    return replies
+
+
+def _znodestat(view):
+    return ZnodeStat._make(stat_struct.unpack_from(view, 0))
+
+
+def _compact_stat(view):
+    return read_compact_stat(view, 0)
+
+
+DECODERS = (('ZnodeStat', _znodestat), ('CompactStat', _compact_stat))
+
+
+def held_per_stat(decode, replies):
+    """Bytes held per stat by a list of the stats of `replies`"""
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        stats = [decode(view) for view in replies]
+        current = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return float(current - sys.getsizeof(stats)) / len(stats)
+
+
+def per_call(func, number):
+    """Nanoseconds per call of `func`, the best of 5 runs"""
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e9
+
+
+def main(args):
+    count = int(args[0]) if args else 100000
+    replies = _replies(count)
+    number = max(count // 10, 1)
+
+    print('%-12s %14s %12s %12s %12s' % (
+        'stat', 'bytes/stat', 'decode ns', 'version ns', 'all ns'))
+    for name, decode in DECODERS:
+        held = held_per_stat(decode, replies)
+        view = replies[0]
+        stat = decode(view)
+        print('%-12s %14s %12.0f %12.0f %12.0f' % (
+            name, '-' if held is None else '%.1f' % held,
+            per_call(lambda: decode(view), number),
+            per_call(lambda: stat.version, number),
+            per_call(lambda: tuple(stat), number)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,122 @@
+"""Benchmark of request serialization
+
+Serializes batches of requests into one output buffer, the way the
+connection flushes them, with
+:func:`~kazoo.protocol.serialization.write_request` and with the
+previous serialization path, which built a bytearray per request out of
+temporary strings and then copied it behind its length prefix.
+
+Run as::
+
+    python -m kazoo.bench.writes [repeats]
+
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+from kazoo.protocol.serialization import (
+    Create,
+    SetData,
+    Transaction,
+    int_struct,
+    multiheader_struct,
+    write_request,
+)
+from kazoo.security import OPEN_ACL_UNSAFE
+
+OPS = 1000
+
+
+def _write_string(s):
+    if not s:
+        return int_struct.pack(-1)
+    utf8_str = s.encode('utf-8')
+    return int_struct.pack(len(utf8_str)) + utf8_str
+
+
+def _write_buffer(data):
+    if data is None:
+        return int_struct.pack(-1)
+    return int_struct.pack(len(data)) + data
+
+
+def _legacy_body(request):
+    b = bytearray()
+    if request.type == Transaction.type:
+        for op in request.operations:
+            b.extend(multiheader_struct.pack(op.type, False, -1) +
+                     _legacy_body(op))
+        return b + multiheader_struct.pack(-1, True, -1)
+    b.extend(_write_string(request.path))
+    b.extend(_write_buffer(request.data))
+    if request.type == Create.type:
+        b.extend(int_struct.pack(len(request.acl)))
+        for acl in request.acl:
+            b.extend(int_struct.pack(acl.perms) +
+                     _write_string(acl.id.scheme) + _write_string(acl.id.id))
+        b.extend(int_struct.pack(request.flags))
+    else:
+        b.extend(int_struct.pack(request.version))
+    return b
+
+
+def legacy(requests):
+    out = bytearray()
+    for xid, request in enumerate(requests, 1):
+        b = bytearray()
+        b.extend(int_struct.pack(xid))
+        b.extend(int_struct.pack(request.type))
+        b += _legacy_body(request)
+        out += int_struct.pack(len(b)) + b
+    return out
+
+
+def in_place(requests):
+    out = bytearray()
+    for xid, request in enumerate(requests, 1):
+        write_request(out, request, xid)
+    return out
+
+
+def batches():
+    creates = [Create('/bench/node-%06d' % i, b'x' * 100, OPEN_ACL_UNSAFE, 0)
+               for i in range(OPS)]
+    sets = [SetData('/bench/node-%06d' % i, b'x' * 1024, -1)
+            for i in range(OPS)]
+    large_sets = [SetData('/bench/node-%06d' % i, b'x' * 65536, -1)
+                  for i in range(OPS // 10)]
+    return [
+        ('%d Create' % OPS, creates),
+        ('%d SetData' % OPS, sets),
+        ('Transaction of %d' % OPS, [Transaction(creates)]),
+        ('%d SetData of 64KB' % (OPS // 10), large_sets),
+    ]
+
+
+def timed(func, requests, repeats):
+    best = None
+    for i in range(repeats):
+        start = time.time()
+        func(requests)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main(args):
+    repeats = int(args[0]) if args else 20
+    print('%20s %12s %12s %8s' % (
+        'batch', 'legacy ms', 'in place ms', 'speedup'))
+    for name, requests in batches():
+        assert legacy(requests) == in_place(requests)
+        old = timed(legacy, requests, repeats)
+        new = timed(in_place, requests, repeats)
+        print('%20s %12.3f %12.3f %7.2fx' % (
+            name, old * 1e3, new * 1e3, old / new))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
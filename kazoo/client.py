@@ -17,7 +17,12 @@ from kazoo.exceptions import (
     KazooException,
     NoNodeError,
     NodeExistsError,
+    NotEmptyError,
+    NoWatcherError,
+    RolledBackError,
     SessionExpiredError,
+    TooManyRequestsError,
+    UnimplementedError,
     WriterNotClosedException,
 )
 from kazoo.handlers.threading import SequentialThreadingHandler
@@ -26,10 +31,12 @@ from kazoo.hosts import collect_hosts
 from kazoo.loggingsupport import BLATHER
 from kazoo.protocol.connection import ConnectionHandler
 from kazoo.protocol.paths import normpath
-from kazoo.protocol.paths import _prefix_root
+from kazoo.protocol.paths import _Chroot
 from kazoo.protocol.serialization import (
+    AddWatch,
     Auth,
     CheckVersion,
+    CheckWatches,
     CloseInstance,
     Create,
     Delete,
@@ -39,13 +46,20 @@ from kazoo.protocol.serialization import (
     GetACL,
     SetACL,
     GetData,
+    LazyGetChildren,
+    LazyGetChildren2,
+    MultiRead,
     Reconfig,
+    RemoveWatches,
     SetData,
     Sync,
     Transaction
 )
+from kazoo.protocol.states import AddWatchMode
 from kazoo.protocol.states import KazooState
 from kazoo.protocol.states import KeeperState
+from kazoo.protocol.states import WatcherType
+from kazoo.protocol.stats import now
 from kazoo.retry import KazooRetry
 from kazoo.security import ACL
 from kazoo.security import OPEN_ACL_UNSAFE
@@ -53,6 +67,7 @@ from kazoo.security import OPEN_ACL_UNSAFE
 # convenience API
 from kazoo.recipe.barrier import Barrier
 from kazoo.recipe.barrier import DoubleBarrier
+from kazoo.recipe.cache import TreeCache
 from kazoo.recipe.counter import Counter
 from kazoo.recipe.election import Election
 from kazoo.recipe.lease import NonBlockingLease
@@ -74,6 +89,10 @@ LOST_STATES = (KeeperState.EXPIRED_SESSION, KeeperState.AUTH_FAILED,
                KeeperState.CLOSED)
 ENVI_VERSION = re.compile('([\d\.]*).*', re.DOTALL)
 ENVI_VERSION_KEY = 'zookeeper.version'
+OVERFLOW_POLICIES = ('block', 'raise', 'drop_oldest')
+# Reads coalesce_reads lets identical requests in flight share
+COALESCED_TYPES = frozenset([GetData.type, Exists.type, GetChildren.type,
+                             GetChildren2.type])
 log = logging.getLogger(__name__)
 
 
@@ -108,7 +127,10 @@ class KazooClient(object):
                  timeout=10.0, client_id=None, handler=None,
                  default_acl=None, auth_data=None, read_only=None,
                  randomize_hosts=True, connection_retry=None,
-                 command_retry=None, logger=None, **kwargs):
+                 command_retry=None, logger=None, zero_copy_reads=False,
+                 request_timeout=None, max_requests=None,
+                 overflow_policy='block', connection_stagger=0.25,
+                 coalesce_reads=False, compact_stats=False, **kwargs):
         """Create a :class:`KazooClient` instance. All time arguments
         are in seconds.
 
@@ -137,6 +159,41 @@ class KazooClient(object):
             options which will be used for creating one.
         :param logger: A custom logger to use instead of the module
             global `log` instance.
+        :param zero_copy_reads:
+            Make :meth:`get` return the node's value as a
+            :class:`memoryview` instead of `bytes`, see
+            :ref:`zero_copy_reads`.
+        :param request_timeout:
+            The longest to wait for the reply to a request. Requests
+            still unanswered after that fail with the handler's
+            `timeout_exception` and their reply is discarded when it
+            arrives, the server may still have applied them. Waits for
+            replies for as long as the session lasts by default.
+        :param max_requests:
+            The most requests that can be queued or in flight at once,
+            unlimited by default. What happens to requests beyond that
+            depends on the `overflow_policy`.
+        :param overflow_policy:
+            One of ``'block'`` to make the caller wait for room in the
+            queue (for at most the `request_timeout`), ``'raise'`` to
+            fail the request with a
+            :class:`~kazoo.exceptions.TooManyRequestsError`, or
+            ``'drop_oldest'`` to fail the oldest request not yet sent
+            instead, or the new request when they have all been sent.
+        :param connection_stagger:
+            When connecting, how long to wait for a server to accept the
+            connection before also trying the next one, while still
+            waiting on the first. The first server to accept is used.
+            `None` to try the servers strictly one at a time.
+        :param coalesce_reads:
+            Make reads without a watch share the request of an
+            identical read still waiting for its reply, instead of
+            sending one of their own, see :ref:`coalesce_reads`.
+        :param compact_stats:
+            Return the stats of nodes as
+            :class:`~kazoo.protocol.states.CompactStat` instead of
+            :class:`~kazoo.protocol.states.ZnodeStat`, see
+            :ref:`compact_stats`.
 
         Basic Example:
 
@@ -169,6 +226,11 @@ class KazooClient(object):
         .. versionadded:: 1.2
             The connection_retry, command_retry and logger options.
 
+        .. versionadded:: 2.3
+            The zero_copy_reads, request_timeout, max_requests,
+            overflow_policy, connection_stagger, coalesce_reads and
+            compact_stats options.
+
         """
         self.logger = logger or log
 
@@ -182,7 +244,7 @@ class KazooClient(object):
         self.default_acl = default_acl
         self.randomize_hosts = randomize_hosts
         self.hosts = None
-        self.chroot = None
+        self._chroot = None
         self.set_hosts(hosts)
 
         # Curator like simplified state tracking, and listeners for
@@ -193,6 +255,33 @@ class KazooClient(object):
 
         self._reset()
         self.read_only = read_only
+        self.zero_copy_reads = zero_copy_reads
+        self.compact_stats = compact_stats
+        self.request_timeout = request_timeout
+        self.connection_stagger = connection_stagger
+
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ConfigurationError("overflow_policy must be one of %s" %
+                                     (OVERFLOW_POLICIES,))
+        self.max_requests = max_requests
+        self.overflow_policy = overflow_policy
+        self._limit_lock = self.handler.lock_object()
+        # Set by the connection when requests complete while callers are
+        # waiting for room in the queue
+        self._room = self.handler.event_object()
+        self._blocked = 0
+        self._rejected = 0
+        self._dropped = 0
+        # Whether the server supports multiRead, None until known
+        self._multi_read = None
+
+        self.coalesce_reads = coalesce_reads
+        self._coalesce_lock = self.handler.lock_object()
+        # (request type, path) of the reads in flight to their
+        # _CoalescedRead
+        self._coalesced = {}
+        self._coalesce_hits = 0
+        self._coalesce_misses = 0
 
         if client_id:
             self._session_id = client_id[0]
@@ -288,6 +377,7 @@ class KazooClient(object):
         self.SetPartitioner = partial(SetPartitioner, self)
         self.Semaphore = partial(Semaphore, self)
         self.ShallowParty = partial(ShallowParty, self)
+        self.TreeCache = partial(TreeCache, self)
 
         # If we got any unhandled keywords, complain like Python would
         if kwargs:
@@ -301,17 +391,57 @@ class KazooClient(object):
 
         self._reset_watchers()
         self._reset_session()
+        # Paths ensure_path found or created, with their ancestors
+        self._known_paths = set()
         self.last_zxid = 0
         self._protocol_version = None
 
     def _reset_watchers(self):
         self._child_watchers = defaultdict(set)
         self._data_watchers = defaultdict(set)
+        # Paths of the data watches set on a node that didn't exist
+        self._exist_watches = set()
+        self._persistent_watchers = defaultdict(set)
+        self._persistent_recursive_watchers = defaultdict(set)
+
+    def _remove_watchers(self, path, watcher_type, watcher=None):
+        """Remove the watchers of `watcher_type` on `path`, or only
+        `watcher` when given"""
+        tables = {
+            WatcherType.CHILDREN: self._child_watchers,
+            WatcherType.DATA: self._data_watchers,
+            WatcherType.PERSISTENT: self._persistent_watchers,
+            WatcherType.PERSISTENT_RECURSIVE:
+                self._persistent_recursive_watchers,
+        }
+        if watcher_type == WatcherType.ANY:
+            tables = list(tables.values())
+        else:
+            tables = [tables[watcher_type]]
+        for watchers in tables:
+            if watcher is None:
+                watchers.pop(path, None)
+            elif watcher in watchers.get(path, ()):
+                watchers[path].discard(watcher)
+                if not watchers[path]:
+                    del watchers[path]
+        if path not in self._data_watchers:
+            self._exist_watches.discard(path)
 
     def _reset_session(self):
         self._session_id = None
         self._session_passwd = b'\x00' * 16
 
+    @property
+    def chroot(self):
+        """The path of the chroot, `''` without one"""
+        return self._chroot.root if self._chroot is not None else None
+
+    @chroot.setter
+    def chroot(self, chroot):
+        # Normalized once for all the paths prefixed with it
+        self._chroot = _Chroot(chroot) if chroot is not None else None
+
     @property
     def client_state(self):
         """Returns the last Zookeeper client state
@@ -341,6 +471,58 @@ class KazooClient(object):
         established."""
         return self._live.is_set()
 
+    def stats(self):
+        """Returns statistics of the requests made by this client.
+
+        Requests are timed from being queued by the client to their
+        reply being handled, and their latencies kept in fixed
+        histogram buckets, so the percentiles are approximate (within
+        19%). Statistics are kept for the life of the client, across
+        reconnects.
+
+        :returns: A dict with:
+
+                  ``ops``
+                      A dict of the request type names (``'GetData'``,
+                      ``'Create'``...) to dicts with their ``count``
+                      of completed requests, how many of those were
+                      ``errors``, and their ``p50``, ``p99`` and
+                      ``max`` latencies in seconds.
+                  ``queue_depth``
+                      Requests queued, not yet sent.
+                  ``pending_depth``
+                      Requests sent, awaiting their reply.
+                  ``rejected``, ``dropped``
+                      Requests turned away, or dropped to make room for
+                      newer ones, for going over `max_requests`.
+                  ``timeouts``
+                      Requests that failed for going past the
+                      `request_timeout`, they're also counted as
+                      errors of their type.
+                  ``bytes_sent``, ``bytes_received``
+                      Bytes written to and read from the server
+                      connections.
+                  ``connections``, ``reconnects``
+                      How many times a connection to a server was
+                      established, and re-established.
+                  ``coalesce_hits``, ``coalesce_misses``
+                      With `coalesce_reads`, the reads that shared the
+                      request of an identical read in flight, and the
+                      ones that were sent.
+        :rtype: dict
+
+        .. versionadded:: 2.3
+
+        """
+        stats = self._connection.stats.snapshot()
+        stats['queue_depth'] = len(self._queue)
+        stats['pending_depth'] = len(self._pending)
+        stats['rejected'] = self._rejected
+        stats['dropped'] = self._dropped
+        stats['coalesce_hits'] = self._coalesce_hits
+        stats['coalesce_misses'] = self._coalesce_misses
+        return stats
+
     def set_hosts(self, hosts, randomize_hosts=None):
         """ sets the list of hosts used by this client.
 
@@ -376,12 +558,12 @@ class KazooClient(object):
         else:
             new_chroot = ''
 
-        if self.chroot is not None and new_chroot != self.chroot:
+        if self.chroot is None:
+            self.chroot = new_chroot
+        elif new_chroot != self.chroot:
             raise ConfigurationError("Changing chroot at runtime is not "
                                      "currently supported")
 
-        self.chroot = new_chroot
-
     def add_listener(self, listener):
         """Add a function to be called for connection state changes.
 
@@ -452,11 +634,11 @@ class KazooClient(object):
             self._reset()
         else:
             self.logger.info("Zookeeper connection lost")
-            # Connection lost
+            # Connection lost, the watches are kept and set again on
+            # the next connection if the session is still alive
             self._live.clear()
             self._notify_pending(state)
             self._make_state_change(KazooState.SUSPENDED)
-            self._reset_watchers()
 
     def _notify_pending(self, state):
         """Used to clear a pending response queue and request queue
@@ -468,22 +650,27 @@ class KazooClient(object):
         else:
             exc = ConnectionLoss()
 
+        stats = self._connection.stats
         while True:
             try:
-                request, async_object, xid = self._pending.popleft()
+                request, async_object, xid, started = self._pending.popleft()
                 if async_object:
+                    stats.record(request, started, error=True)
                     async_object.set_exception(exc)
             except IndexError:
                 break
 
         while True:
             try:
-                request, async_object = self._queue.popleft()
+                request, async_object, started = self._queue.popleft()
                 if async_object:
                     async_object.set_exception(exc)
             except IndexError:
                 break
 
+        # Wake up the callers waiting for room in the queue
+        self._room.set()
+
     def _safe_close(self):
         self.handler.stop()
         timeout = self._session_timeout // 1000
@@ -494,6 +681,76 @@ class KazooClient(object):
                 "Writer still open from prior connection "
                 "and wouldn't close after %s seconds" % timeout)
 
+    def _notify_room(self):
+        """Wake up the callers waiting for room in the queue, called
+        once requests have completed"""
+        # Under the lock, so a caller can't find the queue full, miss
+        # this and then wait
+        with self._limit_lock:
+            if self._blocked:
+                self._room.set()
+
+    def _bounded_append(self, request, async_object):
+        """Queue the request if there's room for it under max_requests,
+        or apply the overflow_policy
+
+        Returns False if the request was turned away.
+
+        """
+        deadline = None
+        if self.request_timeout is not None:
+            deadline = now() + self.request_timeout
+        queue = self._queue
+        while True:
+            with self._limit_lock:
+                if self.overflow_policy == 'block':
+                    # Clear before checking, so room made from here on
+                    # isn't missed
+                    self._room.clear()
+                if len(queue) + len(self._pending) < self.max_requests:
+                    queue.append((request, async_object, now()))
+                    return True
+
+                if self.overflow_policy == 'drop_oldest' and queue:
+                    try:
+                        dropped = queue.popleft()
+                    except IndexError:
+                        # Sent out from under us, there's room now
+                        continue
+                    self._dropped += 1
+                    if dropped[1]:
+                        dropped[1].set_exception(TooManyRequestsError(
+                            "Dropped for a newer request"))
+                    queue.append((request, async_object, now()))
+                    return True
+
+                if self.overflow_policy != 'block':
+                    self._rejected += 1
+                    if async_object is None:
+                        return False
+                    async_object.set_exception(TooManyRequestsError(
+                        "%s requests already queued or in flight" %
+                        self.max_requests))
+                    return False
+                self._blocked += 1
+
+            timeout = None
+            if deadline is not None:
+                timeout = max(deadline - now(), 0)
+            self._room.wait(timeout)
+            with self._limit_lock:
+                self._blocked -= 1
+
+            if self._state not in (KeeperState.CONNECTED,
+                                   KeeperState.CONNECTED_RO):
+                async_object.set_exception(ConnectionLoss())
+                return False
+            if deadline is not None and now() >= deadline:
+                self._rejected += 1
+                async_object.set_exception(self.handler.timeout_exception(
+                    "Timed out waiting for room in the request queue"))
+                return False
+
     def _call(self, request, async_object):
         """Ensure there's an active connection and put the request in
         the queue if there is.
@@ -515,7 +772,24 @@ class KazooClient(object):
             async_object.set_exception(SessionExpiredError())
             return False
 
-        self._queue.append((request, async_object))
+        if self.coalesce_reads:
+            # The connection's test hooks are plain objects
+            if (getattr(request, 'type', None) in COALESCED_TYPES and
+                    request.watcher is None):
+                async_object = self._coalesce(request, async_object)
+                if async_object is None:
+                    # Joined an identical read in flight
+                    return
+            elif self._coalesced:
+                # Reads sent from now on must see what this request
+                # does, so they can't join the ones sent before it
+                with self._coalesce_lock:
+                    self._coalesced = {}
+
+        if self.max_requests is None:
+            self._queue.append((request, async_object, now()))
+        elif not self._bounded_append(request, async_object):
+            return False
 
         # wake the connection, guarding against a race with close()
         write_sock = self._connection._write_sock
@@ -528,6 +802,23 @@ class KazooClient(object):
             async_object.set_exception(ConnectionClosedError(
                 "Connection has been closed"))
 
+    def _coalesce(self, request, async_object):
+        """Add `async_object` to the waiters of the identical read in
+        flight, returning None, or return the
+        :class:`_CoalescedRead` to send `request` with"""
+        # Keyed by class, lazy listings don't share eager ones' requests
+        key = (request.__class__, request.path)
+        with self._coalesce_lock:
+            read = self._coalesced.get(key)
+            if read is not None:
+                read.waiters.append(async_object)
+                self._coalesce_hits += 1
+                return None
+            read = self._coalesced[key] = _CoalescedRead(self, key,
+                                                         async_object)
+            self._coalesce_misses += 1
+        return read
+
     def start(self, timeout=15):
         """Initiate connection to ZK.
 
@@ -592,7 +883,7 @@ class KazooClient(object):
             return
 
         self._stopped.set()
-        self._queue.append((CloseInstance, None))
+        self._queue.append((CloseInstance, None, now()))
         self._connection._write_sock.send(b'\0')
         self._safe_close()
 
@@ -726,13 +1017,7 @@ class KazooClient(object):
 
     def unchroot(self, path):
         """Strip the chroot if applicable from the path."""
-        if not self.chroot:
-            return path
-
-        if path.startswith(self.chroot):
-            return path[len(self.chroot):]
-        else:
-            return path
+        return self._chroot.strip(path)
 
     def sync_async(self, path):
         """Asynchronous sync.
@@ -741,7 +1026,7 @@ class KazooClient(object):
 
         """
         async_result = self.handler.async_result()
-        self._call(Sync(_prefix_root(self.chroot, path)), async_result)
+        self._call(Sync(self._chroot.prefix(path)), async_result)
         return async_result
 
     def sync(self, path):
@@ -888,12 +1173,13 @@ class KazooClient(object):
             try:
                 return self.unchroot(result.get())
             except NoNodeError:
-                if not makepath:
-                    raise
                 if sequence and path.endswith('/'):
                     parent = path.rstrip('/')
                 else:
                     parent, _ = split(path)
+                self._forget_path(parent)
+                if not makepath:
+                    raise
                 self.ensure_path_async(parent, acl).rawlink(retry_completion)
 
         do_create()
@@ -902,7 +1188,7 @@ class KazooClient(object):
     def _create_async_inner(self, path, value, acl, flags, trailing=False):
         async_result = self.handler.async_result()
         call_result = self._call(
-            Create(_prefix_root(self.chroot, path, trailing=trailing),
+            Create(self._chroot.prefix(path, trailing=trailing),
                    value, acl, flags), async_result)
         if call_result is False:
             # We hit a short-circuit exit on the _call. Because we are
@@ -926,6 +1212,14 @@ class KazooClient(object):
         """Recursively create a path asynchronously if it doesn't
         exist. Takes the same arguments as :meth:`ensure_path`.
 
+        The missing nodes are found with exists requests sent without
+        waiting for the replies in between, and created in a single
+        transaction. The paths found or created are remembered until
+        they're deleted or the session is lost: ensuring a path below
+        one of them only checks the levels under it, ensuring one of
+        them again checks that node alone, in case another session
+        deleted it.
+
         :rtype: :class:`~kazoo.interfaces.IAsyncResult`
 
         .. versionadded:: 1.1
@@ -933,32 +1227,114 @@ class KazooClient(object):
         """
         acl = acl or self.default_acl
         async_result = self.handler.async_result()
+        # Walked up a level at a time with split, which needs it
+        # absolute and without a trailing slash
+        path = normpath('/' + path)
 
-        @wrap(async_result)
-        def create_completion(result):
-            try:
-                return result.get()
-            except NodeExistsError:
-                return True
+        @capture_exceptions(async_result)
+        def ensure():
+            # The path and its ancestors not known to exist, nearest to
+            # the root first. The root always exists, unless it's the
+            # chroot.
+            paths = []
+            current = path
+            while current not in self._known_paths:
+                parent, node = split(current)
+                if node or self.chroot:
+                    paths.insert(0, current)
+                if not node:
+                    break
+                current = parent
+            if not paths:
+                if path in self._known_paths:
+                    # Deleted by another session since, maybe
+                    self.exists_async(path).rawlink(known_completion)
+                else:
+                    # The root
+                    async_result.set(True)
+            elif len(paths) == 1:
+                # Cheaper to try creating it than to check first
+                create(paths)
+            else:
+                checked = self.handler.async_result()
+                self._read_pipelined(
+                    [Exists(self._chroot.prefix(p), None)
+                     for p in paths], checked)
+                checked.rawlink(partial(exists_completion, paths))
 
         @capture_exceptions(async_result)
-        def prepare_completion(next_path, result):
-            result.get()
-            self.create_async(next_path, acl=acl).rawlink(create_completion)
+        def known_completion(result):
+            if result.get() is not None:
+                async_result.set(True)
+            else:
+                self._forget_path(path)
+                ensure()
 
-        @wrap(async_result)
-        def exists_completion(path, result):
-            if result.get():
-                return True
-            parent, node = split(path)
-            if node:
-                self.ensure_path_async(parent, acl=acl).rawlink(
-                    partial(prepare_completion, path))
+        @capture_exceptions(async_result)
+        def exists_completion(paths, result):
+            stats = result.get()
+            for stat in stats:
+                if isinstance(stat, Exception):
+                    raise stat
+            # A node existing means its ancestors do too
+            missing = paths
+            for index in range(len(paths) - 1, -1, -1):
+                if stats[index] is not None:
+                    self._known_paths.update(paths[:index + 1])
+                    missing = paths[index + 1:]
+                    break
+            if missing:
+                create(missing)
             else:
-                self.create_async(path, acl=acl).rawlink(create_completion)
+                async_result.set(True)
 
-        self.exists_async(path).rawlink(partial(exists_completion, path))
+        def create(paths):
+            parent_known = split(paths[0])[0] in self._known_paths
+            if len(paths) == 1:
+                result = self.create_async(paths[0], acl=acl)
+            else:
+                transaction = self.transaction()
+                for p in paths:
+                    transaction.create(p, acl=acl)
+                result = transaction.commit_async()
+            result.rawlink(partial(create_completion, paths, parent_known))
 
+        @capture_exceptions(async_result)
+        def create_completion(paths, parent_known, result):
+            try:
+                results = result.get()
+            except (NodeExistsError, NoNodeError) as exc:
+                results = [exc]
+            if not isinstance(results, list):
+                results = [results]
+            # A failed transaction has the error of the operation that
+            # failed, the others are rolled back or not run
+            for index, error in enumerate(results):
+                if (isinstance(error, Exception) and
+                        not isinstance(error, RolledBackError)):
+                    break
+            else:
+                self._known_paths.update(paths)
+                # The path of the node created last, like create
+                async_result.set(results[-1])
+                return
+
+            if isinstance(error, NodeExistsError):
+                # Created by someone else meanwhile
+                self._known_paths.update(paths[:index + 1])
+                if paths[index + 1:]:
+                    create(paths[index + 1:])
+                else:
+                    async_result.set(True)
+            elif (isinstance(error, NoNodeError) and index == 0 and
+                    parent_known):
+                # The parent was deleted since it was found
+                self._forget_path(split(paths[0])[0])
+                ensure()
+            else:
+                raise error
+
+        ensure()
         return async_result
 
     def exists(self, path, watch=None):
@@ -996,7 +1372,7 @@ class KazooClient(object):
             raise TypeError("Invalid type for 'watch' (must be a callable)")
 
         async_result = self.handler.async_result()
-        self._call(Exists(_prefix_root(self.chroot, path), watch),
+        self._call(Exists(self._chroot.prefix(path), watch),
                    async_result)
         return async_result
 
@@ -1038,11 +1414,12 @@ class KazooClient(object):
             raise TypeError("Invalid type for 'watch' (must be a callable)")
 
         async_result = self.handler.async_result()
-        self._call(GetData(_prefix_root(self.chroot, path), watch),
+        self._call(GetData(self._chroot.prefix(path), watch),
                    async_result)
         return async_result
 
-    def get_children(self, path, watch=None, include_data=False):
+    def get_children(self, path, watch=None, include_data=False,
+                     lazy=False):
         """Get a list of child nodes of a path.
 
         If a watch is provided it will be left on the node with the
@@ -1060,6 +1437,12 @@ class KazooClient(object):
             Include the :class:`~kazoo.protocol.states.ZnodeStat` of
             the node in addition to the children. This option changes
             the return value to be a tuple of (children, stat).
+        :param lazy:
+            Return the names as a
+            :class:`~kazoo.protocol.states.ChildNames`, decoding them
+            as they're accessed, instead of a list. Listing a node with
+            many children is then much cheaper for the connection
+            thread.
 
         :returns: List of child node names, or tuple if `include_data`
                   is `True`.
@@ -1075,10 +1458,15 @@ class KazooClient(object):
         .. versionadded:: 0.5
             The `include_data` option.
 
+        .. versionadded:: 2.3
+            The `lazy` option.
+
         """
-        return self.get_children_async(path, watch, include_data).get()
+        return self.get_children_async(path, watch, include_data,
+                                       lazy).get()
 
-    def get_children_async(self, path, watch=None, include_data=False):
+    def get_children_async(self, path, watch=None, include_data=False,
+                           lazy=False):
         """Asynchronously get a list of child nodes of a path. Takes
         the same arguments as :meth:`get_children`.
 
@@ -1091,15 +1479,330 @@ class KazooClient(object):
             raise TypeError("Invalid type for 'watch' (must be a callable)")
         if not isinstance(include_data, bool):
             raise TypeError("Invalid type for 'include_data' (bool expected)")
+        if not isinstance(lazy, bool):
+            raise TypeError("Invalid type for 'lazy' (bool expected)")
 
         async_result = self.handler.async_result()
         if include_data:
-            req = GetChildren2(_prefix_root(self.chroot, path), watch)
+            request_class = LazyGetChildren2 if lazy else GetChildren2
         else:
-            req = GetChildren(_prefix_root(self.chroot, path), watch)
+            request_class = LazyGetChildren if lazy else GetChildren
+        req = request_class(self._chroot.prefix(path), watch)
         self._call(req, async_result)
         return async_result
 
+    def get_many(self, paths):
+        """Get the values of several nodes in a single request.
+
+        Uses a ZooKeeper 3.6 multiRead request, or a get request per
+        node with servers that don't support it. Unlike a transaction,
+        a read failing doesn't fail the others.
+
+        :param paths: List of paths of nodes.
+        :returns:
+            List with, in the order of `paths`, a tuple (value,
+            :class:`~kazoo.protocol.states.ZnodeStat`) for each node
+            read, or the :exc:`~kazoo.exceptions.ZookeeperError`
+            instance the read failed with, such as
+            :exc:`~kazoo.exceptions.NoNodeError`.
+        :rtype: list
+
+        .. versionadded:: 2.3
+
+        """
+        return self.get_many_async(paths).get()
+
+    def get_many_async(self, paths):
+        """Asynchronously get the values of several nodes in a single
+        request. Takes the same arguments as :meth:`get_many`.
+
+        :rtype: :class:`~kazoo.interfaces.IAsyncResult`
+
+        """
+        return self._read_many_async(
+            [GetData(path, None) for path in self._many_paths(paths)])
+
+    def get_children_many(self, paths):
+        """Get the lists of child nodes of several paths in a single
+        request.
+
+        Uses a ZooKeeper 3.6 multiRead request, or a get_children
+        request per path with servers that don't support it.
+
+        :param paths: List of paths of nodes to list.
+        :returns:
+            List with, in the order of `paths`, the list of child node
+            names of each node, or the
+            :exc:`~kazoo.exceptions.ZookeeperError` instance listing it
+            failed with.
+        :rtype: list
+
+        .. versionadded:: 2.3
+
+        """
+        return self.get_children_many_async(paths).get()
+
+    def get_children_many_async(self, paths):
+        """Asynchronously get the lists of child nodes of several paths
+        in a single request. Takes the same arguments as
+        :meth:`get_children_many`.
+
+        :rtype: :class:`~kazoo.interfaces.IAsyncResult`
+
+        """
+        return self._read_many_async(
+            [GetChildren(path, None) for path in self._many_paths(paths)])
+
+    def _many_paths(self, paths):
+        if isinstance(paths, string_types):
+            raise TypeError("Invalid type for 'paths' (list expected)")
+        paths = list(paths)
+        for path in paths:
+            if not isinstance(path, string_types):
+                raise TypeError("Invalid type for 'paths' (list of strings "
+                                "expected)")
+        return [self._chroot.prefix(path) for path in paths]
+
+    def _read_many_async(self, requests):
+        """Send the reads in a MultiRead, or one by one if the server
+        doesn't support it"""
+        async_result = self.handler.async_result()
+        if not requests:
+            async_result.set([])
+            return async_result
+        if self._multi_read is False:
+            self._read_pipelined(requests, async_result)
+            return async_result
+        if self._multi_read:
+            self._call(MultiRead(requests), async_result)
+            return async_result
+
+        # A server without multiRead fails it, and may drop the
+        # connection: the reads are then sent one by one once connected
+        # again
+        lock = self.handler.lock_object()
+        seen = dict(unsupported=False, done=False)
+
+        def fallback():
+            seen['done'] = True
+            self.handler.spawn(self._read_pipelined, requests, async_result)
+
+        def listener(state):
+            with lock:
+                if seen['done']:
+                    return True
+                if seen['unsupported'] and state != KazooState.SUSPENDED:
+                    fallback()
+                    return True
+
+        def multi_read_completion(result):
+            try:
+                async_result.set(result.get())
+                self._multi_read = True
+            except UnimplementedError:
+                self._multi_read = False
+                with lock:
+                    seen['unsupported'] = True
+                    if self.state == KazooState.SUSPENDED:
+                        # The listener falls back once connected again
+                        return
+                    fallback()
+            except Exception as exc:
+                async_result.set_exception(exc)
+            self.remove_listener(listener)
+
+        self.add_listener(listener)
+        multi_read = self.handler.async_result()
+        self._call(MultiRead(requests), multi_read)
+        multi_read.rawlink(multi_read_completion)
+        return async_result
+
+    def _forget_path(self, path):
+        """Forget that `path` and the nodes under it exist, returning
+        whether it was known to"""
+        known = self._known_paths
+        if path not in known:
+            # Its descendants aren't known either
+            return False
+        prefix = path.rstrip('/') + '/'
+        for known_path in list(known):
+            if known_path == path or known_path.startswith(prefix):
+                known.discard(known_path)
+        return True
+
+    def _read_pipelined(self, requests, async_result):
+        """Send the reads one after the other without waiting for the
+        replies, and set `async_result` once all are in"""
+        results = [self.handler.async_result() for request in requests]
+        lock = self.handler.lock_object()
+        remaining = [len(requests)]
+
+        def completion(result):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            async_result.set([
+                read.value if read.exception is None else read.exception
+                for read in results])
+
+        for request, result in zip(requests, results):
+            self._call(request, result)
+        for result in results:
+            result.rawlink(completion)
+
+    def add_watch(self, path, watch, mode=AddWatchMode.PERSISTENT):
+        """Set a watch that stays set after it's triggered.
+
+        Unlike the watches left by :meth:`get`, :meth:`exists` and
+        :meth:`get_children`, the watch doesn't have to be set again
+        after each event, so no event is missed in between. It's
+        triggered until it's removed with :meth:`remove_watches` or the
+        session is lost. The node doesn't have to exist.
+
+        :param path: Path of node.
+        :param watch: Watch callback to set for future changes to this
+                      path, or to the nodes under it.
+        :param mode:
+            A :class:`~kazoo.protocol.states.AddWatchMode` attribute.
+            In the `PERSISTENT` mode the watch is triggered by the
+            changes to the node and to its children, in the
+            `PERSISTENT_RECURSIVE` mode by the nodes under it being
+            created, deleted and changed as well, but not by child
+            events.
+
+        :raises:
+            :exc:`~kazoo.exceptions.UnimplementedError` if the server
+            doesn't support persistent watches.
+
+            :exc:`~kazoo.exceptions.ZookeeperError` if the server
+            returns a non-zero error code.
+
+        .. versionadded:: 2.3
+            Requires Zookeeper 3.6+
+
+        """
+        return self.add_watch_async(path, watch, mode).get()
+
+    def add_watch_async(self, path, watch, mode=AddWatchMode.PERSISTENT):
+        """Asynchronously set a watch that stays set after it's
+        triggered. Takes the same arguments as :meth:`add_watch`.
+
+        :rtype: :class:`~kazoo.interfaces.IAsyncResult`
+
+        """
+        if not isinstance(path, string_types):
+            raise TypeError("Invalid type for 'path' (string expected)")
+        if not callable(watch):
+            raise TypeError("Invalid type for 'watch' (must be a callable)")
+        if mode not in (AddWatchMode.PERSISTENT,
+                        AddWatchMode.PERSISTENT_RECURSIVE):
+            raise TypeError("Invalid value for 'mode' (AddWatchMode "
+                            "expected)")
+
+        async_result = self.handler.async_result()
+        self._call(AddWatch(self._chroot.prefix(path), watch, mode),
+                   async_result)
+        return async_result
+
+    def remove_watches(self, path, watch=None,
+                       watcher_type=WatcherType.ANY):
+        """Remove the watches of a type on a node.
+
+        Without a `watch` every watch of the type on the node is
+        removed, on the server as well. With a `watch` only that
+        callback is removed, once the server confirmed it has a watch of
+        the type on the node. The server keeps its watch for the other
+        callbacks and it's ignored when triggered if there are none.
+
+        :param path: Path of node.
+        :param watch: Optional watch callback to remove.
+        :param watcher_type:
+            A :class:`~kazoo.protocol.states.WatcherType` attribute.
+
+        :raises:
+            :exc:`~kazoo.exceptions.NoWatcherError` if the server has
+            no watch of the type on the node.
+
+            :exc:`~kazoo.exceptions.ZookeeperError` if the server
+            returns a non-zero error code.
+
+        .. versionadded:: 2.3
+            Requires Zookeeper 3.5+, 3.6+ for the persistent watcher
+            types
+
+        """
+        return self.remove_watches_async(path, watch, watcher_type).get()
+
+    def remove_watches_async(self, path, watch=None,
+                             watcher_type=WatcherType.ANY):
+        """Asynchronously remove the watches of a type on a node. Takes
+        the same arguments as :meth:`remove_watches`.
+
+        :rtype: :class:`~kazoo.interfaces.IAsyncResult`
+
+        """
+        self._check_watches_args(path, watch, watcher_type)
+
+        async_result = self.handler.async_result()
+        path = self._chroot.prefix(path)
+        if watch:
+            req = CheckWatches(path, watcher_type, watch)
+        else:
+            req = RemoveWatches(path, watcher_type)
+        self._call(req, async_result)
+        return async_result
+
+    def check_watches(self, path, watcher_type=WatcherType.ANY):
+        """Check the server has a watch of a type on a node.
+
+        :param path: Path of node.
+        :param watcher_type:
+            A :class:`~kazoo.protocol.states.WatcherType` attribute.
+        :returns: `True` if the server has a watch of the type on the
+                  node, else `False`.
+        :rtype: bool
+
+        :raises:
+            :exc:`~kazoo.exceptions.ZookeeperError` if the server
+            returns a non-zero error code.
+
+        .. versionadded:: 2.3
+            Requires Zookeeper 3.5+
+
+        """
+        try:
+            return self.check_watches_async(path, watcher_type).get()
+        except NoWatcherError:
+            return False
+
+    def check_watches_async(self, path, watcher_type=WatcherType.ANY):
+        """Asynchronously check the server has a watch of a type on a
+        node. Takes the same arguments as :meth:`check_watches`, the
+        result raises :exc:`~kazoo.exceptions.NoWatcherError` instead of
+        being `False`.
+
+        :rtype: :class:`~kazoo.interfaces.IAsyncResult`
+
+        """
+        self._check_watches_args(path, None, watcher_type)
+
+        async_result = self.handler.async_result()
+        self._call(CheckWatches(self._chroot.prefix(path),
+                                watcher_type, None), async_result)
+        return async_result
+
+    def _check_watches_args(self, path, watch, watcher_type):
+        if not isinstance(path, string_types):
+            raise TypeError("Invalid type for 'path' (string expected)")
+        if watch and not callable(watch):
+            raise TypeError("Invalid type for 'watch' (must be a callable)")
+        if watcher_type not in (WatcherType.CHILDREN, WatcherType.DATA,
+                                WatcherType.ANY, WatcherType.PERSISTENT,
+                                WatcherType.PERSISTENT_RECURSIVE):
+            raise TypeError("Invalid value for 'watcher_type' (WatcherType "
+                            "expected)")
+
     def get_acls(self, path):
         """Return the ACL and stat of the node of the given path.
 
@@ -1131,7 +1834,7 @@ class KazooClient(object):
             raise TypeError("Invalid type for 'path' (string expected)")
 
         async_result = self.handler.async_result()
-        self._call(GetACL(_prefix_root(self.chroot, path)), async_result)
+        self._call(GetACL(self._chroot.prefix(path)), async_result)
         return async_result
 
     def set_acls(self, path, acls, version=-1):
@@ -1179,7 +1882,7 @@ class KazooClient(object):
             raise TypeError("Invalid type for 'version' (int expected)")
 
         async_result = self.handler.async_result()
-        self._call(SetACL(_prefix_root(self.chroot, path), acls, version),
+        self._call(SetACL(self._chroot.prefix(path), acls, version),
                    async_result)
         return async_result
 
@@ -1233,7 +1936,7 @@ class KazooClient(object):
             raise TypeError("Invalid type for 'version' (int expected)")
 
         async_result = self.handler.async_result()
-        self._call(SetData(_prefix_root(self.chroot, path), value, version),
+        self._call(SetData(self._chroot.prefix(path), value, version),
                    async_result)
         return async_result
 
@@ -1254,7 +1957,7 @@ class KazooClient(object):
         """
         return TransactionRequest(self)
 
-    def delete(self, path, version=-1, recursive=False):
+    def delete(self, path, version=-1, recursive=False, progress=None):
         """Delete a node.
 
         The call will succeed if such a node exists, and the given
@@ -1270,6 +1973,10 @@ class KazooClient(object):
         :param recursive: Recursively delete node and all its children,
                           defaults to False.
         :type recursive: bool
+        :param progress: When `recursive`, called after each batch of
+                         nodes is deleted with the number of nodes
+                         deleted so far and the rate in nodes per
+                         second since the call.
 
         :raises:
             :exc:`~kazoo.exceptions.BadVersionError` if version doesn't
@@ -1284,11 +1991,17 @@ class KazooClient(object):
             :exc:`~kazoo.exceptions.ZookeeperError` if the server
             returns a non-zero error code.
 
+        .. versionchanged:: 2.3
+            Recursive deletes list the tree a level at a time and
+            delete it from the bottom in transactions, with many
+            requests in flight at once. The progress argument.
+
         """
         if not isinstance(recursive, bool):
             raise TypeError("Invalid type for 'recursive' (bool expected)")
         if recursive:
-            return self._delete_recursive(path)
+            self._delete_recursive(path, progress)
+            return True
         else:
             return self.delete_async(path, version).get()
 
@@ -1304,28 +2017,100 @@ class KazooClient(object):
         if not isinstance(version, int):
             raise TypeError("Invalid type for 'version' (int expected)")
         async_result = self.handler.async_result()
-        self._call(Delete(_prefix_root(self.chroot, path), version),
+        self._forget_path(path)
+        self._call(Delete(self._chroot.prefix(path), version),
                    async_result)
         return async_result
 
-    def _delete_recursive(self, path):
+    def _delete_recursive(self, path, progress=None, window=100,
+                          batch_size=100):
+        """Delete the tree under `path` a level at a time from the
+        bottom, with at most `window` requests in flight and
+        `batch_size` deletes per transaction, returning how many nodes
+        were deleted"""
+        if self.max_requests is not None:
+            window = max(min(window, self.max_requests), 1)
+        started = now()
         try:
             children = self.get_children(path)
         except NoNodeError:
-            return True
-
-        if children:
-            for child in children:
-                if path == "/":
-                    child_path = path + child
+            return 0
+
+        levels = [[path]]
+        level = [path.rstrip('/') + '/' + child for child in children]
+        while level:
+            levels.append(level)
+            level = []
+            calls = [partial(self.get_children_async, parent)
+                     for parent in levels[-1]]
+            for parent, result in zip(levels[-1],
+                                      self._windowed(calls, window)):
+                try:
+                    children = result.get()
+                except NoNodeError:
+                    continue
+                level.extend(parent.rstrip('/') + '/' + child
+                             for child in children)
+
+        deleted = 0
+        for level in reversed(levels):
+            batches = [level[i:i + batch_size]
+                       for i in range(0, len(level), batch_size)]
+            calls = [partial(self._delete_batch_async, batch)
+                     for batch in batches]
+            for batch, result in zip(batches, self._windowed(calls, window)):
+                if any(isinstance(r, Exception) for r in result.get()):
+                    # Some of the nodes were deleted or got children
+                    # meanwhile, the others are left
+                    deleted += self._delete_each(batch, window, batch_size)
                 else:
-                    child_path = path + "/" + child
-
-                self._delete_recursive(child_path)
-        try:
-            self.delete(path)
-        except NoNodeError:  # pragma: nocover
-            pass
+                    deleted += len(batch)
+                if progress is not None:
+                    progress(deleted, deleted / max(now() - started, 1e-9))
+
+        self.logger.debug("Deleted %s nodes under %s in %.3fs", deleted,
+                          path, now() - started)
+        return deleted
+
+    def _delete_batch_async(self, paths):
+        transaction = self.transaction()
+        for path in paths:
+            transaction.delete(path)
+        return transaction.commit_async()
+
+    def _delete_each(self, paths, window, batch_size):
+        """Delete the nodes one by one, and the trees under the ones that
+        got children meanwhile, returning how many nodes were"""
+        deleted = 0
+        calls = [partial(self.delete_async, path) for path in paths]
+        for path, result in zip(paths, self._windowed(calls, window)):
+            try:
+                result.get()
+            except NoNodeError:
+                continue
+            except NotEmptyError:
+                deleted += self._delete_recursive(path, window=window,
+                                                  batch_size=batch_size)
+            else:
+                deleted += 1
+        return deleted
+
+    def _windowed(self, calls, window):
+        """Make the `calls` returning async results, with at most
+        `window` waiting for their reply, and yield the results in
+        order once they're in"""
+        # Replies come in the order the requests were sent
+        outstanding = deque()
+        for call in calls:
+            if len(outstanding) >= window:
+                result = outstanding.popleft()
+                result.wait()
+                yield result
+            outstanding.append(call())
+        while outstanding:
+            result = outstanding.popleft()
+            result.wait()
+            yield result
 
     def reconfig(self, joining, leaving, new_members, from_config=-1):
         """Reconfig a cluster.
@@ -1479,7 +2264,7 @@ class TransactionRequest(object):
         if acl is None:
             acl = OPEN_ACL_UNSAFE
 
-        self._add(Create(_prefix_root(self.client.chroot, path), value, acl,
+        self._add(Create(self.client._chroot.prefix(path), value, acl,
                          flags), None)
 
     def delete(self, path, version=-1):
@@ -1492,7 +2277,8 @@ class TransactionRequest(object):
             raise TypeError("Invalid type for 'path' (string expected)")
         if not isinstance(version, int):
             raise TypeError("Invalid type for 'version' (int expected)")
-        self._add(Delete(_prefix_root(self.client.chroot, path), version))
+        self.client._forget_path(path)
+        self._add(Delete(self.client._chroot.prefix(path), version))
 
     def set_data(self, path, value, version=-1):
         """Add a set ZNode value to the transaction. Takes the same
@@ -1505,7 +2291,7 @@ class TransactionRequest(object):
             raise TypeError("Invalid type for 'value' (must be a byte string)")
         if not isinstance(version, int):
             raise TypeError("Invalid type for 'version' (int expected)")
-        self._add(SetData(_prefix_root(self.client.chroot, path), value,
+        self._add(SetData(self.client._chroot.prefix(path), value,
                   version))
 
     def check(self, path, version):
@@ -1519,7 +2305,7 @@ class TransactionRequest(object):
             raise TypeError("Invalid type for 'path' (string expected)")
         if not isinstance(version, int):
             raise TypeError("Invalid type for 'version' (int expected)")
-        self._add(CheckVersion(_prefix_root(self.client.chroot, path),
+        self._add(CheckVersion(self.client._chroot.prefix(path),
                   version))
 
     def commit_async(self):
@@ -1559,3 +2345,39 @@ class TransactionRequest(object):
         self._check_tx_state()
         self.client.logger.log(BLATHER, 'Added %r to %r', request, self)
         self.operations.append(request)
+
+
+class _CoalescedRead(object):
+    """Stands in for the async results of the identical reads sharing
+    a request, setting them all from its reply"""
+    __slots__ = ('client', 'key', 'waiters')
+
+    def __init__(self, client, key, async_object):
+        self.client = client
+        self.key = key
+        self.waiters = [async_object]
+
+    def _take_waiters(self):
+        client = self.client
+        with client._coalesce_lock:
+            # Reads from now on need a request of their own
+            if client._coalesced.get(self.key) is self:
+                del client._coalesced[self.key]
+            return self.waiters
+
+    def set(self, value=None):
+        waiters = self._take_waiters()
+        if self.key[0] is GetChildren:
+            # Everyone gets a list of their own to modify
+            for async_object in waiters:
+                async_object.set(list(value))
+        elif self.key[0] is GetChildren2:
+            for async_object in waiters:
+                async_object.set((list(value[0]), value[1]))
+        else:
+            for async_object in waiters:
+                async_object.set(value)
+
+    def set_exception(self, exception):
+        for async_object in self._take_waiters():
+            async_object.set_exception(exception)
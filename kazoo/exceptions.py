@@ -43,6 +43,14 @@ class WriterNotClosedException(KazooException):
     """
 
 
+class TooManyRequestsError(KazooException):
+    """Raised when a request is turned away or dropped because the
+    client's `max_requests` are already queued or in flight.
+
+    .. versionadded:: 2.3
+    """
+
+
 def _invalid_error_code():
     raise RuntimeError('Invalid error code')
 
@@ -183,6 +191,11 @@ class NotReadOnlyCallError(ZookeeperError):
     a read-only server"""
 
 
+@_zookeeper_exception(-121)
+class NoWatcherError(ZookeeperError):
+    """The server has no watch of the given type on the node"""
+
+
 class ConnectionClosedError(SessionExpiredError):
     """Connection is closed"""
 
@@ -0,0 +1,226 @@
+"""An asyncio based handler.
+
+The :class:`AsyncioHandler` is intended for applications running an
+:mod:`asyncio` event loop. Results of the ``*_async`` client methods
+and the event returned by
+:meth:`~kazoo.client.KazooClient.start_async` can be awaited on the
+loop.
+
+Example:
+
+.. code-block:: python
+
+    import asyncio
+
+    from kazoo.client import KazooClient
+    from kazoo.handlers.asyncio import AsyncioHandler
+
+    async def main(loop):
+        zk = KazooClient(handler=AsyncioHandler(loop))
+        await zk.start_async()
+        data, stat = await zk.get_async('/some/node')
+
+The socket I/O of the connection is done by a single thread dedicated
+to it, which hands replies over to the loop in batches. No thread is
+parked per request, so any number of requests can be awaited
+concurrently on one loop.
+
+.. warning::
+
+    The blocking client methods (like :meth:`~kazoo.client.KazooClient.get`)
+    keep working but block the event loop while they wait, use the
+    ``*_async`` methods from coroutines instead. Completion and watch
+    callbacks are run in worker threads, use
+    :meth:`~asyncio.AbstractEventLoop.call_soon_threadsafe` to get back
+    on the loop from them.
+
+"""
+from __future__ import absolute_import
+
+import asyncio
+import collections
+import logging
+import threading
+
+from kazoo.handlers import threading as threading_handler
+from kazoo.handlers.threading import SequentialThreadingHandler
+# Re-exported, it's what the results raise when get() times out
+from kazoo.handlers.threading import KazooTimeoutError  # noqa
+
+log = logging.getLogger(__name__)
+
+
+def _create_future(loop):
+    try:
+        return loop.create_future()
+    except AttributeError:  # pragma: nocover
+        # Python < 3.5.2
+        return asyncio.Future(loop=loop)
+
+
+class _LoopQueue(object):
+    """Runs the functions put on it in order on the event loop
+
+    Functions put while earlier ones are still waiting to be run share
+    a single wakeup of the loop.
+
+    """
+    def __init__(self, handler):
+        self._handler = handler
+        self._lock = threading.Lock()
+        self._funcs = collections.deque()
+        self._scheduled = False
+
+    def put(self, func):
+        with self._lock:
+            self._funcs.append(func)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        try:
+            self._handler.loop.call_soon_threadsafe(self._run)
+        except RuntimeError:
+            # the loop is closed, nobody is left to await the results
+            log.debug("Event loop is closed, dropping awaited results")
+
+    def _run(self):
+        with self._lock:
+            funcs = self._funcs
+            self._funcs = collections.deque()
+            self._scheduled = False
+        for func in funcs:
+            try:
+                func()
+            except Exception:
+                log.exception("Exception in event loop callback")
+
+
+class AsyncResult(threading_handler.AsyncResult):
+    """A one-time event that stores a value or an exception
+
+    Besides the :class:`~kazoo.interfaces.IAsyncResult` API the result
+    can be awaited (or yielded from) on the handler's event loop. Like
+    its base it allocates nothing until somebody waits for it: the
+    futures of the awaiting coroutines are only kept once it's awaited.
+
+    """
+    __slots__ = ('_futures',)
+
+    def __init__(self, handler, lock=None):
+        super(AsyncResult, self).__init__(handler, lock)
+        self._futures = None
+
+    def _notify(self, callbacks, event):
+        super(AsyncResult, self)._notify(callbacks, event)
+        # Futures added after the result was set are resolved by
+        # __iter__ itself, at worst this queues a _resolve with nothing
+        # left to do
+        if self._futures:
+            self._handler._loop_queue.put(self._resolve)
+
+    def _resolve(self):
+        with self._lock:
+            futures, self._futures = self._futures, None
+        for future in futures or ():
+            if future.cancelled():
+                continue
+            if self._exception is None:
+                future.set_result(self.value)
+            else:
+                future.set_exception(self._exception)
+
+    def __iter__(self):
+        future = _create_future(self._handler.loop)
+        with self._lock:
+            if self._futures is None:
+                self._futures = [future]
+            else:
+                self._futures.append(future)
+            ready = self.ready()
+        if ready:
+            self._resolve()
+        return iter(future)
+
+    __await__ = __iter__
+
+
+class Event(object):
+    """A :class:`threading.Event` that can also be awaited on the
+    handler's event loop"""
+    def __init__(self, handler):
+        self._handler = handler
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._futures = []
+
+    def is_set(self):
+        return self._event.is_set()
+
+    isSet = is_set
+
+    def set(self):
+        with self._lock:
+            self._event.set()
+            awaited = bool(self._futures)
+        if awaited:
+            self._handler._loop_queue.put(self._resolve)
+
+    def clear(self):
+        self._event.clear()
+
+    def wait(self, timeout=None):
+        return self._event.wait(timeout)
+
+    def _resolve(self):
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            if not future.cancelled():
+                future.set_result(True)
+
+    def __iter__(self):
+        future = _create_future(self._handler.loop)
+        with self._lock:
+            if self._event.is_set():
+                future.set_result(True)
+            else:
+                self._futures.append(future)
+        return iter(future)
+
+    __await__ = __iter__
+
+
+class AsyncioHandler(SequentialThreadingHandler):
+    """Asyncio handler resolving awaited results on an event loop.
+
+    Results returned by the ``*_async`` client methods and the events
+    created by this handler can be awaited on the event loop passed in
+    (or the current event loop if not given). Awaited results are
+    handed over to the loop straight from the connection thread, in
+    batches sharing a single wakeup of the loop.
+
+    Completion and watch callbacks are run by worker threads exactly
+    like with the
+    :class:`~kazoo.handlers.threading.SequentialThreadingHandler`, which
+    keeps the blocking client methods (built on those callbacks) working
+    whether or not the loop is running.
+
+    """
+    name = "asyncio_handler"
+
+    def __init__(self, loop=None):
+        """Create a :class:`AsyncioHandler` instance
+
+        :param loop: The :mod:`asyncio` event loop to resolve awaited
+                     results on.
+
+        """
+        super(AsyncioHandler, self).__init__()
+        self.loop = loop if loop is not None else asyncio.get_event_loop()
+        self._loop_queue = _LoopQueue(self)
+
+    def event_object(self):
+        return Event(self)
+
+    def async_result(self):
+        return AsyncResult(self, self._result_lock)
@@ -156,6 +156,10 @@ class SequentialEventletHandler(object):
     def create_connection(self, *args, **kwargs):
         return utils.create_tcp_connection(green_socket, *args, **kwargs)
 
+    def create_first_connection(self, addresses, timeout, stagger):
+        return utils.create_first_tcp_connection(
+            green_socket, self.select, addresses, timeout, stagger)
+
     def select(self, *args, **kwargs):
         with _yield_before_after():
             return green_select.select(*args, **kwargs)
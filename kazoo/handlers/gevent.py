@@ -123,6 +123,10 @@ class SequentialGeventHandler(object):
     def create_connection(self, *args, **kwargs):
         return utils.create_tcp_connection(socket, *args, **kwargs)
 
+    def create_first_connection(self, addresses, timeout, stagger):
+        return utils.create_first_tcp_connection(
+            socket, self.select, addresses, timeout, stagger)
+
     def create_socket_pair(self):
         return utils.create_socket_pair(socket)
 
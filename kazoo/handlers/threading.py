@@ -12,7 +12,8 @@ environments that use threads.
 """
 from __future__ import absolute_import
 
-import errno
+import functools
+import heapq
 import logging
 import select
 import socket
@@ -30,20 +31,149 @@ from kazoo.handlers import utils
 
 # sentinel objects
 _STOP = object()
+_NONE = object()
 
 log = logging.getLogger(__name__)
 
+# How many of the slowest watch callbacks callback_stats reports
+SLOWEST_CALLBACKS = 10
+
 
 class KazooTimeoutError(Exception):
     pass
 
 
-class AsyncResult(utils.AsyncResult):
-    """A one-time event that stores a value or an exception"""
-    def __init__(self, handler):
-        super(AsyncResult, self).__init__(handler,
-                                          threading.Condition,
-                                          KazooTimeoutError)
+def _run_callbacks(result, callbacks):
+    for callback in callbacks:
+        try:
+            callback(result)
+        except Exception:
+            log.exception("Exception in worker queue thread")
+
+
+class AsyncResult(object):
+    """A one-time event that stores a value or an exception
+
+    Unlike :class:`kazoo.handlers.utils.AsyncResult` it doesn't create
+    a condition for every result: an event is only created when a
+    caller blocks on the result before it's set. The callbacks linked
+    to it are queued together as a single completion, and nothing is
+    queued when there are none.
+
+    Its state is guarded by `lock`, which is only held while the result
+    is updated and can be shared: the handler passes the same lock to
+    all of its results. A lock of its own is created if none is given.
+
+    """
+    __slots__ = ('_handler', '_lock', '_exception', '_callbacks', '_event',
+                 'value', '__weakref__')
+
+    def __init__(self, handler, lock=None):
+        self._handler = handler
+        self._lock = lock if lock is not None else threading.Lock()
+        self._exception = _NONE
+        self._callbacks = None
+        self._event = None
+        self.value = None
+
+    def ready(self):
+        """Return true if and only if it holds a value or an
+        exception"""
+        return self._exception is not _NONE
+
+    def successful(self):
+        """Return true if and only if it is ready and holds a value"""
+        return self._exception is None
+
+    @property
+    def exception(self):
+        if self._exception is not _NONE:
+            return self._exception
+
+    def set(self, value=None):
+        """Store the value. Wake up the waiters."""
+        with self._lock:
+            self.value = value
+            self._exception = None
+            callbacks, event = self._callbacks, self._event
+        self._notify(callbacks, event)
+
+    def set_exception(self, exception):
+        """Store the exception. Wake up the waiters."""
+        with self._lock:
+            self._exception = exception
+            callbacks, event = self._callbacks, self._event
+        self._notify(callbacks, event)
+
+    def _notify(self, callbacks, event):
+        if callbacks:
+            self._handler.completion_queue.put(
+                functools.partial(_run_callbacks, self, callbacks))
+        if event is not None:
+            event.set()
+
+    def _wait(self, timeout):
+        with self._lock:
+            if self._exception is not _NONE:
+                return
+            event = self._event
+            if event is None:
+                event = self._event = threading.Event()
+        event.wait(timeout)
+
+    def get(self, block=True, timeout=None):
+        """Return the stored value or raise the exception.
+
+        If there is no value raises TimeoutError.
+
+        """
+        if block and self._exception is _NONE:
+            self._wait(timeout)
+        exception = self._exception
+        if exception is None:
+            return self.value
+        if exception is not _NONE:
+            raise exception
+
+        # if we get to this point we timeout
+        raise KazooTimeoutError()
+
+    def get_nowait(self):
+        """Return the value or raise the exception without blocking.
+
+        If nothing is available, raises TimeoutError
+
+        """
+        return self.get(block=False)
+
+    def wait(self, timeout=None):
+        """Block until the instance is ready."""
+        if self._exception is _NONE:
+            self._wait(timeout)
+        return self._exception is not _NONE
+
+    def rawlink(self, callback):
+        """Register a callback to call when a value or an exception is
+        set"""
+        with self._lock:
+            if self._exception is _NONE:
+                if self._callbacks is None:
+                    self._callbacks = [callback]
+                elif callback not in self._callbacks:
+                    self._callbacks.append(callback)
+                return
+
+        # Already set, dispatch it now
+        self._handler.completion_queue.put(
+            functools.partial(callback, self))
+
+    def unlink(self, callback):
+        """Remove the callback set by :meth:`rawlink`"""
+        with self._lock:
+            # Once set, the callbacks have already been queued
+            if self._exception is _NONE and self._callbacks and \
+                    callback in self._callbacks:
+                self._callbacks.remove(callback)
 
 
 class SequentialThreadingHandler(object):
@@ -73,6 +203,15 @@ class SequentialThreadingHandler(object):
         no other completion callbacks will execute until the callback
         returns.
 
+    With `callback_workers` above 1, watch callbacks are spread over
+    that many threads by the path of their event: the callbacks of a
+    path still run one at a time in the order of its events, while the
+    callbacks of different paths run in parallel, so a slow callback
+    only holds up the paths sharing its thread.
+
+    .. versionadded:: 2.3
+        The callback_workers option.
+
     """
     name = "sequential_threading_handler"
     timeout_exception = KazooTimeoutError
@@ -80,13 +219,31 @@ class SequentialThreadingHandler(object):
     queue_impl = Queue.Queue
     queue_empty = Queue.Empty
 
-    def __init__(self):
-        """Create a :class:`SequentialThreadingHandler` instance"""
-        self.callback_queue = self.queue_impl()
-        self.completion_queue = self.queue_impl()
+    def __init__(self, callback_workers=1):
+        """Create a :class:`SequentialThreadingHandler` instance
+
+        :param callback_workers: How many threads run watch callbacks.
+
+        """
+        if callback_workers < 1:
+            raise ValueError("callback_workers must be at least 1")
+        self.callback_workers = callback_workers
+        self._create_queues()
         self._running = False
         self._state_change = threading.Lock()
+        # Shared by the results of this handler, see AsyncResult
+        self._result_lock = threading.Lock()
         self._workers = []
+        self._slowest_lock = threading.Lock()
+        # Min-heap of the (seconds, callback, path) of the slowest
+        # watch callbacks
+        self._slowest = []
+
+    def _create_queues(self):
+        self.callback_queues = [self.queue_impl()
+                                for i in range(self.callback_workers)]
+        self.callback_queue = self.callback_queues[0]
+        self.completion_queue = self.queue_impl()
 
     def _create_thread_worker(self, queue):
         def _thread_worker():  # pragma: nocover
@@ -113,9 +270,9 @@ class SequentialThreadingHandler(object):
                 return
 
             # Spawn our worker threads, we have
-            # - A callback worker for watch events to be called
+            # - Callback workers for watch events to be called
             # - A completion worker for completion events to be called
-            for queue in (self.completion_queue, self.callback_queue):
+            for queue in [self.completion_queue] + self.callback_queues:
                 w = self._create_thread_worker(queue)
                 self._workers.append(w)
             self._running = True
@@ -129,7 +286,7 @@ class SequentialThreadingHandler(object):
 
             self._running = False
 
-            for queue in (self.completion_queue, self.callback_queue):
+            for queue in [self.completion_queue] + self.callback_queues:
                 queue.put(_STOP)
 
             self._workers.reverse()
@@ -138,29 +295,40 @@ class SequentialThreadingHandler(object):
                 worker.join()
 
             # Clear the queues
-            self.callback_queue = self.queue_impl()
-            self.completion_queue = self.queue_impl()
+            self._create_queues()
             python2atexit.unregister(self.stop)
 
     def select(self, *args, **kwargs):
+        if utils.HAS_POLL:
+            return utils.selector_select(*args, **kwargs)
         try:
             return select.select(*args, **kwargs)
         except select.error as ex:
             # if the system call was interrupted, we'll return as a timeout
-            # in Python 3, system call interruptions are a native exception
-            # in Python 2, they are not
-            errnum = ex.errno if isinstance(ex, OSError) else ex[0]
             # to mimic a timeout, we return the same thing select would
-            if errnum == errno.EINTR:
+            if utils._is_eintr(ex):
                 return ([], [], [])
             raise
 
+    def selector_object(self):
+        """Return an object with persistent registration of the sockets
+        to wait on, see :class:`~kazoo.interfaces.IHandler`"""
+        if utils.HAS_POLL:
+            return utils.PersistentSelector()
+        return utils.SelectSelector(self.select)
+
     def socket(self):
         return utils.create_tcp_socket(socket)
 
     def create_connection(self, *args, **kwargs):
         return utils.create_tcp_connection(socket, *args, **kwargs)
 
+    def create_first_connection(self, addresses, timeout, stagger):
+        """Connect to the first of `addresses` to accept, see
+        :class:`~kazoo.interfaces.IHandler`"""
+        return utils.create_first_tcp_connection(
+            socket, self.select, addresses, timeout, stagger)
+
     def create_socket_pair(self):
         return utils.create_socket_pair(socket)
 
@@ -178,7 +346,7 @@ class SequentialThreadingHandler(object):
 
     def async_result(self):
         """Create a :class:`AsyncResult` instance"""
-        return AsyncResult(self)
+        return AsyncResult(self, self._result_lock)
 
     def spawn(self, func, *args, **kwargs):
         t = threading.Thread(target=func, args=args, kwargs=kwargs)
@@ -190,7 +358,60 @@ class SequentialThreadingHandler(object):
         """Dispatch to the callback object
 
         The callback is put on separate queues to run depending on the
-        type as documented for the :class:`SequentialThreadingHandler`.
+        type and path as documented for the
+        :class:`SequentialThreadingHandler`.
+
+        """
+        path = None
+        if callback.args:
+            path = getattr(callback.args[0], 'path', None)
+        queues = self.callback_queues
+        if path is None or len(queues) == 1:
+            queue = queues[0]
+        else:
+            queue = queues[hash(path) % len(queues)]
+        queue.put(functools.partial(self._run_callback, callback, path))
+
+    def _run_callback(self, callback, path):
+        start = time.time()
+        try:
+            callback.func(*callback.args)
+        finally:
+            elapsed = time.time() - start
+            slowest = self._slowest
+            if len(slowest) < SLOWEST_CALLBACKS or elapsed > slowest[0][0]:
+                self._record_slow(elapsed, callback.func, path)
+
+    def _record_slow(self, elapsed, func, path):
+        # Without a path the entries still compare
+        entry = (elapsed, repr(func), path or '')
+        with self._slowest_lock:
+            if len(self._slowest) < SLOWEST_CALLBACKS:
+                heapq.heappush(self._slowest, entry)
+            elif elapsed > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def callback_stats(self):
+        """Returns statistics of the watch callbacks.
+
+        :returns: A dict with:
+
+                  ``queue_depths``
+                      A list of how many callbacks wait to be run by
+                      each callback worker.
+                  ``slowest``
+                      A list of the slowest callbacks run, slowest
+                      first, as (seconds, callback, path) tuples with
+                      the repr of the callback and the path of its
+                      event (empty for a callback without one).
+        :rtype: dict
+
+        .. versionadded:: 2.3
 
         """
-        self.callback_queue.put(lambda: callback.func(*callback.args))
+        with self._slowest_lock:
+            slowest = sorted(self._slowest, reverse=True)
+        return {
+            'queue_depths': [queue.qsize() for queue in self.callback_queues],
+            'slowest': slowest,
+        }
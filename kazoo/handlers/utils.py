@@ -2,7 +2,11 @@
 
 import errno
 import functools
+import math
+import os
 import select
+import time
+from collections import deque, namedtuple
 
 HAS_FNCTL = True
 try:
@@ -10,6 +14,19 @@ try:
 except ImportError:  # pragma: nocover
     HAS_FNCTL = False
 
+try:
+    import selectors
+except ImportError:  # pragma: nocover
+    selectors = None
+
+# Whether sockets can be waited on without the FD_SETSIZE limit of
+# select.select, with the selectors module or else select.epoll/poll
+HAS_POLL = selectors is not None or hasattr(select, 'poll')
+
+# Same values as the selectors module's
+EVENT_READ = 1
+EVENT_WRITE = 2
+
 # sentinel objects
 _NONE = object()
 
@@ -45,7 +62,7 @@ class AsyncResult(object):
             self._exception = None
             for callback in self._callbacks:
                 self._handler.completion_queue.put(
-                    lambda: callback(self)
+                    functools.partial(callback, self)
                 )
             self._condition.notify_all()
 
@@ -55,7 +72,7 @@ class AsyncResult(object):
             self._exception = exception
             for callback in self._callbacks:
                 self._handler.completion_queue.put(
-                    lambda: callback(self)
+                    functools.partial(callback, self)
                 )
             self._condition.notify_all()
 
@@ -91,7 +108,8 @@ class AsyncResult(object):
     def wait(self, timeout=None):
         """Block until the instance is ready."""
         with self._condition:
-            self._condition.wait(timeout)
+            if not self.ready():
+                self._condition.wait(timeout)
         return self._exception is not _NONE
 
     def rawlink(self, callback):
@@ -101,7 +119,7 @@ class AsyncResult(object):
             # Are we already set? Dispatch it now
             if self.ready():
                 self._handler.completion_queue.put(
-                    lambda: callback(self)
+                    functools.partial(callback, self)
                 )
                 return
 
@@ -192,6 +210,270 @@ def create_tcp_connection(module, address, timeout=None):
     return sock
 
 
+# Errors of a non-blocking connect that's under way
+_CONNECT_IN_PROGRESS = (0, errno.EINPROGRESS, errno.EWOULDBLOCK,
+                        errno.EAGAIN)
+
+
+def _start_tcp_connection(module, sockaddr_info):
+    family, type_, proto, _, sockaddr = sockaddr_info
+    sock = module.socket(family, type_, proto)
+    try:
+        _set_default_tcpsock_options(module, sock)
+        sock.setblocking(0)
+        err = sock.connect_ex(sockaddr)
+        if err not in _CONNECT_IN_PROGRESS:
+            raise module.error(err, os.strerror(err))
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+
+def create_first_tcp_connection(module, select_func, addresses, timeout,
+                                stagger):
+    """Connect to whichever of `addresses` accepts a connection first.
+
+    The addresses are tried in order, moving on to the next one as soon
+    as the previous one fails or hasn't connected within `stagger`
+    seconds, while still waiting on the attempts already started ("Happy
+    Eyeballs", RFC 8305). The other attempts are closed once one of them
+    connects.
+
+    :returns: The non-blocking connected socket and the address it's
+              connected to.
+
+    """
+    clock = getattr(time, 'monotonic', time.time)
+    deadline = clock() + timeout
+    next_attempt = clock()
+    # (address, getaddrinfo result) to try, or (address, None) for an
+    # address yet to be resolved
+    candidates = deque((address, None) for address in addresses)
+    attempts = {}
+    error = None
+    try:
+        while True:
+            now = clock()
+            if now >= deadline:
+                raise module.timeout('timed out')
+            while candidates and now >= next_attempt:
+                address, info = candidates.popleft()
+                try:
+                    if info is None:
+                        # Every address the host resolves to gets tried
+                        # in turn, like create_connection does
+                        infos = module.getaddrinfo(address[0], address[1],
+                                                   0, module.SOCK_STREAM)
+                        candidates.extendleft(
+                            (address, info) for info in reversed(infos))
+                        continue
+                    sock = _start_tcp_connection(module, info)
+                except module.error as exc:
+                    error = exc
+                    continue
+                attempts[sock] = address
+                next_attempt = now + stagger
+
+            if not attempts:
+                raise error or module.error('no address to connect to')
+
+            wait = deadline - now
+            if candidates:
+                wait = min(wait, next_attempt - now)
+            writable = select_func([], list(attempts), [], max(wait, 0))[1]
+            for sock in writable:
+                address = attempts.pop(sock)
+                err = sock.getsockopt(module.SOL_SOCKET, module.SO_ERROR)
+                if not err:
+                    return sock, address
+                sock.close()
+                error = module.error(err, os.strerror(err))
+                # Don't wait for the stagger to try the next one
+                next_attempt = now
+    finally:
+        for sock in attempts:
+            sock.close()
+
+
+def _is_eintr(ex):
+    # in Python 3, system call interruptions are a native exception
+    # in Python 2, they are not
+    errnum = ex.errno if isinstance(ex, OSError) else ex[0]
+    return errnum == errno.EINTR
+
+
+_SelectorKey = namedtuple('_SelectorKey', 'fileobj events')
+
+
+class _PollSelector(object):
+    """The part of the selectors API kazoo uses, built on select.epoll
+    or select.poll for Pythons without the selectors module
+
+    `one_shot` selectors use poll, which needs a single system call per
+    wait, unlike epoll which has to create and tear down a kernel
+    object.
+
+    """
+    def __init__(self, one_shot=False):
+        if not one_shot and hasattr(select, 'epoll'):
+            self._poller = select.epoll()
+            self._read, self._write = select.EPOLLIN, select.EPOLLOUT
+            self._ms = False
+        else:
+            self._poller = select.poll()
+            self._read, self._write = select.POLLIN, select.POLLOUT
+            self._ms = True
+        self._keys = {}
+
+    def register(self, fileobj, events):
+        fd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+        mask = 0
+        if events & EVENT_READ:
+            mask |= self._read
+        if events & EVENT_WRITE:
+            mask |= self._write
+        self._poller.register(fd, mask)
+        self._keys[fd] = _SelectorKey(fileobj, events)
+
+    def select(self, timeout=None):
+        if timeout is None:
+            timeout = None if self._ms else -1
+        elif self._ms:
+            timeout = int(math.ceil(max(timeout, 0) * 1e3))
+        else:
+            timeout = max(timeout, 0)
+        ready = []
+        for fd, mask in self._poller.poll(timeout):
+            # Like selectors, errors and hang ups wake up both
+            events = 0
+            if mask & ~self._write:
+                events |= EVENT_READ
+            if mask & ~self._read:
+                events |= EVENT_WRITE
+            key = self._keys[fd]
+            if events & key.events:
+                ready.append((key, events & key.events))
+        return ready
+
+    def close(self):
+        close = getattr(self._poller, 'close', None)
+        if close is not None:
+            close()
+        self._keys = {}
+
+
+def selector_select(rlist, wlist, xlist, timeout=None):
+    """A select.select compatible function built on the selectors module,
+    or select.poll where it's missing (Python 2)
+
+    Unlike select.select this isn't limited to file descriptors below
+    ``FD_SETSIZE``. Exceptional conditions aren't supported by selectors,
+    so `xlist` is accepted for compatibility but never reported.
+
+    """
+    # poll needs a single system call per wait, unlike epoll which has to
+    # create and tear down a kernel object for this one-shot use
+    if selectors is None:
+        sel = _PollSelector(one_shot=True)
+    else:
+        sel = getattr(selectors, 'PollSelector', selectors.DefaultSelector)()
+    try:
+        events = {}
+        for fileobj in rlist:
+            events[fileobj] = EVENT_READ
+        for fileobj in wlist:
+            events[fileobj] = events.get(fileobj, 0) | EVENT_WRITE
+        for fileobj, mask in events.items():
+            sel.register(fileobj, mask)
+        try:
+            ready = sel.select(timeout)
+        except (EnvironmentError, select.error) as ex:
+            if _is_eintr(ex):
+                return ([], [], [])
+            raise
+    finally:
+        sel.close()
+
+    readable = set()
+    writable = set()
+    for key, mask in ready:
+        if mask & EVENT_READ:
+            readable.add(key.fileobj)
+        if mask & EVENT_WRITE:
+            writable.add(key.fileobj)
+    # keep the ordering of the arguments like select.select does
+    return ([fileobj for fileobj in rlist if fileobj in readable],
+            [fileobj for fileobj in wlist if fileobj in writable],
+            [])
+
+
+class SelectSelector(object):
+    """Wait for a fixed set of sockets to become readable using a
+    select.select compatible function
+
+    This is the fallback for handlers that only provide a `select`
+    method, the sockets are passed to `select_func` on every call.
+
+    """
+    def __init__(self, select_func):
+        self._select = select_func
+        self._fileobjs = []
+
+    def register(self, fileobj):
+        """Add `fileobj` to the sockets waited on"""
+        self._fileobjs.append(fileobj)
+
+    def select(self, timeout=None):
+        """Return the list of registered sockets that are readable"""
+        return self._select(self._fileobjs, [], [], timeout)[0]
+
+    def close(self):
+        self._fileobjs = []
+
+
+class PersistentSelector(object):
+    """Wait for a fixed set of sockets to become readable using the
+    best selector of the platform
+
+    The sockets are registered with the kernel once (epoll on Linux,
+    kqueue on BSD) rather than being handed over again on every wait.
+    Without the selectors module (Python 2) it uses select.epoll, or
+    select.poll where there's no epoll.
+
+    """
+    def __init__(self):
+        if selectors is None:
+            self._selector = _PollSelector()
+        else:
+            self._selector = selectors.DefaultSelector()
+        self._fileobjs = []
+
+    def register(self, fileobj):
+        """Add `fileobj` to the sockets waited on"""
+        self._selector.register(fileobj, EVENT_READ)
+        self._fileobjs.append(fileobj)
+
+    def select(self, timeout=None):
+        """Return the list of registered sockets that are readable, in
+        registration order"""
+        try:
+            ready = self._selector.select(timeout)
+        except (EnvironmentError, select.error) as ex:
+            if _is_eintr(ex):
+                return []
+            raise
+        if not ready:
+            return []
+        readable = set(key.fileobj for key, mask in ready)
+        return [fileobj for fileobj in self._fileobjs
+                if fileobj in readable]
+
+    def close(self):
+        self._selector.close()
+        self._fileobjs = []
+
+
 def capture_exceptions(async_result):
     """Return a new decorated function that propagates the exceptions of the
     wrapped function to an async_result.
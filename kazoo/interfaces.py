@@ -55,6 +55,16 @@ class IHandler(object):
         """A select method that implements Python's select.select
         API"""
 
+    def selector_object(self):
+        """Return an object to wait on a fixed set of sockets becoming
+        readable, with ``register(sock)``, ``select(timeout)`` returning
+        the list of readable sockets and ``close()`` methods.
+
+        This method is optional, handlers without it get a wrapper
+        calling :meth:`select` with the registered sockets.
+
+        """
+
     def socket(self):
         """A socket method that implements Python's socket.socket
         API"""
@@ -63,6 +73,17 @@ class IHandler(object):
         """A socket method that implements Python's
         socket.create_connection API"""
 
+    def create_first_connection(self, addresses, timeout, stagger):
+        """Connect to whichever of the (host, port) `addresses`
+        accepts first, starting a connection to the next one every
+        `stagger` seconds, and return the connected socket and its
+        address.
+
+        This method is optional, handlers without it get connected to
+        one address at a time with :meth:`create_connection`.
+
+        """
+
     def event_object(self):
         """Return an appropriate object that implements Python's
         threading.Event API"""
@@ -16,26 +16,37 @@ from kazoo.exceptions import (
     SessionExpiredError,
     NoNodeError
 )
+from kazoo.handlers import utils
 from kazoo.loggingsupport import BLATHER
 from kazoo.protocol.serialization import (
+    AddWatch,
     Auth,
+    CheckWatches,
     Close,
     Connect,
     Exists,
     GetChildren,
+    GetChildren2,
+    GetData,
     Ping,
     PingInstance,
+    RemoveWatches,
     ReplyHeader,
+    SetWatches,
+    SetWatches2,
     Transaction,
     Watch,
-    int_struct
+    int_struct,
+    write_request,
 )
 from kazoo.protocol.states import (
+    AddWatchMode,
     Callback,
     KeeperState,
     WatchedEvent,
     EVENT_TYPE_MAP,
 )
+from kazoo.protocol.stats import ConnectionStats, now
 from kazoo.retry import (
     ForceRetryError,
     RetryFailedError
@@ -59,9 +70,28 @@ CHILD_EVENT = 4
 WATCH_XID = -1
 PING_XID = -2
 AUTH_XID = -4
+SET_WATCHES_XID = -8
 
 CLOSE_RESPONSE = Close.type
 
+# Initial size of the connection's read buffer, it grows to fit replies
+# larger than this while they're being received
+READ_BUFFER_SIZE = 64 * 1024
+
+# With zero copy reads, replies larger than this are received into a
+# buffer of their own which is never reused, so the data of the reply
+# can be handed out as a view of it
+ZERO_COPY_THRESHOLD = 16 * 1024
+
+# Upper bound on the amount of request data serialized into a single
+# flush, so a flood of queued requests can't starve reads for long
+MAX_FLUSH_SIZE = 512 * 1024
+
+# Most path characters sent in a single SetWatches request when
+# reconnecting, larger requests could go over the server's maximum
+# packet size
+SET_WATCHES_MAX_SIZE = 128 * 1024
+
 if sys.version_info > (3, ):  # pragma: nocover
     def buffer(obj, offset=0):
         return memoryview(obj)[offset:]
@@ -148,12 +178,23 @@ class ConnectionHandler(object):
         self._write_sock = None
 
         self._socket = None
+        self._rbuf = bytearray(READ_BUFFER_SIZE)
+        self._rbuf_dedicated = False
+        self._rstart = self._rend = 0
+        self._zero_copy = client.zero_copy_reads
+        self._compact_stats = client.compact_stats
         self._xid = None
         self._rw_server = None
         self._ro_mode = False
 
         self._connection_routine = None
 
+        # Flush statistics, requests_flushed / flushes gives the mean
+        # number of requests written out per wakeup
+        self.flushes = 0
+        self.requests_flushed = 0
+        self.stats = ConnectionStats()
+
     # This is instance specific to avoid odd thread bug issues in Python
     # during shutdown global cleanup
     @contextmanager
@@ -205,30 +246,88 @@ class ConnectionHandler(object):
                         self._socket_error_handling)
 
     def _read_header(self, timeout):
-        b = self._read(4, timeout)
-        length = int_struct.unpack(b)[0]
-        b = self._read(length, timeout)
+        b = self._read_frame(timeout)
         header, offset = ReplyHeader.deserialize(b, 0)
         return header, b, offset
 
-    def _read(self, length, timeout):
-        msgparts = []
-        remaining = length
+    def _read_frame(self, timeout):
+        """Block until a complete frame has been received and return
+        it"""
+        frame = self._next_frame()
+        while frame is None:
+            self._fill(timeout)
+            frame = self._next_frame()
+        return frame
+
+    def _next_frame(self):
+        """Slice the next complete length-prefixed frame out of the
+        read buffer
+
+        Returns a memoryview of the frame without its length prefix, or
+        `None` if no complete frame has been received yet. The view is
+        only valid until the next call to :meth:`_fill`.
+
+        """
+        start = self._rstart
+        available = self._rend - start
+        if available < 4:
+            return None
+        length = int_struct.unpack_from(self._rbuf, start)[0]
+        if available < 4 + length:
+            return None
+        self._rstart = start + 4 + length
+        return memoryview(self._rbuf)[start + 4:self._rstart]
+
+    def _fill(self, timeout):
+        """Receive as much as is available into the read buffer"""
         with self._socket_error_handling():
-            while remaining > 0:
-                s = self.handler.select([self._socket], [], [], timeout)[0]
-                if not s:  # pragma: nocover
-                    # If the read list is empty, we got a timeout. We don't
-                    # have to check wlist and xlist as we don't set any
-                    raise self.handler.timeout_exception("socket time-out"
-                                                         " during read")
+            s = self.handler.select([self._socket], [], [], timeout)[0]
+            if not s:  # pragma: nocover
+                # If the read list is empty, we got a timeout. We don't
+                # have to check wlist and xlist as we don't set any
+                raise self.handler.timeout_exception("socket time-out"
+                                                     " during read")
+            self._make_room()
+            read = self._socket.recv_into(
+                memoryview(self._rbuf)[self._rend:])
+            if not read:
+                raise ConnectionDropped('socket connection broken')
+            self._rend += read
+            self.stats.bytes_received += read
+
+    def _make_room(self):
+        """Move any partially received frame to the front of the read
+        buffer, or into a buffer of its own if it's large"""
+        buf = self._rbuf
+        start, end = self._rstart, self._rend
+        pending = end - start
+        if not pending:
+            if self._rbuf_dedicated:
+                # Never reuse the buffer of a large frame, it's oversized
+                # and views of it may have been handed out
+                self._rbuf = bytearray(READ_BUFFER_SIZE)
+                self._rbuf_dedicated = False
+            self._rstart = self._rend = 0
+            return
+        if self._rbuf_dedicated:
+            # Still receiving the frame the buffer was made for
+            return
 
-                chunk = self._socket.recv(remaining)
-                if chunk == b'':
-                    raise ConnectionDropped('socket connection broken')
-                msgparts.append(chunk)
-                remaining -= len(chunk)
-            return b"".join(msgparts)
+        needed = 4
+        if pending >= 4:
+            needed += int_struct.unpack_from(buf, start)[0]
+        if needed > len(buf) or (self._zero_copy and pending >= 4 and
+                                 needed > ZERO_COPY_THRESHOLD):
+            # Never resize in place, a bytearray with views exported
+            # can't be resized. The new buffer is exactly the size of
+            # the frame, so nothing after it ends up in there.
+            new_buf = bytearray(needed)
+            new_buf[:pending] = buf[start:end]
+            self._rbuf = new_buf
+            self._rbuf_dedicated = True
+        elif start:
+            buf[:pending] = buf[start:end]
+        self._rstart, self._rend = 0, pending
 
     def _invoke(self, timeout, request, xid=None):
         """A special writer used during connection establishment
@@ -249,9 +348,7 @@ class ConnectionHandler(object):
                 raise callback_exception
             return zxid
 
-        msg = self._read(4, timeout)
-        length = int_struct.unpack(msg)[0]
-        msg = self._read(length, timeout)
+        msg = self._read_frame(timeout)
 
         if hasattr(request, 'deserialize'):
             try:
@@ -271,16 +368,18 @@ class ConnectionHandler(object):
     def _submit(self, request, timeout, xid=None):
         """Submit a request object with a timeout value and optional
         xid"""
-        b = bytearray()
-        if xid:
-            b.extend(int_struct.pack(xid))
-        if request.type:
-            b.extend(int_struct.pack(request.type))
-        b += request.serialize()
+        self._write(self._serialize(request, xid), timeout)
+
+    def _serialize(self, request, xid=None, out=None):
+        """Serialize a request with its length prefix, at the end of the
+        `out` bytearray if given"""
+        if out is None:
+            out = bytearray()
+        write_request(out, request, xid)
         self.logger.log(
             (BLATHER if isinstance(request, Ping) else logging.DEBUG),
             "Sending request(xid=%s): %s", xid, request)
-        self._write(int_struct.pack(len(b)) + b, timeout)
+        return out
 
     def _write(self, msg, timeout):
         """Write a raw msg to the socket"""
@@ -299,6 +398,7 @@ class ConnectionHandler(object):
                 if not bytes_sent:
                     raise ConnectionDropped('socket connection broken')
                 sent += bytes_sent
+            self.stats.bytes_sent += msg_length
 
     def _read_watch_event(self, buffer, offset):
         client = self.client
@@ -307,21 +407,36 @@ class ConnectionHandler(object):
 
         self.logger.debug('Received EVENT: %s', watch)
 
-        watchers = []
+        watchers = set()
 
         if watch.type in (CREATED_EVENT, CHANGED_EVENT):
-            watchers.extend(client._data_watchers.pop(path, []))
+            watchers.update(client._data_watchers.pop(path, ()))
+            client._exist_watches.discard(path)
         elif watch.type == DELETED_EVENT:
-            watchers.extend(client._data_watchers.pop(path, []))
-            watchers.extend(client._child_watchers.pop(path, []))
+            watchers.update(client._data_watchers.pop(path, ()))
+            client._exist_watches.discard(path)
+            watchers.update(client._child_watchers.pop(path, ()))
         elif watch.type == CHILD_EVENT:
-            watchers.extend(client._child_watchers.pop(path, []))
+            watchers.update(client._child_watchers.pop(path, ()))
         else:
             self.logger.warn('Received unknown event %r', watch.type)
             return
 
+        # Persistent watchers stay registered after being triggered
+        watchers.update(client._persistent_watchers.get(path, ()))
+        recursive = client._persistent_recursive_watchers
+        if recursive and watch.type != CHILD_EVENT:
+            parent = path
+            while True:
+                watchers.update(recursive.get(parent, ()))
+                if parent == '/':
+                    break
+                parent = parent.rsplit('/', 1)[0] or '/'
+
         # Strip the chroot if needed
         path = client.unchroot(path)
+        if watch.type == DELETED_EVENT:
+            client._forget_path(path)
         ev = WatchedEvent(EVENT_TYPE_MAP[watch.type], client._state, path)
 
         # Last check to ignore watches if we've been stopped
@@ -334,19 +449,25 @@ class ConnectionHandler(object):
 
     def _read_response(self, header, buffer, offset):
         client = self.client
-        request, async_object, xid = client._pending.popleft()
+        request, async_object, xid, started = client._pending.popleft()
         if header.zxid and header.zxid > 0:
             client.last_zxid = header.zxid
         if header.xid != xid:
             raise RuntimeError('xids do not match, expected %r '
                                'received %r', xid, header.xid)
 
+        if started is None:
+            # The request timed out, nobody is waiting for it anymore
+            self.logger.debug('Discarding late reply(xid=%s)', xid)
+            return
+
         # Determine if its an exists request and a no node error
         exists_error = (header.err == NoNodeError.code and
                         request.type == Exists.type)
 
         # Set the exception if its not an exists error
         if header.err and not exists_error:
+            self.stats.record(request, started, error=True)
             callback_exception = EXCEPTIONS[header.err]()
             self.logger.debug(
                 'Received error(xid=%s) %r', xid, callback_exception)
@@ -356,14 +477,24 @@ class ConnectionHandler(object):
             if exists_error:
                 # It's a NoNodeError, which is fine for an exists
                 # request
+                self.stats.record(request, started)
                 async_object.set(None)
             else:
                 try:
-                    response = request.deserialize(buffer, offset)
+                    if self._zero_copy and request.type == GetData.type:
+                        response = self._deserialize_view(request, buffer,
+                                                          offset)
+                    elif self._compact_stats and hasattr(
+                            request, 'deserialize_compact'):
+                        response = request.deserialize_compact(buffer,
+                                                               offset)
+                    else:
+                        response = request.deserialize(buffer, offset)
                 except Exception as exc:
                     self.logger.exception(
                         "Exception raised during deserialization "
                         "of request: %s", request)
+                    self.stats.record(request, started, error=True)
                     async_object.set_exception(exc)
                     return
                 self.logger.debug(
@@ -373,37 +504,99 @@ class ConnectionHandler(object):
                 if request.type == Transaction.type:
                     response = Transaction.unchroot(client, response)
 
+                self.stats.record(request, started)
                 async_object.set(response)
 
-            # Determine if watchers should be registered
-            watcher = getattr(request, 'watcher', None)
-            if not client._stopped.is_set() and watcher:
-                if isinstance(request, GetChildren):
-                    client._child_watchers[request.path].add(watcher)
-                else:
-                    client._data_watchers[request.path].add(watcher)
+            if not client._stopped.is_set():
+                self._update_watchers(request, exists_error)
 
         if isinstance(request, Close):
+            self.stats.record(request, started)
             self.logger.log(BLATHER, 'Read close response')
             return CLOSE_RESPONSE
 
+    def _update_watchers(self, request, exists_error):
+        """Register or remove the watchers of a successful request"""
+        client = self.client
+        watcher = getattr(request, 'watcher', None)
+        if request.type == RemoveWatches.type:
+            client._remove_watchers(request.path, request.watcher_type)
+        elif not watcher:
+            return
+        elif request.type == CheckWatches.type:
+            # Removing a single watcher, the server checked it has a
+            # watch of that type but keeps it for the other watchers
+            client._remove_watchers(request.path, request.watcher_type,
+                                    watcher)
+        elif request.type == AddWatch.type:
+            if request.mode == AddWatchMode.PERSISTENT_RECURSIVE:
+                client._persistent_recursive_watchers[request.path].add(
+                    watcher)
+            else:
+                client._persistent_watchers[request.path].add(watcher)
+        elif isinstance(request, (GetChildren, GetChildren2)):
+            client._child_watchers[request.path].add(watcher)
+        else:
+            client._data_watchers[request.path].add(watcher)
+            if exists_error:
+                client._exist_watches.add(request.path)
+            else:
+                client._exist_watches.discard(request.path)
+
+    def _deserialize_view(self, request, buffer, offset):
+        if self._rbuf_dedicated:
+            # The frame has a buffer of its own, hand out a view of it
+            return request.deserialize_view(buffer, offset,
+                                            self._compact_stats)
+        # The read buffer gets reused, the data has to be copied out
+        if self._compact_stats:
+            data, stat = request.deserialize_compact(buffer, offset)
+        else:
+            data, stat = request.deserialize(buffer, offset)
+        if data is not None:
+            data = memoryview(data)
+        return data, stat
+
     def _read_socket(self, read_timeout):
         """Called when there's something to read on the socket"""
+        self._fill(read_timeout)
+
+        # Handle every complete reply we've received before going back
+        # to select
+        frame = self._next_frame()
+        while frame is not None:
+            if self._read_reply(frame) == CLOSE_RESPONSE:
+                return CLOSE_RESPONSE
+            frame = self._next_frame()
+
+        # Let the callers waiting for room in the queue know some
+        # requests have completed
+        self.client._notify_room()
+
+    def _read_reply(self, buffer):
         client = self.client
 
-        header, buffer, offset = self._read_header(read_timeout)
+        header, offset = ReplyHeader.deserialize(buffer, 0)
         if header.xid == PING_XID:
             self.logger.log(BLATHER, 'Received Ping')
             self.ping_outstanding.clear()
         elif header.xid == AUTH_XID:
             self.logger.log(BLATHER, 'Received AUTH')
 
-            request, async_object, xid = client._pending.popleft()
+            request, async_object, xid, started = client._pending.popleft()
             if header.err:
+                self.stats.record(request, started, error=True)
                 async_object.set_exception(AuthFailedError())
                 client._session_callback(KeeperState.AUTH_FAILED)
             else:
+                self.stats.record(request, started)
                 async_object.set(True)
+        elif header.xid == SET_WATCHES_XID:
+            if header.err:
+                self.logger.warning('Failed to set the watches again, '
+                                    'error %s', header.err)
+            else:
+                self.logger.log(BLATHER, 'Received SetWatches')
         elif header.xid == WATCH_XID:
             self._read_watch_event(buffer, offset)
         else:
@@ -411,41 +604,109 @@ class ConnectionHandler(object):
 
             return self._read_response(header, buffer, offset)
 
+    def _expire_requests(self):
+        """Fail the pending requests that have been waiting for their
+        reply longer than the client's request_timeout
+
+        Returns the seconds until the next pending request times out, or
+        None.
+
+        """
+        timeout = self.client.request_timeout
+        if timeout is None:
+            return None
+        pending = self.client._pending
+        current = now()
+        # Requests were queued in the order they're pending in, so they
+        # time out in that order too
+        for index in range(len(pending)):
+            request, async_object, xid, started = pending[index]
+            if async_object is None or xid < 0:
+                # Already timed out, or not a request anyone waits for
+                continue
+            remaining = started + timeout - current
+            if remaining > 0:
+                return remaining
+            self.stats.record(request, started, error=True)
+            self.stats.timeouts += 1
+            # Keep its place to match the reply against, but drop its
+            # result so the reply is discarded when it arrives
+            pending[index] = (request, None, xid, None)
+            self.logger.debug('Request(xid=%s) timed out', xid)
+            async_object.set_exception(self.handler.timeout_exception(
+                "Request timed out after %s seconds" % timeout))
+        return None
+
     def _send_request(self, read_timeout, connect_timeout):
-        """Called when we have something to send out on the socket"""
+        """Called when we have something to send out on the socket
+
+        Every request queued at this point is serialized into a single
+        output buffer and written out in one go, rather than taking a
+        trip through the select loop per request.
+
+        """
         client = self.client
+        queue = client._queue
+
+        # Consume the wakeup bytes before looking at the queue, every
+        # request that wrote one of them is already enqueued. Requests
+        # enqueued after this will have their byte waiting for the next
+        # pass through the loop.
         try:
-            request, async_object = client._queue[0]
-        except IndexError:
+            self._read_sock.recv(8192)
+        except OSError:
+            pass
+
+        if not queue:
             # Not actually something on the queue, this can occur if
             # something happens to cancel the request such that we
             # don't clear the socket below after sending
-            try:
-                # Clear possible inconsistence (no request in the queue
-                # but have data in the read socket), which causes cpu to spin.
-                self._read_sock.recv(1)
-            except OSError:
-                pass
             return
 
-        # Special case for testing, if this is a _SessionExpire object
-        # then throw a SessionExpiration error as if we were dropped
-        if request is _SESSION_EXPIRED:
-            raise SessionExpiredError("Session expired: Testing")
-        if request is _CONNECTION_DROP:
-            raise ConnectionDropped("Connection dropped: Testing")
+        out = bytearray()
+        count = 0
+        while queue and len(out) < MAX_FLUSH_SIZE:
+            # Take the request off the queue before anything else, the
+            # client may drop queued requests to make room for new ones
+            try:
+                entry = queue.popleft()
+            except IndexError:
+                break
+            request, async_object, started = entry
+
+            # Special case for testing, if this is a _SessionExpire
+            # object then throw a SessionExpiration error as if we were
+            # dropped. Anything queued before it is sent out first.
+            if request is _SESSION_EXPIRED or request is _CONNECTION_DROP:
+                queue.appendleft(entry)
+                if count:
+                    break
+                if request is _SESSION_EXPIRED:
+                    raise SessionExpiredError("Session expired: Testing")
+                raise ConnectionDropped("Connection dropped: Testing")
 
-        # Special case for auth packets
-        if request.type == Auth.type:
-            xid = AUTH_XID
-        else:
-            self._xid += 1
-            xid = self._xid
+            # Special case for auth packets
+            if request.type == Auth.type:
+                xid = AUTH_XID
+            else:
+                self._xid += 1
+                xid = self._xid
+
+            # Track it as pending before writing, so a failed write
+            # still gets the request notified of the connection loss
+            client._pending.append((request, async_object, xid, started))
+            self._serialize(request, xid, out)
+            count += 1
 
-        self._submit(request, connect_timeout, xid)
-        client._queue.popleft()
-        self._read_sock.recv(1)
-        client._pending.append((request, async_object, xid))
+        if queue:
+            # We stopped early, make sure we come back for the rest
+            self._write_sock.send(b'\0')
+
+        self.logger.log(BLATHER, 'Flushing %s request(s) in %s bytes',
+                        count, len(out))
+        self._write(out, connect_timeout)
+        self.flushes += 1
+        self.requests_flushed += count
 
     def _send_ping(self, connect_timeout):
         self.ping_outstanding.set()
@@ -494,10 +755,17 @@ class ConnectionHandler(object):
         else:
             raise ForceRetryError('Reconnecting')
 
+    def _selector(self):
+        factory = getattr(self.handler, 'selector_object', None)
+        if factory is not None:
+            return factory()
+        return utils.SelectSelector(self.handler.select)
+
     def _connect_attempt(self, host, port, retry):
         client = self.client
         KazooTimeoutError = self.handler.timeout_exception
         close_connection = False
+        selector = None
 
         self._socket = None
 
@@ -512,32 +780,48 @@ class ConnectionHandler(object):
             client._session_callback(KeeperState.CONNECTING)
 
         try:
-            read_timeout, connect_timeout = self._connect(host, port)
+            host, port, read_timeout, connect_timeout = self._connect(
+                host, port)
+            self.stats.connections += 1
             read_timeout = read_timeout / 1000.0
             connect_timeout = connect_timeout / 1000.0
             retry.reset()
             self._xid = 0
             self.ping_outstanding.clear()
+            selector = self._selector()
+            selector.register(self._socket)
+            selector.register(self._read_sock)
+            ping_at = None
             with self._socket_error_handling():
                 while not close_connection:
                     # Watch for something to read or send
-                    jitter_time = random.randint(0, 40) / 100.0
-                    # Ensure our timeout is positive
-                    timeout = max([read_timeout / 2.0 - jitter_time,
-                                   jitter_time])
-                    s = self.handler.select([self._socket, self._read_sock],
-                                            [], [], timeout)[0]
+                    if ping_at is None:
+                        jitter_time = random.randint(0, 40) / 100.0
+                        # Ensure our timeout is positive
+                        ping_at = now() + max([
+                            read_timeout / 2.0 - jitter_time, jitter_time])
+                    timeout = ping_at - now()
+                    expires = self._expire_requests()
+                    if expires is not None and expires < timeout:
+                        timeout = expires
+                    s = selector.select(max(timeout, 0))
 
                     if not s:
+                        if now() < ping_at:
+                            # Woken up to time out a request
+                            continue
+                        ping_at = None
                         if self.ping_outstanding.is_set():
                             self.ping_outstanding.clear()
                             raise ConnectionDropped(
                                 "outstanding heartbeat ping not received")
                         self._send_ping(connect_timeout)
                     elif s[0] == self._socket:
+                        ping_at = None
                         response = self._read_socket(read_timeout)
                         close_connection = response == CLOSE_RESPONSE
                     else:
+                        ping_at = None
                         self._send_request(read_timeout, connect_timeout)
             self.logger.info('Closing connection to %s:%s', host, port)
             client._session_callback(KeeperState.CLOSED)
@@ -567,6 +851,8 @@ class ConnectionHandler(object):
             self.logger.exception('Unhandled exception in connection loop')
             raise
         finally:
+            if selector is not None:
+                selector.close()
             if self._socket is not None:
                 self._socket.close()
 
@@ -580,10 +866,14 @@ class ConnectionHandler(object):
                         hexlify(client._session_passwd))
 
         with self._socket_error_handling():
-            self._socket = self.handler.create_connection(
-                (host, port), client._session_timeout / 1000.0)
+            self._socket, address = self._create_connection(host, port)
+        if address != (host, port):
+            host, port = address
+            self.logger.info('Connected to %s:%s instead', host, port)
 
         self._socket.setblocking(0)
+        # Whatever was left over from the previous connection is stale
+        self._rstart = self._rend = 0
 
         connect = Connect(0, client.last_zxid, client._session_timeout,
                           client._session_id or 0, client._session_passwd,
@@ -627,4 +917,60 @@ class ConnectionHandler(object):
             zxid = self._invoke(connect_timeout / 1000.0, ap, xid=AUTH_XID)
             if zxid:
                 client.last_zxid = zxid
-        return read_timeout, connect_timeout
+        self._set_watches(connect_timeout / 1000.0)
+        return host, port, read_timeout, connect_timeout
+
+    def _set_watches(self, timeout):
+        """Send the watches kept across a reconnect to the server, it
+        triggers the ones whose node changed since the last zxid seen
+        and sets the others again
+
+        The replies and the watch events are read by the connection
+        loop.
+
+        """
+        client = self.client
+        exist_paths = client._exist_watches
+        data, exist = [], []
+        for path in client._data_watchers:
+            (exist if path in exist_paths else data).append(path)
+        kinds = [data, exist, list(client._child_watchers)]
+        request = SetWatches
+        if (client._persistent_watchers or
+                client._persistent_recursive_watchers):
+            # Only servers supporting persistent watches know SetWatches2
+            kinds.append(list(client._persistent_watchers))
+            kinds.append(list(client._persistent_recursive_watchers))
+            request = SetWatches2
+
+        batch, size = tuple([] for paths in kinds), 0
+        for kind, paths in enumerate(kinds):
+            for path in paths:
+                batch[kind].append(path)
+                size += len(path)
+                if size >= SET_WATCHES_MAX_SIZE:
+                    self._submit(request(client.last_zxid, *batch),
+                                 timeout, SET_WATCHES_XID)
+                    batch, size = tuple([] for paths in kinds), 0
+        if any(batch):
+            self._submit(request(client.last_zxid, *batch), timeout,
+                         SET_WATCHES_XID)
+
+    def _create_connection(self, host, port):
+        """Connect to the host, or to one of the hosts after it in the
+        client's list if it's slow to accept the connection
+
+        Returns the socket and the address it's connected to.
+
+        """
+        client = self.client
+        timeout = client._session_timeout / 1000.0
+        stagger = client.connection_stagger
+        create_first = getattr(self.handler, 'create_first_connection', None)
+        hosts = client.hosts
+        if (stagger is None or create_first is None or len(hosts) < 2 or
+                (host, port) not in hosts):
+            return (self.handler.create_connection((host, port), timeout),
+                    (host, port))
+        index = hosts.index((host, port))
+        return create_first(hosts[index:] + hosts[:index], timeout, stagger)
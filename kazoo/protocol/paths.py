@@ -1,3 +1,8 @@
+# The most paths a _Chroot remembers the prefixed and the stripped
+# versions of
+PATH_CACHE_SIZE = 1024
+
+
 def normpath(path, trailing=False):
     """Normalize path, eliminating double slashes, etc."""
     comps = path.split('/')
@@ -53,3 +58,93 @@ def _prefix_root(root, path, trailing=False):
 
 def _norm_root(root):
     return normpath(join('/', root))
+
+
+def _is_normalized(path):
+    """Whether `path`, without a leading slash, is left alone by
+    normpath"""
+    if not path or '//' in path or path.endswith('/'):
+        return False
+    if '.' in path:
+        for comp in path.split('/'):
+            if comp in ('.', '..'):
+                return False
+    return True
+
+
+class _PathCache(object):
+    """A bounded cache of the most recently used paths
+
+    An approximation of an LRU in two generations of plain dicts: new
+    entries go into the recent generation, which becomes the old one
+    once it's full, dropping the previous old one. An entry found in
+    the old generation moves back to the recent one. A hit is then a
+    single dict lookup, and concurrent use can lose entries but never
+    fails, so it needs no lock.
+
+    """
+    def __init__(self, size):
+        self._half = max(size // 2, 1)
+        self._recent = {}
+        self._old = {}
+
+    def get(self, key):
+        value = self._recent.get(key)
+        if value is None:
+            value = self._old.get(key)
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def set(self, key, value):
+        recent = self._recent
+        if len(recent) >= self._half:
+            self._old = recent
+            recent = self._recent = {}
+        recent[key] = value
+
+    def __len__(self):
+        return len(self._recent) + len(self._old)
+
+
+class _Chroot(object):
+    """Prefixes paths with a chroot and strips it from them
+
+    The chroot is normalized once, paths already normalized are
+    prefixed without going through normpath again, and the results for
+    the most recent paths are remembered.
+
+    """
+    def __init__(self, root, cache_size=PATH_CACHE_SIZE):
+        self.root = root
+        self._prefix = _norm_root(root).rstrip('/')
+        self._prefixed = _PathCache(cache_size)
+        self._stripped = _PathCache(cache_size)
+
+    def prefix(self, path, trailing=False):
+        """Prepend the chroot to `path`, like :func:`_prefix_root`"""
+        if trailing:
+            return _prefix_root(self.root, path, trailing)
+        full = self._prefixed.get(path)
+        if full is None:
+            relative = path.lstrip('/')
+            if _is_normalized(relative):
+                full = self._prefix + '/' + relative
+            else:
+                full = normpath(join(self._prefix or '/', relative))
+            self._prefixed.set(path, full)
+        return full
+
+    def strip(self, path):
+        """Strip the chroot from the start of `path`, if it's there"""
+        root = self.root
+        if not root:
+            return path
+        relative = self._stripped.get(path)
+        if relative is None:
+            if path.startswith(root):
+                relative = path[len(root):]
+            else:
+                relative = path
+            self._stripped.set(path, relative)
+        return relative
@@ -1,9 +1,13 @@
 """Zookeeper Serializers, Deserializers, and NamedTuple objects"""
+from array import array
 from collections import namedtuple
+import codecs
 import struct
 
+from six.moves import range as lazy_range
+
 from kazoo.exceptions import EXCEPTIONS
-from kazoo.protocol.states import ZnodeStat
+from kazoo.protocol.states import ChildNames, CompactStat, ZnodeStat
 from kazoo.security import ACL
 from kazoo.security import Id
 
@@ -13,6 +17,7 @@ int_struct = struct.Struct('!i')
 long_struct = struct.Struct('!q')
 int_int_struct = struct.Struct('!ii')
 int_int_long_struct = struct.Struct('!iiq')
+int_int_int_struct = struct.Struct('!iii')
 
 int_long_int_long_struct = struct.Struct('!iqiq')
 multiheader_struct = struct.Struct('!iBi')
@@ -24,6 +29,9 @@ try:  # pragma: nocover
 except NameError:
     basestring = str
 
+# Decodes bytes, bytearrays and memoryviews alike
+utf_8_decode = codecs.utf_8_decode
+
 
 def read_string(buffer, offset):
     """Reads an int specified buffer into a string and returns the
@@ -35,7 +43,7 @@ def read_string(buffer, offset):
     else:
         index = offset
         offset += length
-        return buffer[index:index + length].decode('utf-8'), offset
+        return utf_8_decode(buffer[index:index + length])[0], offset
 
 
 def read_acl(bytes, offset):
@@ -46,6 +54,10 @@ def read_acl(bytes, offset):
     return ACL(perms, Id(scheme, id)), offset
 
 
+# Length prefix of a null string or buffer
+_NULL_LENGTH = int_struct.pack(-1)
+
+
 def write_string(bytes):
     if not bytes:
         return int_struct.pack(-1)
@@ -61,6 +73,60 @@ def write_buffer(bytes):
         return int_struct.pack(len(bytes)) + bytes
 
 
+def append_string(b, string):
+    """Append the length prefixed utf-8 encoding of `string` to the
+    bytearray `b`"""
+    if not string:
+        b += _NULL_LENGTH
+    else:
+        utf8_str = string.encode('utf-8')
+        b += int_struct.pack(len(utf8_str))
+        b += utf8_str
+
+
+def append_buffer(b, data):
+    """Append the length prefixed `data` to the bytearray `b`"""
+    if data is None:
+        b += _NULL_LENGTH
+    else:
+        b += int_struct.pack(len(data))
+        b += data
+
+
+def append_acls(b, acls):
+    b += int_struct.pack(len(acls))
+    for acl in acls:
+        b += int_struct.pack(acl.perms)
+        append_string(b, acl.id.scheme)
+        append_string(b, acl.id.id)
+
+
+def write_request(b, request, xid=None):
+    """Serialize `request` at the end of the bytearray `b`, preceded by
+    its length prefix and, when given, its xid and type
+
+    Everything is written in place, the length prefix is filled in once
+    the request has been serialized.
+
+    """
+    start = len(b)
+    if xid and request.type:
+        b += int_int_int_struct.pack(0, xid, request.type)
+    else:
+        b += int_struct.pack(0)
+        if xid:
+            b += int_struct.pack(xid)
+        if request.type:
+            b += int_struct.pack(request.type)
+    serialize_into = getattr(request, 'serialize_into', None)
+    if serialize_into is not None:
+        serialize_into(b)
+    else:
+        b += request.serialize()
+    int_struct.pack_into(b, start, len(b) - start - int_struct.size)
+    return b
+
+
 def read_buffer(bytes, offset):
     length = int_struct.unpack_from(bytes, offset)[0]
     offset += int_struct.size
@@ -69,7 +135,177 @@ def read_buffer(bytes, offset):
     else:
         index = offset
         offset += length
-        return bytes[index:index + length], offset
+        data = bytes[index:index + length]
+        if hasattr(data, 'tobytes'):
+            # Slicing a memoryview doesn't copy, callers get bytes
+            data = data.tobytes()
+        return data, offset
+
+
+def _copy_bytes(buffer, start, end):
+    data = buffer[start:end]
+    if hasattr(data, 'tobytes'):
+        return data.tobytes()
+    return bytes(data)
+
+
+def read_compact_stat(buffer, offset):
+    """Return the :class:`~kazoo.protocol.states.CompactStat` at
+    `offset`, holding a copy of its bytes"""
+    return CompactStat(_copy_bytes(buffer, offset, offset + stat_struct.size))
+
+
+def _uniform_length(data, count):
+    """Return the length of the `count` length prefixed strings at the
+    start of `data` if they all have the same, as the names of
+    sequential nodes do, or `None`
+
+    The prefixes are checked a byte at a time for all the strings at
+    once, with slices stepping from one to the next.
+
+    """
+    if count < 2 or len(data) < 4:
+        return None
+    length = int_struct.unpack_from(data, 0)[0]
+    stride = length + 4
+    end = stride * count
+    if length < 0 or len(data) < end:
+        return None
+    for i in range(4):
+        if data[i:end:stride] != data[i:i + 1] * count:
+            return None
+    return length
+
+
+def _uniform_vector(buffer, offset, count):
+    """Return a copy of the `count` length prefixed strings at `offset`
+    and their length if they all have the length of the first, or
+    `(None, None)`"""
+    length = int_struct.unpack_from(buffer, offset)[0]
+    end = offset + (length + 4) * count
+    if length < 0 or end > len(buffer):
+        return None, None
+    data = _copy_bytes(buffer, offset, end)
+    if count > 1 and _uniform_length(data, count) is None:
+        return None, None
+    return data, length
+
+
+def read_string_vector(buffer, offset):
+    """Read a vector of strings, like the names of the children of a
+    node
+
+    Rather than calling :func:`read_string` for each string, this
+    decodes all of them in one go: when they have the same length it
+    slices them out of the decoded vector, otherwise it joins them with
+    slashes, which node names can't contain, and splits the decoded
+    result. Returns the list of strings and the new offset.
+
+    """
+    count = int_struct.unpack_from(buffer, offset)[0]
+    offset += int_struct.size
+    if count <= 0:
+        return [], offset
+
+    data, length = _uniform_vector(buffer, offset, count)
+    # The length prefixes are decoded along with the strings, which
+    # only works when none of their bytes is 0x80 or above
+    if data is not None and not length & 0x80808080:
+        stride = length + 4
+        end = stride * count
+        try:
+            text = utf_8_decode(data)[0]
+            if len(text) == len(data):
+                names = [text[i:i + length] for i in range(4, end, stride)]
+            else:
+                # Multibyte characters, text and data offsets differ
+                names = [utf_8_decode(data[i:i + length])[0]
+                         for i in range(4, end, stride)]
+        except UnicodeDecodeError:
+            return _read_strings(buffer, offset, count)
+        return names, offset + end
+
+    unpack_from = int_struct.unpack_from
+    slices = []
+    append = slices.append
+    pos = offset
+    for i in range(count):
+        length = unpack_from(buffer, pos)[0]
+        pos += 4
+        if length < 0:
+            # A null string
+            return _read_strings(buffer, offset, count)
+        append(buffer[pos:pos + length])
+        pos += length
+    try:
+        joined = b'/'.join(slices)
+    except TypeError:
+        # Python 2 doesn't join memoryviews
+        joined = b'/'.join([s.tobytes() for s in slices])
+    try:
+        names = utf_8_decode(joined)[0].split(u'/')
+    except UnicodeDecodeError:
+        return _read_strings(buffer, offset, count)
+    if len(names) != count:
+        # Strings with slashes, not node names
+        return _read_strings(buffer, offset, count)
+    return names, pos
+
+
+def _read_strings(buffer, offset, count):
+    strings = []
+    for i in range(count):
+        string, offset = read_string(buffer, offset)
+        strings.append(string)
+    return strings, offset
+
+
+def read_child_names(buffer, offset):
+    """Like :func:`read_string_vector`, but returns a
+    :class:`~kazoo.protocol.states.ChildNames` decoding the strings as
+    they're accessed, and the new offset"""
+    count = int_struct.unpack_from(buffer, offset)[0]
+    offset += int_struct.size
+    if count <= 0:
+        return ChildNames(b'', ()), offset
+
+    data, length = _uniform_vector(buffer, offset, count)
+    if data is not None:
+        end = (length + 4) * count
+        return ChildNames(data, lazy_range(4, end, length + 4)), offset + end
+
+    unpack_from = int_struct.unpack_from
+    starts = array('i')
+    append = starts.append
+    pos = offset
+    for i in range(count):
+        length = unpack_from(buffer, pos)[0]
+        pos += 4
+        append(pos - offset)
+        if length > 0:
+            pos += length
+    return ChildNames(_copy_bytes(buffer, offset, pos), starts), pos
+
+
+def read_buffer_view(bytes, offset):
+    """Like :func:`read_buffer` but returns a memoryview of `bytes`
+    instead of a copy of the data"""
+    length = int_struct.unpack_from(bytes, offset)[0]
+    offset += int_struct.size
+    if length < 0:
+        return None, offset
+    index = offset
+    offset += length
+    return memoryview(bytes)[index:offset], offset
+
+
+class _Request(object):
+    """Base for requests, which serialize themselves by appending their
+    fields to a bytearray in :meth:`serialize_into`"""
+    def serialize(self):
+        b = bytearray()
+        self.serialize_into(b)
+        return b
 
 
 class Close(namedtuple('Close', '')):
@@ -79,6 +315,10 @@ class Close(namedtuple('Close', '')):
     def serialize(cls):
         return b''
 
+    @classmethod
+    def serialize_into(cls, b):
+        pass
+
 CloseInstance = Close()
 
 
@@ -89,21 +329,23 @@ class Ping(namedtuple('Ping', '')):
     def serialize(cls):
         return b''
 
+    @classmethod
+    def serialize_into(cls, b):
+        pass
+
 PingInstance = Ping()
 
 
 class Connect(namedtuple('Connect', 'protocol_version last_zxid_seen'
-                         ' time_out session_id passwd read_only')):
+                         ' time_out session_id passwd read_only'), _Request):
     type = None
 
-    def serialize(self):
-        b = bytearray()
-        b.extend(int_long_int_long_struct.pack(
+    def serialize_into(self, b):
+        b += int_long_int_long_struct.pack(
             self.protocol_version, self.last_zxid_seen, self.time_out,
-            self.session_id))
-        b.extend(write_buffer(self.passwd))
-        b.extend([1 if self.read_only else 0])
-        return b
+            self.session_id)
+        append_buffer(b, self.passwd)
+        b.append(1 if self.read_only else 0)
 
     @classmethod
     def deserialize(cls, bytes, offset):
@@ -121,62 +363,56 @@ class Connect(namedtuple('Connect', 'protocol_version last_zxid_seen'
                    read_only), offset
 
 
-class Create(namedtuple('Create', 'path data acl flags')):
+class Create(namedtuple('Create', 'path data acl flags'), _Request):
     type = 1
 
-    def serialize(self):
-        b = bytearray()
-        b.extend(write_string(self.path))
-        b.extend(write_buffer(self.data))
-        b.extend(int_struct.pack(len(self.acl)))
-        for acl in self.acl:
-            b.extend(int_struct.pack(acl.perms) +
-                     write_string(acl.id.scheme) + write_string(acl.id.id))
-        b.extend(int_struct.pack(self.flags))
-        return b
+    def serialize_into(self, b):
+        append_string(b, self.path)
+        append_buffer(b, self.data)
+        append_acls(b, self.acl)
+        b += int_struct.pack(self.flags)
 
     @classmethod
     def deserialize(cls, bytes, offset):
         return read_string(bytes, offset)[0]
 
 
-class Delete(namedtuple('Delete', 'path version')):
+class Delete(namedtuple('Delete', 'path version'), _Request):
     type = 2
 
-    def serialize(self):
-        b = bytearray()
-        b.extend(write_string(self.path))
-        b.extend(int_struct.pack(self.version))
-        return b
+    def serialize_into(self, b):
+        append_string(b, self.path)
+        b += int_struct.pack(self.version)
 
     @classmethod
     def deserialize(self, bytes, offset):
         return True
 
 
-class Exists(namedtuple('Exists', 'path watcher')):
+class Exists(namedtuple('Exists', 'path watcher'), _Request):
     type = 3
 
-    def serialize(self):
-        b = bytearray()
-        b.extend(write_string(self.path))
-        b.extend([1 if self.watcher else 0])
-        return b
+    def serialize_into(self, b):
+        append_string(b, self.path)
+        b.append(1 if self.watcher else 0)
 
     @classmethod
     def deserialize(cls, bytes, offset):
         stat = ZnodeStat._make(stat_struct.unpack_from(bytes, offset))
         return stat if stat.czxid != -1 else None
 
+    @classmethod
+    def deserialize_compact(cls, bytes, offset):
+        stat = read_compact_stat(bytes, offset)
+        return stat if stat.czxid != -1 else None
+
 
-class GetData(namedtuple('GetData', 'path watcher')):
+class GetData(namedtuple('GetData', 'path watcher'), _Request):
     type = 4
 
-    def serialize(self):
-        b = bytearray()
-        b.extend(write_string(self.path))
-        b.extend([1 if self.watcher else 0])
-        return b
+    def serialize_into(self, b):
+        append_string(b, self.path)
+        b.append(1 if self.watcher else 0)
 
     @classmethod
     def deserialize(cls, bytes, offset):
@@ -184,27 +420,42 @@ class GetData(namedtuple('GetData', 'path watcher')):
         stat = ZnodeStat._make(stat_struct.unpack_from(bytes, offset))
         return data, stat
 
+    @classmethod
+    def deserialize_view(cls, bytes, offset, compact=False):
+        data, offset = read_buffer_view(bytes, offset)
+        if compact:
+            return data, read_compact_stat(bytes, offset)
+        stat = ZnodeStat._make(stat_struct.unpack_from(bytes, offset))
+        return data, stat
 
-class SetData(namedtuple('SetData', 'path data version')):
+    @classmethod
+    def deserialize_compact(cls, bytes, offset):
+        data, offset = read_buffer(bytes, offset)
+        return data, read_compact_stat(bytes, offset)
+
+
+class SetData(namedtuple('SetData', 'path data version'), _Request):
     type = 5
 
-    def serialize(self):
-        b = bytearray()
-        b.extend(write_string(self.path))
-        b.extend(write_buffer(self.data))
-        b.extend(int_struct.pack(self.version))
-        return b
+    def serialize_into(self, b):
+        append_string(b, self.path)
+        append_buffer(b, self.data)
+        b += int_struct.pack(self.version)
 
     @classmethod
     def deserialize(cls, bytes, offset):
         return ZnodeStat._make(stat_struct.unpack_from(bytes, offset))
 
+    @classmethod
+    def deserialize_compact(cls, bytes, offset):
+        return read_compact_stat(bytes, offset)
+
 
-class GetACL(namedtuple('GetACL', 'path')):
+class GetACL(namedtuple('GetACL', 'path'), _Request):
     type = 6
 
-    def serialize(self):
-        return bytearray(write_string(self.path))
+    def serialize_into(self, b):
+        append_string(b, self.path)
 
     @classmethod
     def deserialize(cls, bytes, offset):
@@ -221,101 +472,104 @@ class GetACL(namedtuple('GetACL', 'path')):
         return acls, stat
 
 
-class SetACL(namedtuple('SetACL', 'path acls version')):
+class SetACL(namedtuple('SetACL', 'path acls version'), _Request):
     type = 7
 
-    def serialize(self):
-        b = bytearray()
-        b.extend(write_string(self.path))
-        b.extend(int_struct.pack(len(self.acls)))
-        for acl in self.acls:
-            b.extend(int_struct.pack(acl.perms) +
-                     write_string(acl.id.scheme) + write_string(acl.id.id))
-        b.extend(int_struct.pack(self.version))
-        return b
+    def serialize_into(self, b):
+        append_string(b, self.path)
+        append_acls(b, self.acls)
+        b += int_struct.pack(self.version)
 
     @classmethod
     def deserialize(cls, bytes, offset):
         return ZnodeStat._make(stat_struct.unpack_from(bytes, offset))
 
+    @classmethod
+    def deserialize_compact(cls, bytes, offset):
+        return read_compact_stat(bytes, offset)
+
 
-class GetChildren(namedtuple('GetChildren', 'path watcher')):
+class GetChildren(namedtuple('GetChildren', 'path watcher'), _Request):
     type = 8
 
-    def serialize(self):
-        b = bytearray()
-        b.extend(write_string(self.path))
-        b.extend([1 if self.watcher else 0])
-        return b
+    def serialize_into(self, b):
+        append_string(b, self.path)
+        b.append(1 if self.watcher else 0)
 
     @classmethod
     def deserialize(cls, bytes, offset):
-        count = int_struct.unpack_from(bytes, offset)[0]
-        offset += int_struct.size
-        if count == -1:  # pragma: nocover
-            return []
+        return read_string_vector(bytes, offset)[0]
 
-        children = []
-        for c in range(count):
-            child, offset = read_string(bytes, offset)
-            children.append(child)
-        return children
+
+class LazyGetChildren(GetChildren):
+    """A :class:`GetChildren` returning a
+    :class:`~kazoo.protocol.states.ChildNames`"""
+    @classmethod
+    def deserialize(cls, bytes, offset):
+        return read_child_names(bytes, offset)[0]
 
 
-class Sync(namedtuple('Sync', 'path')):
+class Sync(namedtuple('Sync', 'path'), _Request):
     type = 9
 
-    def serialize(self):
-        return write_string(self.path)
+    def serialize_into(self, b):
+        append_string(b, self.path)
 
     @classmethod
     def deserialize(cls, buffer, offset):
         return read_string(buffer, offset)[0]
 
 
-class GetChildren2(namedtuple('GetChildren2', 'path watcher')):
+class GetChildren2(namedtuple('GetChildren2', 'path watcher'), _Request):
     type = 12
 
-    def serialize(self):
-        b = bytearray()
-        b.extend(write_string(self.path))
-        b.extend([1 if self.watcher else 0])
-        return b
+    def serialize_into(self, b):
+        append_string(b, self.path)
+        b.append(1 if self.watcher else 0)
 
     @classmethod
     def deserialize(cls, bytes, offset):
-        count = int_struct.unpack_from(bytes, offset)[0]
-        offset += int_struct.size
-        if count == -1:  # pragma: nocover
-            return []
+        children, offset = read_string_vector(bytes, offset)
+        stat = ZnodeStat._make(stat_struct.unpack_from(bytes, offset))
+        return children, stat
 
-        children = []
-        for c in range(count):
-            child, offset = read_string(bytes, offset)
-            children.append(child)
+    @classmethod
+    def deserialize_compact(cls, bytes, offset):
+        children, offset = read_string_vector(bytes, offset)
+        return children, read_compact_stat(bytes, offset)
+
+
+class LazyGetChildren2(GetChildren2):
+    """A :class:`GetChildren2` returning a
+    :class:`~kazoo.protocol.states.ChildNames`"""
+    @classmethod
+    def deserialize(cls, bytes, offset):
+        children, offset = read_child_names(bytes, offset)
         stat = ZnodeStat._make(stat_struct.unpack_from(bytes, offset))
         return children, stat
 
+    @classmethod
+    def deserialize_compact(cls, bytes, offset):
+        children, offset = read_child_names(bytes, offset)
+        return children, read_compact_stat(bytes, offset)
+
 
-class CheckVersion(namedtuple('CheckVersion', 'path version')):
+class CheckVersion(namedtuple('CheckVersion', 'path version'), _Request):
     type = 13
 
-    def serialize(self):
-        b = bytearray()
-        b.extend(write_string(self.path))
-        b.extend(int_struct.pack(self.version))
-        return b
+    def serialize_into(self, b):
+        append_string(b, self.path)
+        b += int_struct.pack(self.version)
 
 
-class Transaction(namedtuple('Transaction', 'operations')):
+class Transaction(namedtuple('Transaction', 'operations'), _Request):
     type = 14
 
-    def serialize(self):
-        b = bytearray()
+    def serialize_into(self, b):
         for op in self.operations:
-            b.extend(MultiHeader(op.type, False, -1).serialize() +
-                     op.serialize())
-        return b + multiheader_struct.pack(-1, True, -1)
+            b += multiheader_struct.pack(op.type, False, -1)
+            op.serialize_into(b)
+        b += multiheader_struct.pack(-1, True, -1)
 
     @classmethod
     def deserialize(cls, bytes, offset):
@@ -353,16 +607,47 @@ class Transaction(namedtuple('Transaction', 'operations')):
         return resp
 
 
-class Reconfig(namedtuple('Reconfig', 'joining leaving new_members config_id')):
+class MultiRead(namedtuple('MultiRead', 'operations'), _Request):
+    type = 22
+
+    def serialize_into(self, b):
+        for op in self.operations:
+            b += multiheader_struct.pack(op.type, False, -1)
+            op.serialize_into(b)
+        b += multiheader_struct.pack(-1, True, -1)
+
+    @classmethod
+    def deserialize(cls, bytes, offset):
+        """Returns the result of each read, or the exception it failed
+        with"""
+        results = []
+        header, offset = MultiHeader.deserialize(bytes, offset)
+        while not header.done:
+            if header.type == GetData.type:
+                data, offset = read_buffer(bytes, offset)
+                stat = ZnodeStat._make(stat_struct.unpack_from(bytes, offset))
+                offset += stat_struct.size
+                results.append((data, stat))
+            elif header.type == GetChildren.type:
+                children, offset = read_string_vector(bytes, offset)
+                results.append(children)
+            else:
+                err = int_struct.unpack_from(bytes, offset)[0]
+                offset += int_struct.size
+                results.append(EXCEPTIONS[err]())
+            header, offset = MultiHeader.deserialize(bytes, offset)
+        return results
+
+
+class Reconfig(namedtuple('Reconfig', 'joining leaving new_members config_id'),
+               _Request):
     type = 16
 
-    def serialize(self):
-        b = bytearray()
-        b.extend(write_string(self.joining))
-        b.extend(write_string(self.leaving))
-        b.extend(write_string(self.new_members))
-        b.extend(long_struct.pack(self.config_id))
-        return b
+    def serialize_into(self, b):
+        append_string(b, self.joining)
+        append_string(b, self.leaving)
+        append_string(b, self.new_members)
+        b += long_struct.pack(self.config_id)
 
     @classmethod
     def deserialize(cls, bytes, offset):
@@ -371,12 +656,75 @@ class Reconfig(namedtuple('Reconfig', 'joining leaving new_members config_id')):
         return data, stat
 
 
-class Auth(namedtuple('Auth', 'auth_type scheme auth')):
+class Auth(namedtuple('Auth', 'auth_type scheme auth'), _Request):
     type = 100
 
-    def serialize(self):
-        return (int_struct.pack(self.auth_type) + write_string(self.scheme) +
-                write_string(self.auth))
+    def serialize_into(self, b):
+        b += int_struct.pack(self.auth_type)
+        append_string(b, self.scheme)
+        append_string(b, self.auth)
+
+
+class CheckWatches(namedtuple('CheckWatches', 'path watcher_type watcher'),
+                   _Request):
+    type = 17
+
+    def serialize_into(self, b):
+        append_string(b, self.path)
+        b += int_struct.pack(self.watcher_type)
+
+    @classmethod
+    def deserialize(cls, bytes, offset):
+        return True
+
+
+class RemoveWatches(namedtuple('RemoveWatches', 'path watcher_type'),
+                    _Request):
+    type = 18
+
+    def serialize_into(self, b):
+        append_string(b, self.path)
+        b += int_struct.pack(self.watcher_type)
+
+    @classmethod
+    def deserialize(cls, bytes, offset):
+        return True
+
+
+class _SetWatchesRequest(_Request):
+    """Base for the requests setting watches again, a zxid followed by
+    a vector of paths per kind of watch"""
+    def serialize_into(self, b):
+        b += long_struct.pack(self.relative_zxid)
+        for paths in self[1:]:
+            b += int_struct.pack(len(paths))
+            for path in paths:
+                append_string(b, path)
+
+
+class SetWatches(namedtuple('SetWatches', 'relative_zxid data_watches'
+                            ' exist_watches child_watches'),
+                 _SetWatchesRequest):
+    type = 101
+
+
+class SetWatches2(namedtuple('SetWatches2', 'relative_zxid data_watches'
+                             ' exist_watches child_watches persistent_watches'
+                             ' persistent_recursive_watches'),
+                  _SetWatchesRequest):
+    type = 105
+
+
+class AddWatch(namedtuple('AddWatch', 'path watcher mode'), _Request):
+    type = 106
+
+    def serialize_into(self, b):
+        append_string(b, self.path)
+        b += int_struct.pack(self.mode)
+
+    @classmethod
+    def deserialize(cls, bytes, offset):
+        return True
 
 
 class Watch(namedtuple('Watch', 'type state path')):
@@ -400,13 +748,9 @@ class ReplyHeader(namedtuple('ReplyHeader', 'xid, zxid, err')):
             reply_header_struct.unpack_from(bytes, offset)), new_offset
 
 
-class MultiHeader(namedtuple('MultiHeader', 'type done err')):
-    def serialize(self):
-        b = bytearray()
-        b.extend(int_struct.pack(self.type))
-        b.extend([1 if self.done else 0])
-        b.extend(int_struct.pack(self.err))
-        return b
+class MultiHeader(namedtuple('MultiHeader', 'type done err'), _Request):
+    def serialize_into(self, b):
+        b += multiheader_struct.pack(self.type, self.done, self.err)
 
     @classmethod
     def deserialize(cls, bytes, offset):
@@ -1,5 +1,15 @@
 """Kazoo State and Event objects"""
+from bisect import bisect_left
 from collections import namedtuple
+import struct
+
+try:
+    from collections.abc import Sequence
+except ImportError:  # pragma: nocover
+    from collections import Sequence
+
+_length_struct = struct.Struct('!i')
+_stat_struct = struct.Struct('!qqqqiiiqiiq')
 
 
 class KazooState(object):
@@ -99,6 +109,63 @@ class EventType(object):
     CHANGED = 'CHANGED'
     CHILD = 'CHILD'
 
+
+class AddWatchMode(object):
+    """Modes of the watches set with
+    :meth:`~kazoo.client.KazooClient.add_watch`
+
+    Unlike the watches left by :meth:`~kazoo.client.KazooClient.get`
+    and the like, these aren't removed once they're triggered.
+
+    .. attribute:: PERSISTENT
+
+        Triggered by the same events as a data watch and a child watch
+        on the node.
+
+    .. attribute:: PERSISTENT_RECURSIVE
+
+        Triggered by the created, deleted and changed events of the
+        node and of every node under it, but not by child events.
+
+    """
+    PERSISTENT = 0
+    PERSISTENT_RECURSIVE = 1
+
+
+class WatcherType(object):
+    """Types of the watches removed with
+    :meth:`~kazoo.client.KazooClient.remove_watches`
+
+    .. attribute:: CHILDREN
+
+        Watches set with
+        :meth:`~kazoo.client.KazooClient.get_children`.
+
+    .. attribute:: DATA
+
+        Watches set with :meth:`~kazoo.client.KazooClient.get` and
+        :meth:`~kazoo.client.KazooClient.exists`.
+
+    .. attribute:: ANY
+
+        Watches of any type.
+
+    .. attribute:: PERSISTENT
+
+        Watches set in the :attr:`AddWatchMode.PERSISTENT` mode.
+
+    .. attribute:: PERSISTENT_RECURSIVE
+
+        Watches set in the :attr:`AddWatchMode.PERSISTENT_RECURSIVE`
+        mode.
+
+    """
+    CHILDREN = 1
+    DATA = 2
+    ANY = 3
+    PERSISTENT = 4
+    PERSISTENT_RECURSIVE = 5
+
 EVENT_TYPE_MAP = {
     1: EventType.CREATED,
     2: EventType.DELETED,
@@ -141,9 +208,51 @@ class Callback(namedtuple('Callback', ('type', 'func', 'args'))):
     """
 
 
+class _StatProperties(object):
+    """The convenience properties of :class:`ZnodeStat` and
+    :class:`CompactStat`"""
+    __slots__ = ()
+
+    @property
+    def acl_version(self):
+        return self.aversion
+
+    @property
+    def children_version(self):
+        return self.cversion
+
+    @property
+    def created(self):
+        return self.ctime / 1000.0
+
+    @property
+    def last_modified(self):
+        return self.mtime / 1000.0
+
+    @property
+    def owner_session_id(self):
+        return self.ephemeralOwner or None
+
+    @property
+    def creation_transaction_id(self):
+        return self.czxid
+
+    @property
+    def last_modified_transaction_id(self):
+        return self.mzxid
+
+    @property
+    def data_length(self):
+        return self.dataLength
+
+    @property
+    def children_count(self):
+        return self.numChildren
+
+
 class ZnodeStat(namedtuple('ZnodeStat', 'czxid mzxid ctime mtime version'
                            ' cversion aversion ephemeralOwner dataLength'
-                           ' numChildren pzxid')):
+                           ' numChildren pzxid'), _StatProperties):
     """A ZnodeStat structure with convenience properties
 
     When getting the value of a node from Zookeeper, the properties for
@@ -200,38 +309,163 @@ class ZnodeStat(namedtuple('ZnodeStat', 'czxid mzxid ctime mtime version'
         The number of children of this znode.
 
     """
-    @property
-    def acl_version(self):
-        return self.aversion
 
-    @property
-    def children_version(self):
-        return self.cversion
 
-    @property
-    def created(self):
-        return self.ctime / 1000.0
+def _stat_field(offset, format):
+    field = struct.Struct(format)
 
-    @property
-    def last_modified(self):
-        return self.mtime / 1000.0
+    def get(self):
+        return field.unpack_from(self._data, offset)[0]
+    return property(get)
 
-    @property
-    def owner_session_id(self):
-        return self.ephemeralOwner or None
 
-    @property
-    def creation_transaction_id(self):
-        return self.czxid
+class CompactStat(_StatProperties):
+    """A Stat structure decoded as its fields are accessed
 
-    @property
-    def last_modified_transaction_id(self):
-        return self.mzxid
+    Returned instead of :class:`ZnodeStat` by clients created with
+    ``compact_stats=True``. It holds the 68 bytes of the Stat as they
+    were received and decodes a field when it's accessed, about half
+    the memory of a :class:`ZnodeStat` for code keeping the stats of a
+    lot of nodes around, and no decoding at all of the fields that are
+    never looked at.
 
-    @property
-    def data_length(self):
-        return self.dataLength
+    It has the same attributes and convenience properties as
+    :class:`ZnodeStat`, and like it can be indexed, iterated and
+    unpacked. It compares equal to the :class:`ZnodeStat` of the same
+    values, but isn't one, use :meth:`to_znodestat` where a
+    :class:`ZnodeStat` is needed.
 
-    @property
-    def children_count(self):
-        return self.numChildren
+    .. versionadded:: 2.3
+
+    """
+    __slots__ = ('_data',)
+
+    _fields = ZnodeStat._fields
+
+    czxid = _stat_field(0, '!q')
+    mzxid = _stat_field(8, '!q')
+    ctime = _stat_field(16, '!q')
+    mtime = _stat_field(24, '!q')
+    version = _stat_field(32, '!i')
+    cversion = _stat_field(36, '!i')
+    aversion = _stat_field(40, '!i')
+    ephemeralOwner = _stat_field(44, '!q')
+    dataLength = _stat_field(52, '!i')
+    numChildren = _stat_field(56, '!i')
+    pzxid = _stat_field(60, '!q')
+
+    def __init__(self, data):
+        if len(data) != _stat_struct.size:
+            raise ValueError("A Stat is %d bytes, not %d" % (
+                _stat_struct.size, len(data)))
+        self._data = data
+
+    def to_znodestat(self):
+        """Decode all the fields into a :class:`ZnodeStat`"""
+        return ZnodeStat._make(_stat_struct.unpack(self._data))
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __iter__(self):
+        return iter(_stat_struct.unpack(self._data))
+
+    def __getitem__(self, index):
+        return _stat_struct.unpack(self._data)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, CompactStat):
+            return self._data == other._data
+        if isinstance(other, tuple):
+            return _stat_struct.unpack(self._data) == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        # Like the ZnodeStat it's equal to
+        return hash(_stat_struct.unpack(self._data))
+
+    def __reduce__(self):
+        return (CompactStat, (self._data,))
+
+    def __repr__(self):
+        return 'CompactStat(%s)' % ', '.join(
+            '%s=%r' % item for item in
+            zip(self._fields, _stat_struct.unpack(self._data)))
+
+
+class ChildNames(Sequence):
+    """A read-only sequence of child node names, decoded as they're
+    accessed
+
+    Returned by :meth:`~kazoo.client.KazooClient.get_children` with
+    `lazy` set, it holds the names as they were received, length
+    prefixed UTF-8, along with where each of them starts. Listing a node
+    with a lot of children then takes little more than a copy of the
+    reply, and only the names looked at get decoded.
+
+    It supports ``len()``, indexing and slicing, iteration, ``in`` and
+    the other :class:`Sequence` methods, and compares equal to the list
+    of the same names. Use ``list()`` to decode all of them.
+
+    .. versionadded:: 2.3
+
+    """
+    __slots__ = ('_data', '_starts')
+
+    def __init__(self, data, starts):
+        self._data = data
+        # Ascending offsets of the names in data, each following its
+        # length
+        self._starts = starts
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self._decode(self._starts[index])
+
+    def _decode(self, start):
+        length = _length_struct.unpack_from(self._data, start - 4)[0]
+        if length < 0:
+            return None
+        return self._data[start:start + length].decode('utf-8')
+
+    def __iter__(self):
+        decode = self._decode
+        for start in self._starts:
+            yield decode(start)
+
+    def __contains__(self, name):
+        if not isinstance(name, bytes):
+            name = name.encode('utf-8')
+        # Look for the name along with its length, then check it's one
+        # of the names rather than a part of one
+        needle = _length_struct.pack(len(name)) + name
+        data, starts = self._data, self._starts
+        found = data.find(needle)
+        while found != -1:
+            index = bisect_left(starts, found + 4)
+            if index < len(starts) and starts[index] == found + 4:
+                return True
+            found = data.find(needle, found + 1)
+        return False
+
+    def __eq__(self, other):
+        if isinstance(other, (ChildNames, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'ChildNames(%r)' % list(self)
@@ -0,0 +1,103 @@
+"""Request statistics kept by the connection"""
+import math
+import time
+from bisect import bisect_left
+
+# Clock used to time requests
+now = getattr(time, 'monotonic', time.time)
+
+# Upper bounds of the latency histogram buckets in seconds, four buckets
+# per doubling from 10 microseconds up to almost three minutes
+LATENCY_BUCKETS = tuple(1e-5 * 2 ** (i / 4.0) for i in range(97))
+
+
+class LatencyHistogram(object):
+    """Counts of latencies in the fixed :data:`LATENCY_BUCKETS`
+
+    Percentiles are reported as the upper bound of the bucket they fall
+    in, which is at most 19% above the actual latency.
+
+    """
+    def __init__(self):
+        # One more for the latencies above the last bucket
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, latency):
+        self.counts[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.count += 1
+        if latency > self.max:
+            self.max = latency
+
+    def percentile(self, percent):
+        """Return the latency `percent` percent of the latencies are
+        below, or `None` if there are none"""
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(self.count * percent / 100.0)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        if index < len(LATENCY_BUCKETS):
+            return min(LATENCY_BUCKETS[index], self.max)
+        return self.max
+
+
+class OpStats(object):
+    """Statistics of the requests of one type"""
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'p50': self.latency.percentile(50),
+            'p99': self.latency.percentile(99),
+            'max': self.latency.max,
+        }
+
+
+class ConnectionStats(object):
+    """Statistics of the requests and traffic of a connection
+
+    Only updated from the connection thread.
+
+    """
+    def __init__(self):
+        self.ops = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.connections = 0
+        self.timeouts = 0
+
+    def record(self, request, started, error=False):
+        """Record the completion of `request`, queued at `started`"""
+        latency = now() - started
+        op = self.ops.get(request.__class__)
+        if op is None:
+            op = self.ops[request.__class__] = OpStats(
+                request.__class__.__name__)
+        op.count += 1
+        if error:
+            op.errors += 1
+        op.latency.add(latency)
+
+    def snapshot(self):
+        ops = {}
+        for op in list(self.ops.values()):
+            ops[op.name] = op.snapshot()
+        return {
+            'ops': ops,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'connections': self.connections,
+            'reconnects': max(self.connections - 1, 0),
+            'timeouts': self.timeouts,
+        }
@@ -0,0 +1,443 @@
+"""TreeCache
+
+:Maintainer: None
+:Status: Beta
+
+An in-memory mirror of a subtree, kept current with watches.
+
+"""
+import logging
+import sys
+from collections import namedtuple
+from functools import partial
+
+from kazoo.exceptions import (
+    ConnectionLoss,
+    NoNodeError,
+    SessionExpiredError,
+    UnimplementedError,
+)
+from kazoo.protocol.states import (
+    AddWatchMode,
+    EventType,
+    KazooState,
+    WatcherType,
+)
+
+log = logging.getLogger(__name__)
+
+
+class NodeData(namedtuple('NodeData', 'path data stat children')):
+    """A node of a :class:`TreeCache`
+
+    .. attribute:: path
+
+        The path of the node.
+
+    .. attribute:: data
+
+        The value of the node.
+
+    .. attribute:: stat
+
+        The :class:`~kazoo.protocol.states.ZnodeStat` of the node, as of
+        the last time its value was read.
+
+    .. attribute:: children
+
+        A frozenset of the names of the child nodes.
+
+    """
+
+
+class TreeEvent(namedtuple('TreeEvent', 'event_type node')):
+    """A change to a :class:`TreeCache` passed to its listeners
+
+    .. attribute:: event_type
+
+        One of :attr:`NODE_ADDED`, :attr:`NODE_UPDATED`,
+        :attr:`NODE_REMOVED` or :attr:`INITIALIZED`.
+
+    .. attribute:: node
+
+        The :class:`NodeData` added, updated or removed, `None` for
+        :attr:`INITIALIZED`.
+
+    """
+    NODE_ADDED = 'NODE_ADDED'
+    NODE_UPDATED = 'NODE_UPDATED'
+    NODE_REMOVED = 'NODE_REMOVED'
+    INITIALIZED = 'INITIALIZED'
+
+
+def _join(path, name):
+    if path == '/':
+        return path + name
+    return path + '/' + name
+
+
+def _node_size(node):
+    size = (sys.getsizeof(node) + sys.getsizeof(node.path) +
+            sys.getsizeof(node.stat) + sys.getsizeof(node.children))
+    if node.data is not None:
+        size += sys.getsizeof(node.data)
+    for name in node.children:
+        size += sys.getsizeof(name)
+    return size
+
+
+class TreeCache(object):
+    """Keeps the value, stat and children of every node under a path
+    in memory
+
+    The subtree is loaded with reads sent without waiting for the
+    replies in between, a level of the tree per round trip. It's then
+    kept current with a data and a child watch per node, or with a
+    single persistent recursive watch on servers that support them
+    (ZooKeeper 3.6+).
+
+    Lookups don't take locks or go to the server, they return what the
+    cache holds at that moment. The cache is only changed with the
+    replies of its reads: events only make it read the nodes involved
+    again, in the order they happened.
+
+    Example:
+
+    .. code-block:: python
+
+        cache = TreeCache(client, '/services')
+        cache.start()
+        cache.initialized.wait()
+
+        for path, node in cache.snapshot().items():
+            print(path, node.data)
+
+    """
+    def __init__(self, client, path, recursive_watch=None):
+        """Create a cache of the subtree under a path
+
+        :param client: A zookeeper client.
+        :type client: :class:`~kazoo.client.KazooClient`
+        :param path: The path of the root of the subtree, which doesn't
+                     have to exist.
+        :param recursive_watch: Whether to keep the cache current with
+                                a persistent recursive watch, `None` to
+                                use one if the server supports them.
+
+        """
+        self._client = client
+        self._root = path.rstrip('/') or '/'
+        self._recursive = recursive_watch
+        self._nodes = {}
+        self._listeners = []
+        self._lock = client.handler.lock_object()
+        self._started = False
+        self._closed = False
+        # Reads of the initial load still waiting for their reply
+        self._outstanding = 0
+        # Bumped by each refresh, the connection failures of reads sent
+        # before the last refresh are already covered by it
+        self._generation = 0
+        self._needs_refresh = False
+        self.initialized = client.handler.event_object()
+
+    def start(self):
+        """Start loading the subtree and watching it
+
+        :attr:`initialized` is set, and the listeners get an
+        :attr:`~TreeEvent.INITIALIZED` event, once it's loaded.
+
+        """
+        if self._started:
+            raise RuntimeError('TreeCache already started')
+        self._started = True
+        self._client.add_listener(self._session_watcher)
+        self._refresh()
+
+    def close(self):
+        """Stop watching the subtree and empty the cache"""
+        self._closed = True
+        self._client.remove_listener(self._session_watcher)
+        if self._recursive:
+            self._client.remove_watches_async(
+                self._root, self._watch_node,
+                WatcherType.PERSISTENT_RECURSIVE)
+        with self._lock:
+            self._nodes = {}
+
+    def listen(self, listener):
+        """Call `listener` with a :class:`TreeEvent` for each change to
+        the cache
+
+        Listeners are called from the thread handling the replies of
+        the client, they shouldn't block.
+
+        """
+        self._listeners.append(listener)
+
+    def unlisten(self, listener):
+        """Stop calling `listener`"""
+        self._listeners.remove(listener)
+
+    def get(self, path):
+        """Return the :class:`NodeData` of the node at `path`, or `None`
+        if it isn't in the cache"""
+        return self._nodes.get(path)
+
+    def get_children(self, path):
+        """Return the frozenset of the names of the children of the
+        node at `path`, or `None` if it isn't in the cache"""
+        node = self._nodes.get(path)
+        if node is not None:
+            return node.children
+
+    def snapshot(self):
+        """Return a dict of the :class:`NodeData` of every cached node
+        by path, unaffected by later changes"""
+        return self._nodes.copy()
+
+    def memory_usage(self):
+        """Return a dict of the approximate memory used by each cached
+        node in bytes, including its path, value, stat and child names,
+        by path"""
+        return dict((path, _node_size(node))
+                    for path, node in self._nodes.copy().items())
+
+    def _notify(self, event_type, node=None):
+        event = TreeEvent(event_type, node)
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception:
+                log.exception('Error in TreeCache listener')
+
+    def _refresh(self):
+        """Read every node again, setting the watches again on the way"""
+        # Counted as a read so the load isn't seen as done before the
+        # reads are sent
+        self._started_read()
+        with self._lock:
+            self._generation += 1
+            self._needs_refresh = False
+            generation = self._generation
+            paths = [self._root] + [path for path in self._nodes
+                                    if path != self._root]
+        try:
+            if self._recursive is not False:
+                self._started_read()
+                self._client.add_watch_async(
+                    self._root, self._watch_node,
+                    AddWatchMode.PERSISTENT_RECURSIVE).rawlink(
+                        partial(self._watch_added, generation))
+                if self._recursive is None:
+                    # The reads follow once it's known to be supported
+                    return
+            for path in paths:
+                self._load(path, generation)
+        finally:
+            self._done_read()
+
+    def _watch_added(self, generation, result):
+        try:
+            result.get()
+        except UnimplementedError:
+            self._recursive = False
+            # The server drops the connection after failing the request
+            self._connection_failed(generation)
+        except (ConnectionLoss, SessionExpiredError):
+            self._connection_failed(generation)
+        except Exception:
+            log.exception('Error setting the watch of %s', self._root)
+        else:
+            if self._recursive is None:
+                self._recursive = True
+                self._load(self._root, generation)
+        finally:
+            self._done_read()
+
+    def _load(self, path, generation):
+        self._read_data(path, generation)
+        self._read_children(path, generation)
+
+    def _read_data(self, path, generation=None):
+        if generation is None:
+            generation = self._generation
+        watch = None if self._recursive else self._watch_node
+        self._started_read()
+        self._client.get_async(path, watch).rawlink(
+            partial(self._data_read, path, generation))
+
+    def _read_children(self, path, generation=None):
+        if generation is None:
+            generation = self._generation
+        watch = None if self._recursive else self._watch_children
+        self._started_read()
+        self._client.get_children_async(path, watch).rawlink(
+            partial(self._children_read, path, generation))
+
+    def _watch_node(self, event):
+        if self._closed:
+            return
+        if event.type == EventType.CREATED:
+            self._load(event.path, self._generation)
+        elif event.type in (EventType.CHANGED, EventType.DELETED):
+            self._read_data(event.path)
+
+    def _watch_children(self, event):
+        if not self._closed and event.type == EventType.CHILD:
+            self._read_children(event.path)
+
+    def _data_read(self, path, generation, result):
+        try:
+            data, stat = result.get()
+        except NoNodeError:
+            self._remove(path)
+            if path == self._root and not self._recursive:
+                # Watch for the root being created
+                self._started_read()
+                self._client.exists_async(path, self._watch_node).rawlink(
+                    partial(self._root_exists, generation))
+        except (ConnectionLoss, SessionExpiredError):
+            self._connection_failed(generation)
+        except Exception:
+            log.exception('Error reading %s', path)
+        else:
+            self._set_data(path, data, stat)
+        finally:
+            self._done_read()
+
+    def _root_exists(self, generation, result):
+        try:
+            if result.get() is not None:
+                self._load(self._root, generation)
+        except (ConnectionLoss, SessionExpiredError):
+            self._connection_failed(generation)
+        except Exception:
+            log.exception('Error reading %s', self._root)
+        finally:
+            self._done_read()
+
+    def _children_read(self, path, generation, result):
+        try:
+            children = result.get()
+        except NoNodeError:
+            # Removed with the reply to the read of its value
+            pass
+        except (ConnectionLoss, SessionExpiredError):
+            self._connection_failed(generation)
+        except Exception:
+            log.exception('Error reading the children of %s', path)
+        else:
+            self._set_children(path, children, generation)
+        finally:
+            self._done_read()
+
+    def _set_data(self, path, data, stat):
+        with self._lock:
+            if self._closed:
+                return
+            old = self._nodes.get(path)
+            if old is None:
+                if path != self._root:
+                    parent_path, name = path.rsplit('/', 1)
+                    parent_path = parent_path or '/'
+                    parent = self._nodes.get(parent_path)
+                    if parent is None:
+                        # Read after its parent was removed, the parent
+                        # finds it again if it's back
+                        return
+                    if name not in parent.children:
+                        self._nodes[parent_path] = parent._replace(
+                            children=parent.children | frozenset([name]))
+                node = NodeData(path, data, stat, frozenset())
+                event_type = TreeEvent.NODE_ADDED
+            elif old.stat.mzxid == stat.mzxid:
+                return
+            else:
+                node = old._replace(data=data, stat=stat)
+                event_type = TreeEvent.NODE_UPDATED
+            self._nodes[path] = node
+        self._notify(event_type, node)
+
+    def _set_children(self, path, children, generation):
+        with self._lock:
+            node = self._nodes.get(path)
+            if self._closed or node is None:
+                return
+            children = frozenset(children)
+            self._nodes[path] = node._replace(children=children)
+            removed = []
+            for name in node.children - children:
+                removed.extend(self._pop_tree(_join(path, name)))
+            new = [_join(path, name) for name in children
+                   if _join(path, name) not in self._nodes]
+        for node in removed:
+            self._notify(TreeEvent.NODE_REMOVED, node)
+        for child in new:
+            self._load(child, generation)
+
+    def _remove(self, path):
+        with self._lock:
+            if self._closed or path not in self._nodes:
+                return
+            if path != self._root:
+                parent_path, name = path.rsplit('/', 1)
+                parent_path = parent_path or '/'
+                parent = self._nodes.get(parent_path)
+                if parent is not None and name in parent.children:
+                    self._nodes[parent_path] = parent._replace(
+                        children=parent.children - frozenset([name]))
+            removed = self._pop_tree(path)
+        for node in removed:
+            self._notify(TreeEvent.NODE_REMOVED, node)
+
+    def _pop_tree(self, path):
+        """Remove the node at `path` and the nodes under it, returning
+        them children first, must hold the lock"""
+        node = self._nodes.pop(path, None)
+        if node is None:
+            return []
+        removed = []
+        for name in node.children:
+            removed.extend(self._pop_tree(_join(path, name)))
+        removed.append(node)
+        return removed
+
+    def _connection_failed(self, generation):
+        """A read failed with the connection, read everything again
+        once connected"""
+        with self._lock:
+            if self._closed or generation != self._generation:
+                return
+            if not self._client.connected:
+                self._needs_refresh = True
+                return
+        self._refresh()
+
+    def _started_read(self):
+        with self._lock:
+            if not self.initialized.is_set():
+                self._outstanding += 1
+
+    def _done_read(self):
+        with self._lock:
+            if self.initialized.is_set():
+                return
+            self._outstanding -= 1
+            if self._outstanding or self._needs_refresh or self._closed:
+                return
+            self.initialized.set()
+        self._notify(TreeEvent.INITIALIZED)
+
+    def _session_watcher(self, state):
+        with self._lock:
+            if state == KazooState.LOST:
+                # The watches are gone with the session
+                self._needs_refresh = True
+            elif state == KazooState.SUSPENDED:
+                # Unlike the others, persistent watches are set again
+                # without the events they missed
+                if self._recursive:
+                    self._needs_refresh = True
+            elif self._needs_refresh:
+                self._client.handler.spawn(self._refresh)
@@ -114,6 +114,8 @@ class DataWatch(object):
         self._include_event = None
         self._ever_called = False
         self._used = False
+        self._watch_established = False
+        self._reading = False
 
         if args or kwargs:
             warnings.warn('Passing additional arguments to DataWatch is'
@@ -169,15 +171,16 @@ class DataWatch(object):
             raise
 
     @_ignore_closed
-    def _get_data(self, event=None):
+    def _get_data(self, event=None, reestablish=False):
         # Ensure this runs one at a time, possible because the session
         # watcher may trigger a run
         with self._run_lock:
-            if self._stopped:
+            if self._stopped or (reestablish and self._watch_established):
                 return
 
             initial_version = self._version
 
+            self._reading = True
             try:
                 data, stat = self._retry(self._client.get,
                                          self._path, self._watcher)
@@ -191,6 +194,9 @@ class DataWatch(object):
                 if stat:
                     self._client.handler.spawn(self._get_data)
                     return
+            finally:
+                self._reading = False
+            self._watch_established = True
 
             # No node data, clear out version
             if stat is None:
@@ -211,8 +217,15 @@ class DataWatch(object):
             self._watch_established = state
 
     def _session_watcher(self, state):
-        if state == KazooState.CONNECTED:
-            self._client.handler.spawn(self._get_data)
+        # The client sets the watch again with SetWatches after a plain
+        # reconnect, the node only needs reading again when the session
+        # was lost or a read that would set the watch was in flight
+        if state == KazooState.LOST:
+            self._watch_established = False
+        elif state == KazooState.SUSPENDED and self._reading:
+            self._watch_established = False
+        elif state == KazooState.CONNECTED and not self._watch_established:
+            self._client.handler.spawn(self._get_data, reestablish=True)
 
 
 class ChildrenWatch(object):
@@ -274,6 +287,7 @@ class ChildrenWatch(object):
         self._send_event = send_event
         self._stopped = False
         self._watch_established = False
+        self._reading = False
         self._allow_session_lost = allow_session_lost
         self._run_lock = client.handler.lock_object()
         self._prior_children = None
@@ -310,13 +324,17 @@ class ChildrenWatch(object):
         return func
 
     @_ignore_closed
-    def _get_children(self, event=None):
+    def _get_children(self, event=None, reestablish=False):
         with self._run_lock:  # Ensure this runs one at a time
-            if self._stopped:
+            if self._stopped or (reestablish and self._watch_established):
                 return
 
-            children = self._client.retry(self._client.get_children,
-                                          self._path, self._watcher)
+            self._reading = True
+            try:
+                children = self._client.retry(self._client.get_children,
+                                              self._path, self._watcher)
+            finally:
+                self._reading = False
             if not self._watch_established:
                 self._watch_established = True
 
@@ -341,11 +359,14 @@ class ChildrenWatch(object):
         self._get_children(event)
 
     def _session_watcher(self, state):
-        if state in (KazooState.LOST, KazooState.SUSPENDED):
+        # See DataWatch._session_watcher
+        if state == KazooState.LOST:
+            self._watch_established = False
+        elif state == KazooState.SUSPENDED and self._reading:
             self._watch_established = False
         elif (state == KazooState.CONNECTED and
               not self._watch_established and not self._stopped):
-            self._client.handler.spawn(self._get_children)
+            self._client.handler.spawn(self._get_children, reestablish=True)
 
 
 class PatientChildrenWatch(object):
@@ -13,6 +13,7 @@ from kazoo.protocol.states import (
     KazooState
 )
 from kazoo.testing.common import ZookeeperCluster
+from kazoo.testing.server import StandInCluster
 from kazoo.protocol.connection import _CONNECTION_DROP, _SESSION_EXPIRED
 
 log = logging.getLogger(__name__)
@@ -27,16 +28,16 @@ def get_global_cluster():
         ZK_CLASSPATH = os.environ.get("ZOOKEEPER_CLASSPATH")
         ZK_PORT_OFFSET = int(os.environ.get("ZOOKEEPER_PORT_OFFSET", 20000))
 
-        assert ZK_HOME or ZK_CLASSPATH, (
-            "Either ZOOKEEPER_PATH or ZOOKEEPER_CLASSPATH environment "
-            "variable must be defined.\n"
-            "For deb package installations this is /usr/share/java")
-
-        CLUSTER = ZookeeperCluster(
-            install_path=ZK_HOME,
-            classpath=ZK_CLASSPATH,
-            port_offset=ZK_PORT_OFFSET,
-        )
+        if ZK_HOME or ZK_CLASSPATH:
+            CLUSTER = ZookeeperCluster(
+                install_path=ZK_HOME,
+                classpath=ZK_CLASSPATH,
+                port_offset=ZK_PORT_OFFSET,
+            )
+        else:
+            log.info("Neither ZOOKEEPER_PATH nor ZOOKEEPER_CLASSPATH is "
+                     "defined, testing against the ZooKeeper stand-in")
+            CLUSTER = StandInCluster(port_offset=ZK_PORT_OFFSET)
         atexit.register(lambda cluster: cluster.terminate(), CLUSTER)
     return CLUSTER
 
@@ -0,0 +1,1264 @@
+"""A pure Python stand-in for ZooKeeper
+
+:class:`StandInZooKeeper` speaks the ZooKeeper client protocol, keeping
+its data in memory, so tests and benchmarks can run without a Java
+ZooKeeper install. It supports sessions and their expiry, ephemeral and
+sequential nodes, ACLs with the ``world``, ``digest`` and ``ip``
+schemes, one-shot and persistent watches, ``multi`` and ``multiRead``
+transactions, setting watches again after a reconnect and the ``ruok``,
+``isro``, ``envi``, ``srvr`` and ``stat`` commands.
+
+A :class:`StandInCluster` runs several servers sharing the same data,
+like the members of an ensemble. Stopping a majority of them makes the
+others read-only, as when a ZooKeeper ensemble loses its quorum.
+
+Not supported: reconfig, container and TTL nodes, quotas, SASL and the
+server side of ``super`` digest authentication.
+
+"""
+import logging
+import random
+import socket
+import threading
+import time
+from collections import defaultdict
+
+from kazoo.exceptions import (
+    AuthFailedError,
+    BadArgumentsError,
+    BadVersionError,
+    InvalidACLError,
+    MarshallingError,
+    NoAuthError,
+    NoChildrenForEphemeralsError,
+    NodeExistsError,
+    NoNodeError,
+    NotEmptyError,
+    NotReadOnlyCallError,
+    NoWatcherError,
+    RolledBackError,
+    RuntimeInconsistency,
+    UnimplementedError,
+    ZookeeperError,
+)
+from kazoo.protocol.connection import (
+    AUTH_XID,
+    CHANGED_EVENT,
+    CHILD_EVENT,
+    CREATED_EVENT,
+    DELETED_EVENT,
+    PING_XID,
+    SET_WATCHES_XID,
+    WATCH_XID,
+)
+from kazoo.protocol.serialization import (
+    AddWatch,
+    Auth,
+    CheckVersion,
+    CheckWatches,
+    Close,
+    Create,
+    Delete,
+    Exists,
+    GetACL,
+    GetChildren,
+    GetChildren2,
+    GetData,
+    MultiRead,
+    Ping,
+    RemoveWatches,
+    SetACL,
+    SetData,
+    SetWatches,
+    SetWatches2,
+    Sync,
+    Transaction,
+    append_acls,
+    append_buffer,
+    append_string,
+    bool_struct,
+    int_int_struct,
+    int_long_int_long_struct,
+    int_struct,
+    long_struct,
+    multiheader_struct,
+    read_acl,
+    read_buffer,
+    read_string,
+    reply_header_struct,
+    stat_struct,
+)
+from kazoo.protocol.states import AddWatchMode, WatcherType
+from kazoo.security import ACL, Id, Permissions, make_digest_acl_credential
+
+log = logging.getLogger(__name__)
+
+# The largest packet accepted, like ZooKeeper's default jute.maxbuffer.
+# Clients sending larger ones get their connection closed.
+MAX_PACKET_SIZE = 0xfffff
+
+# Bytes per second written to the transaction log. Requests aren't
+# logged, but large ones are delayed accordingly, like they'd be by a
+# server writing them to disk.
+LOG_BANDWIDTH = 100 * 1024 * 1024
+
+# State of the watch events sent to connected clients
+SYNC_CONNECTED = 3
+
+EPHEMERAL = 1
+SEQUENCE = 2
+
+# Types of the write requests, which read-only servers refuse
+WRITE_TYPES = frozenset([Create.type, Delete.type, SetData.type,
+                         SetACL.type, Transaction.type])
+
+# The first ZooKeeper version with each of the newer request types,
+# older versions reply UNIMPLEMENTED
+SINCE_VERSION = {
+    CheckWatches.type: (3, 5, 0),
+    RemoveWatches.type: (3, 5, 0),
+    MultiRead.type: (3, 6, 0),
+    AddWatch.type: (3, 6, 0),
+}
+
+
+def _split(path):
+    parent, name = path.rsplit('/', 1)
+    return parent or '/', name
+
+
+def _validate_path(path):
+    """Check a path like ZooKeeper's PathUtils.validatePath does"""
+    if not path or path[0] != '/':
+        raise BadArgumentsError()
+    if path == '/':
+        return
+    if path[-1] == '/':
+        raise BadArgumentsError()
+    for name in path[1:].split('/'):
+        if name in ('', '.', '..'):
+            raise BadArgumentsError()
+    for c in path:
+        if (c == u'\x00' or u'\x01' <= c <= u'\x1f' or
+                u'\x7f' <= c <= u'\x9f' or u'\ud800' <= c <= u'\uf8ff' or
+                u'\ufff0' <= c <= u'\uffff'):
+            raise BadArgumentsError()
+
+
+def _millis():
+    return int(time.time() * 1000)
+
+
+class _Node(object):
+    """A znode, with the fields of its stat"""
+    __slots__ = ('data', 'acl', 'children', 'czxid', 'mzxid', 'ctime',
+                 'mtime', 'version', 'cversion', 'aversion', 'owner',
+                 'pzxid')
+
+    def __init__(self, data, acl, zxid, owner=0):
+        self.data = data
+        self.acl = acl
+        self.children = set()
+        self.czxid = self.mzxid = self.pzxid = zxid
+        self.ctime = self.mtime = _millis()
+        self.version = self.cversion = self.aversion = 0
+        self.owner = owner
+
+    def stat(self):
+        return stat_struct.pack(
+            self.czxid, self.mzxid, self.ctime, self.mtime, self.version,
+            self.cversion, self.aversion, self.owner,
+            len(self.data) if self.data is not None else 0,
+            len(self.children), self.pzxid)
+
+
+class _Session(object):
+    __slots__ = ('id', 'passwd', 'timeout', 'ephemerals', 'connection',
+                 'expires')
+
+    def __init__(self, session_id, passwd, timeout):
+        self.id = session_id
+        self.passwd = passwd
+        # In milliseconds, as negotiated
+        self.timeout = timeout
+        self.ephemerals = set()
+        self.connection = None
+        self.expires = None
+
+    def touch(self):
+        self.expires = time.time() + self.timeout / 1000.0
+
+
+class _Txn(object):
+    """The changes of a write request, which can be rolled back until
+    they're committed, and the watch events they trigger"""
+    def __init__(self, zxid):
+        self.zxid = zxid
+        self.undo = []
+        self.events = []
+
+    def rollback(self):
+        while self.undo:
+            self.undo.pop()()
+        del self.events[:]
+
+
+class _Ensemble(object):
+    """The data, sessions and watches shared by the servers of a
+    cluster
+
+    Everything is done holding :attr:`lock`, including sending the
+    replies and watch events, so clients see the events of a change
+    before the replies to the requests that follow it.
+
+    """
+    def __init__(self, tick_time=2000, version=(3, 6, 0)):
+        self.tick_time = tick_time
+        self.version = version
+        self.servers = []
+        self.lock = threading.RLock()
+        self.zxid = 0
+        self.nodes = {}
+        self.sessions = {}
+        # Paths to the connections watching them
+        self.data_watches = defaultdict(set)
+        self.child_watches = defaultdict(set)
+        self.persistent_watches = defaultdict(set)
+        self.recursive_watches = defaultdict(set)
+        self._reaper = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.zxid = 0
+            root_acl = [ACL(Permissions.ALL, Id('world', 'anyone'))]
+            self.nodes = {'/': _Node(b'', root_acl, 0)}
+            self.sessions = {}
+            for watches in self._watch_tables():
+                watches.clear()
+
+    def _watch_tables(self):
+        return (self.data_watches, self.child_watches,
+                self.persistent_watches, self.recursive_watches)
+
+    def has_quorum(self):
+        running = len([s for s in self.servers if s.running])
+        return running * 2 > len(self.servers)
+
+    def connections(self):
+        return [conn for server in self.servers
+                for conn in list(server.connections)]
+
+    def start_reaper(self):
+        with self.lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap)
+                self._reaper.daemon = True
+                self._reaper.start()
+
+    def join_reaper(self):
+        """Wait for the reaper to end once no server is running"""
+        with self.lock:
+            if any(s.running for s in self.servers):
+                return
+            reaper = self._reaper
+        if reaper is not None:
+            reaper.join()
+
+    def _reap(self):
+        """Expire the sessions the server didn't hear from in time"""
+        interval = min(self.tick_time / 1000.0, 0.1)
+        while True:
+            time.sleep(interval)
+            with self.lock:
+                if not any(s.running for s in self.servers):
+                    self._reaper = None
+                    return
+                if not self.has_quorum():
+                    # Nothing expires without a leader to expire it
+                    for session in self.sessions.values():
+                        session.touch()
+                    continue
+                current = time.time()
+                for session in list(self.sessions.values()):
+                    if session.expires < current:
+                        log.debug('Expiring session 0x%x', session.id)
+                        self.close_session(session)
+
+    def negotiate_timeout(self, timeout):
+        return max(2 * self.tick_time, min(timeout, 20 * self.tick_time))
+
+    def new_session(self, timeout):
+        session_id = random.getrandbits(63) or 1
+        passwd = bytes(bytearray(random.getrandbits(8) for i in range(16)))
+        session = _Session(session_id, passwd, timeout)
+        session.touch()
+        self.sessions[session_id] = session
+        self.zxid += 1
+        return session
+
+    def close_session(self, session):
+        """End `session`, deleting its ephemeral nodes"""
+        self.sessions.pop(session.id, None)
+        txn = _Txn(self.zxid + 1)
+        for path in sorted(session.ephemerals, reverse=True):
+            self._remove(txn, path)
+        session.ephemerals.clear()
+        self.commit(txn)
+        if session.connection is not None:
+            session.connection.close()
+            session.connection = None
+
+    def log(self, size):
+        """Take the time ZooKeeper would to write a transaction of
+        `size` bytes to its log, when it's noticeable"""
+        delay = size / float(LOG_BANDWIDTH)
+        if delay >= 0.001:
+            time.sleep(delay)
+
+    def commit(self, txn):
+        self.zxid = txn.zxid
+        self.fire(txn.events)
+
+    def fire(self, events):
+        """Send the watch events to the connections watching them"""
+        for event_type, path in events:
+            targets = set()
+            if event_type in (CREATED_EVENT, CHANGED_EVENT, DELETED_EVENT):
+                targets.update(self.data_watches.pop(path, ()))
+            if event_type in (CHILD_EVENT, DELETED_EVENT):
+                targets.update(self.child_watches.pop(path, ()))
+            targets.update(self.persistent_watches.get(path, ()))
+            if self.recursive_watches and event_type != CHILD_EVENT:
+                parent = path
+                while True:
+                    targets.update(self.recursive_watches.get(parent, ()))
+                    if parent == '/':
+                        break
+                    parent = _split(parent)[0]
+            for conn in targets:
+                conn.send_event(event_type, path)
+
+    def forget(self, conn):
+        """Remove the watches of a connection that's gone"""
+        for watches in self._watch_tables():
+            for path in [p for p, conns in watches.items() if conn in conns]:
+                watches[path].discard(conn)
+                if not watches[path]:
+                    del watches[path]
+
+    # Access control
+
+    def check_acl(self, conn, node, perm):
+        for acl in node.acl:
+            if not acl.perms & perm:
+                continue
+            scheme, id = acl.id.scheme, acl.id.id
+            if scheme == 'world' and id == 'anyone':
+                return
+            if scheme == 'digest' and ('digest', id) in conn.auth_ids:
+                return
+            if scheme == 'ip' and conn.matches_ip(id):
+                return
+        raise NoAuthError()
+
+    def fix_acl(self, conn, acls):
+        """Validate the ACLs of a node, replacing the ``auth`` ones with
+        the ids the connection authenticated with"""
+        if not acls:
+            raise InvalidACLError()
+        fixed = []
+        for acl in acls:
+            scheme = acl.id.scheme
+            if scheme == 'auth':
+                if not conn.auth_ids:
+                    raise InvalidACLError()
+                fixed.extend(ACL(acl.perms, Id(s, i))
+                             for s, i in sorted(conn.auth_ids))
+            elif ((scheme == 'world' and acl.id.id == 'anyone') or
+                    (scheme == 'digest' and ':' in acl.id.id) or
+                    scheme == 'ip'):
+                fixed.append(acl)
+            else:
+                raise InvalidACLError()
+        # Duplicates are removed, like ZooKeeper 3.4 and above do
+        unique = []
+        for acl in fixed:
+            if acl not in unique:
+                unique.append(acl)
+        return unique
+
+    # Reads
+
+    def get_node(self, path):
+        node = self.nodes.get(path)
+        if node is None:
+            raise NoNodeError()
+        return node
+
+    # Writes, recorded in a transaction so they can be rolled back
+
+    def create(self, txn, conn, path, data, acl, flags):
+        if flags & ~(EPHEMERAL | SEQUENCE):
+            # Containers and TTL nodes
+            raise UnimplementedError()
+        _validate_path(path + '1' if flags & SEQUENCE else path)
+        acl = self.fix_acl(conn, acl)
+        if path == '/':
+            raise NodeExistsError()
+        parent_path, name = _split(path)
+        parent = self.get_node(parent_path)
+        self.check_acl(conn, parent, Permissions.CREATE)
+        if flags & SEQUENCE:
+            suffix = '%010d' % parent.cversion
+            path += suffix
+            name += suffix
+        if path in self.nodes:
+            raise NodeExistsError()
+        if parent.owner:
+            raise NoChildrenForEphemeralsError()
+
+        session = conn.session
+        node = _Node(data, acl, txn.zxid,
+                     session.id if flags & EPHEMERAL else 0)
+        pzxid = parent.pzxid
+        self.nodes[path] = node
+        parent.children.add(name)
+        parent.cversion += 1
+        parent.pzxid = txn.zxid
+        if node.owner:
+            session.ephemerals.add(path)
+
+        def undo():
+            del self.nodes[path]
+            parent.children.discard(name)
+            parent.cversion -= 1
+            parent.pzxid = pzxid
+            session.ephemerals.discard(path)
+        txn.undo.append(undo)
+        txn.events.append((CREATED_EVENT, path))
+        txn.events.append((CHILD_EVENT, parent_path))
+        return path
+
+    def delete(self, txn, conn, path, version):
+        if path == '/':
+            raise BadArgumentsError()
+        parent = self.get_node(_split(path)[0])
+        self.check_acl(conn, parent, Permissions.DELETE)
+        node = self.get_node(path)
+        if version != -1 and version != node.version:
+            raise BadVersionError()
+        if node.children:
+            raise NotEmptyError()
+        self._remove(txn, path)
+
+    def _remove(self, txn, path):
+        parent_path, name = _split(path)
+        parent = self.nodes[parent_path]
+        node = self.nodes.pop(path)
+        pzxid = parent.pzxid
+        parent.children.discard(name)
+        parent.cversion += 1
+        parent.pzxid = txn.zxid
+        session = self.sessions.get(node.owner)
+        if session is not None:
+            session.ephemerals.discard(path)
+
+        def undo():
+            self.nodes[path] = node
+            parent.children.add(name)
+            parent.cversion -= 1
+            parent.pzxid = pzxid
+            if session is not None:
+                session.ephemerals.add(path)
+        txn.undo.append(undo)
+        txn.events.append((DELETED_EVENT, path))
+        txn.events.append((CHILD_EVENT, parent_path))
+
+    def set_data(self, txn, conn, path, data, version):
+        node = self.get_node(path)
+        self.check_acl(conn, node, Permissions.WRITE)
+        if version != -1 and version != node.version:
+            raise BadVersionError()
+        saved = node.data, node.version, node.mzxid, node.mtime
+        node.data = data
+        node.version += 1
+        node.mzxid = txn.zxid
+        node.mtime = _millis()
+
+        def undo():
+            node.data, node.version, node.mzxid, node.mtime = saved
+        txn.undo.append(undo)
+        txn.events.append((CHANGED_EVENT, path))
+        return node
+
+    def check(self, conn, path, version):
+        node = self.get_node(path)
+        self.check_acl(conn, node, Permissions.READ)
+        if version != -1 and version != node.version:
+            raise BadVersionError()
+
+    def set_acl(self, txn, conn, path, acl, version):
+        node = self.get_node(path)
+        self.check_acl(conn, node, Permissions.ADMIN)
+        if version != -1 and version != node.aversion:
+            raise BadVersionError()
+        acl = self.fix_acl(conn, acl)
+        saved = node.acl, node.aversion
+        node.acl = acl
+        node.aversion += 1
+
+        def undo():
+            node.acl, node.aversion = saved
+        txn.undo.append(undo)
+        return node
+
+
+def _read_acls(buffer, offset):
+    count = int_struct.unpack_from(buffer, offset)[0]
+    offset += int_struct.size
+    acls = []
+    for i in range(max(count, 0)):
+        acl, offset = read_acl(buffer, offset)
+        acls.append(acl)
+    return acls, offset
+
+
+def _read_int(buffer, offset):
+    return int_struct.unpack_from(buffer, offset)[0], offset + int_struct.size
+
+
+def _read_bool(buffer, offset):
+    return (bool_struct.unpack_from(buffer, offset)[0] == 1,
+            offset + bool_struct.size)
+
+
+def _read_strings(buffer, offset):
+    count, offset = _read_int(buffer, offset)
+    strings = []
+    for i in range(max(count, 0)):
+        string, offset = read_string(buffer, offset)
+        strings.append(string)
+    return strings, offset
+
+
+def _append_children(b, node):
+    b += int_struct.pack(len(node.children))
+    for child in node.children:
+        append_string(b, child)
+
+
+class _ConnectionClosed(Exception):
+    pass
+
+
+class _Connection(object):
+    """A client connection, served by a thread of its own"""
+    def __init__(self, server, sock, address):
+        self.server = server
+        self.ensemble = server.ensemble
+        self.sock = sock
+        self.address = address
+        self.session = None
+        self.read_only = False
+        self.auth_ids = set()
+        self.closed = False
+        self._send_lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+
+    def matches_ip(self, spec):
+        """Whether the client's address matches an ``ip`` ACL id, an
+        address with an optional prefix length"""
+        ip = self.address[0]
+        if '/' not in spec:
+            return ip == spec
+        network, bits = spec.split('/', 1)
+        try:
+            bits = int(bits)
+            ip_parts = [int(p) for p in ip.split('.')]
+            net_parts = [int(p) for p in network.split('.')]
+        except ValueError:
+            return False
+        if len(ip_parts) != 4 or len(net_parts) != 4:
+            return False
+        ip_value = net_value = 0
+        for ip_part, net_part in zip(ip_parts, net_parts):
+            ip_value = ip_value << 8 | ip_part
+            net_value = net_value << 8 | net_part
+        mask = (0xffffffff << (32 - bits)) & 0xffffffff
+        return ip_value & mask == net_value & mask
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.sock.close()
+
+    def _recv(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise _ConnectionClosed()
+            data += chunk
+        return data
+
+    def _send(self, data):
+        with self._send_lock:
+            if self.closed:
+                return
+            try:
+                self.sock.sendall(int_struct.pack(len(data)) + bytes(data))
+            except socket.error:
+                self.close()
+
+    def send_reply(self, xid, zxid, err=0, body=None):
+        b = bytearray(reply_header_struct.pack(xid, zxid, err))
+        if body and not err:
+            b += body
+        self._send(b)
+
+    def send_event(self, event_type, path):
+        b = bytearray(reply_header_struct.pack(WATCH_XID, -1, 0))
+        b += int_int_struct.pack(event_type, SYNC_CONNECTED)
+        append_string(b, path)
+        self._send(b)
+
+    def run(self):
+        try:
+            head = self._recv(int_struct.size)
+            command = bytes(head)
+            if command in self.server.commands:
+                with self.ensemble.lock:
+                    response = self.server.commands[command]()
+                self.sock.sendall(response.encode('utf-8'))
+                return
+            if not self._connect(self._read_frame(head)):
+                return
+            while not self.closed:
+                if not self._handle(self._read_frame()):
+                    break
+        except (_ConnectionClosed, socket.error):
+            pass
+        except Exception:
+            log.exception('Error serving %s:%s', *self.address[:2])
+        finally:
+            with self.ensemble.lock:
+                self.server.connections.discard(self)
+                self.ensemble.forget(self)
+                session = self.session
+                if session is not None and session.connection is self:
+                    session.connection = None
+            self.close()
+
+    def _read_frame(self, head=None):
+        if head is None:
+            head = self._recv(int_struct.size)
+        length = int_struct.unpack(bytes(head))[0]
+        if length < 0 or length > MAX_PACKET_SIZE:
+            log.debug('Packet of %s bytes from %s:%s is too large', length,
+                      *self.address[:2])
+            raise _ConnectionClosed()
+        return bytes(self._recv(length))
+
+    def _connect(self, frame):
+        ensemble = self.ensemble
+        (protocol_version, last_zxid, timeout,
+         session_id) = int_long_int_long_struct.unpack_from(frame, 0)
+        passwd, offset = read_buffer(frame, int_long_int_long_struct.size)
+        try:
+            read_only = _read_bool(frame, offset)[0]
+        except Exception:
+            read_only = False
+
+        with ensemble.lock:
+            if not ensemble.has_quorum():
+                if not read_only:
+                    # Only read-only clients get served without a quorum
+                    return False
+                self.read_only = True
+
+            session = None
+            if session_id:
+                session = ensemble.sessions.get(session_id)
+                if session is not None and session.passwd != passwd:
+                    session = None
+                if session is None:
+                    # Expired, tell the client with a zero timeout
+                    self._send_connect_reply(0, 0, b'\x00' * 16)
+                    return False
+            timeout = ensemble.negotiate_timeout(timeout)
+            if session is None:
+                session = ensemble.new_session(timeout)
+            else:
+                session.timeout = timeout
+                session.touch()
+                if session.connection is not None:
+                    # The session moved to this connection
+                    session.connection.close()
+            session.connection = self
+            self.session = session
+            self._send_connect_reply(timeout, session.id, session.passwd)
+        return True
+
+    def _send_connect_reply(self, timeout, session_id, passwd):
+        b = bytearray(int_int_struct.pack(0, timeout))
+        b += long_struct.pack(session_id)
+        append_buffer(b, passwd)
+        b += bool_struct.pack(1 if self.read_only else 0)
+        self._send(b)
+
+    def _handle(self, frame):
+        """Handle a request, returns False once the connection is to be
+        closed"""
+        ensemble = self.ensemble
+        xid, request_type = int_int_struct.unpack_from(frame, 0)
+        offset = int_int_struct.size
+        with ensemble.lock:
+            session = self.session
+            if session.connection is not self:
+                # The session moved to another connection or expired
+                return False
+            session.touch()
+
+            if request_type == Ping.type:
+                self.send_reply(PING_XID, ensemble.zxid)
+            elif request_type == Close.type:
+                # Reply before the connection gets closed
+                session.connection = None
+                ensemble.close_session(session)
+                self.send_reply(xid, ensemble.zxid)
+                return False
+            elif request_type == Auth.type:
+                return self._auth(frame, offset)
+            elif request_type in (SetWatches.type, SetWatches2.type):
+                self._set_watches(request_type, frame, offset)
+            elif self.read_only and request_type in WRITE_TYPES:
+                self.send_reply(xid, ensemble.zxid,
+                                NotReadOnlyCallError.code)
+            else:
+                handler = self.handlers.get(request_type)
+                txn = _Txn(ensemble.zxid + 1)
+                try:
+                    if (handler is None or ensemble.version <
+                            SINCE_VERSION.get(request_type, ())):
+                        raise UnimplementedError()
+                    body = handler(self, txn, frame, offset)
+                except ZookeeperError as exc:
+                    txn.rollback()
+                    self.send_reply(xid, ensemble.zxid, exc.code)
+                else:
+                    if txn.undo:
+                        ensemble.log(len(frame))
+                        ensemble.commit(txn)
+                    self.send_reply(xid, ensemble.zxid, 0, body)
+        return True
+
+    def _auth(self, frame, offset):
+        auth_type, offset = _read_int(frame, offset)
+        scheme, offset = read_string(frame, offset)
+        credential, offset = read_buffer(frame, offset)
+        if scheme == 'digest' and credential and b':' in credential:
+            user, password = credential.decode('utf-8').split(':', 1)
+            self.auth_ids.add(
+                ('digest', make_digest_acl_credential(user, password)))
+            self.send_reply(AUTH_XID, self.ensemble.zxid)
+            return True
+        # Like ZooKeeper, the connection is closed after a failed auth
+        self.send_reply(AUTH_XID, self.ensemble.zxid, AuthFailedError.code)
+        return False
+
+    def _set_watches(self, request_type, frame, offset):
+        ensemble = self.ensemble
+        relative_zxid = long_struct.unpack_from(frame, offset)[0]
+        offset += long_struct.size
+        data, offset = _read_strings(frame, offset)
+        exist, offset = _read_strings(frame, offset)
+        child, offset = _read_strings(frame, offset)
+        persistent = recursive = ()
+        if request_type == SetWatches2.type:
+            persistent, offset = _read_strings(frame, offset)
+            recursive, offset = _read_strings(frame, offset)
+
+        events = []
+        for path in data:
+            node = ensemble.nodes.get(path)
+            if node is None:
+                events.append((DELETED_EVENT, path))
+            elif node.mzxid > relative_zxid:
+                events.append((CHANGED_EVENT, path))
+            else:
+                ensemble.data_watches[path].add(self)
+        for path in exist:
+            if path in ensemble.nodes:
+                events.append((CREATED_EVENT, path))
+            else:
+                ensemble.data_watches[path].add(self)
+        for path in child:
+            node = ensemble.nodes.get(path)
+            if node is None:
+                events.append((DELETED_EVENT, path))
+            elif node.pzxid > relative_zxid:
+                events.append((CHILD_EVENT, path))
+            else:
+                ensemble.child_watches[path].add(self)
+        for path in persistent:
+            ensemble.persistent_watches[path].add(self)
+        for path in recursive:
+            ensemble.recursive_watches[path].add(self)
+
+        self.send_reply(SET_WATCHES_XID, ensemble.zxid)
+        for event_type, path in events:
+            self.send_event(event_type, path)
+
+    # Request handlers, returning the body of the reply or raising the
+    # ZookeeperError to reply with
+
+    def _create(self, txn, frame, offset):
+        path, offset = read_string(frame, offset)
+        data, offset = read_buffer(frame, offset)
+        acls, offset = _read_acls(frame, offset)
+        flags, offset = _read_int(frame, offset)
+        b = bytearray()
+        append_string(b, self.ensemble.create(txn, self, path, data, acls,
+                                              flags))
+        return b
+
+    def _delete(self, txn, frame, offset):
+        path, offset = read_string(frame, offset)
+        version, offset = _read_int(frame, offset)
+        self.ensemble.delete(txn, self, path, version)
+
+    def _exists(self, txn, frame, offset):
+        path, offset = read_string(frame, offset)
+        watch, offset = _read_bool(frame, offset)
+        ensemble = self.ensemble
+        if watch:
+            # Set whether the node exists or not
+            ensemble.data_watches[path].add(self)
+        return ensemble.get_node(path).stat()
+
+    def _get_data(self, txn, frame, offset):
+        path, offset = read_string(frame, offset)
+        watch, offset = _read_bool(frame, offset)
+        return self._read_data(path, watch)
+
+    def _read_data(self, path, watch=False):
+        ensemble = self.ensemble
+        node = ensemble.get_node(path)
+        ensemble.check_acl(self, node, Permissions.READ)
+        if watch:
+            ensemble.data_watches[path].add(self)
+        b = bytearray()
+        append_buffer(b, node.data)
+        b += node.stat()
+        return b
+
+    def _set_data(self, txn, frame, offset):
+        path, offset = read_string(frame, offset)
+        data, offset = read_buffer(frame, offset)
+        version, offset = _read_int(frame, offset)
+        return self.ensemble.set_data(txn, self, path, data, version).stat()
+
+    def _get_acl(self, txn, frame, offset):
+        path, offset = read_string(frame, offset)
+        node = self.ensemble.get_node(path)
+        b = bytearray()
+        append_acls(b, node.acl)
+        b += node.stat()
+        return b
+
+    def _set_acl(self, txn, frame, offset):
+        path, offset = read_string(frame, offset)
+        acls, offset = _read_acls(frame, offset)
+        version, offset = _read_int(frame, offset)
+        return self.ensemble.set_acl(txn, self, path, acls, version).stat()
+
+    def _get_children(self, txn, frame, offset, with_stat=False):
+        path, offset = read_string(frame, offset)
+        watch, offset = _read_bool(frame, offset)
+        return self._read_children(path, watch, with_stat)
+
+    def _get_children2(self, txn, frame, offset):
+        return self._get_children(txn, frame, offset, with_stat=True)
+
+    def _read_children(self, path, watch=False, with_stat=False):
+        ensemble = self.ensemble
+        node = ensemble.get_node(path)
+        ensemble.check_acl(self, node, Permissions.READ)
+        if watch:
+            ensemble.child_watches[path].add(self)
+        b = bytearray()
+        _append_children(b, node)
+        if with_stat:
+            b += node.stat()
+        return b
+
+    def _sync(self, txn, frame, offset):
+        path, offset = read_string(frame, offset)
+        b = bytearray()
+        append_string(b, path)
+        return b
+
+    def _multi(self, txn, frame, offset):
+        ensemble = self.ensemble
+        ops = []
+        while True:
+            op_type, done, err = multiheader_struct.unpack_from(frame, offset)
+            offset += multiheader_struct.size
+            if done:
+                break
+            path, offset = read_string(frame, offset)
+            if op_type == Create.type:
+                data, offset = read_buffer(frame, offset)
+                acls, offset = _read_acls(frame, offset)
+                flags, offset = _read_int(frame, offset)
+                ops.append((op_type, (path, data, acls, flags)))
+            elif op_type == SetData.type:
+                data, offset = read_buffer(frame, offset)
+                version, offset = _read_int(frame, offset)
+                ops.append((op_type, (path, data, version)))
+            elif op_type in (Delete.type, CheckVersion.type):
+                version, offset = _read_int(frame, offset)
+                ops.append((op_type, (path, version)))
+            else:
+                raise MarshallingError()
+
+        results = []
+        failed = None
+        for index, (op_type, args) in enumerate(ops):
+            try:
+                if op_type == Create.type:
+                    result = ensemble.create(txn, self, *args)
+                elif op_type == SetData.type:
+                    result = ensemble.set_data(txn, self, *args).stat()
+                elif op_type == Delete.type:
+                    result = ensemble.delete(txn, self, *args)
+                else:
+                    result = ensemble.check(self, *args)
+            except ZookeeperError as exc:
+                failed = index, exc.code
+                break
+            results.append(result)
+
+        b = bytearray()
+        if failed is not None:
+            txn.rollback()
+            failed_index, code = failed
+            for index in range(len(ops)):
+                if index < failed_index:
+                    err = RolledBackError.code
+                elif index == failed_index:
+                    err = code
+                else:
+                    err = RuntimeInconsistency.code
+                b += multiheader_struct.pack(-1, False, err)
+                b += int_struct.pack(err)
+        else:
+            for (op_type, args), result in zip(ops, results):
+                b += multiheader_struct.pack(op_type, False, 0)
+                if op_type == Create.type:
+                    append_string(b, result)
+                elif op_type == SetData.type:
+                    b += result
+        b += multiheader_struct.pack(-1, True, -1)
+        return b
+
+    def _multi_read(self, txn, frame, offset):
+        b = bytearray()
+        while True:
+            op_type, done, err = multiheader_struct.unpack_from(frame, offset)
+            offset += multiheader_struct.size
+            if done:
+                break
+            path, offset = read_string(frame, offset)
+            # The watch flag, multiRead doesn't set watches
+            offset += bool_struct.size
+            try:
+                if op_type == GetData.type:
+                    result = self._read_data(path)
+                elif op_type == GetChildren.type:
+                    result = self._read_children(path)
+                else:
+                    raise MarshallingError()
+            except ZookeeperError as exc:
+                b += multiheader_struct.pack(-1, False, exc.code)
+                b += int_struct.pack(exc.code)
+            else:
+                b += multiheader_struct.pack(op_type, False, 0)
+                b += result
+        b += multiheader_struct.pack(-1, True, -1)
+        return b
+
+    def _watching(self, frame, offset):
+        path, offset = read_string(frame, offset)
+        watcher_type, offset = _read_int(frame, offset)
+        ensemble = self.ensemble
+        tables = {
+            WatcherType.CHILDREN: [ensemble.child_watches],
+            WatcherType.DATA: [ensemble.data_watches],
+            WatcherType.ANY: [ensemble.child_watches,
+                              ensemble.data_watches,
+                              ensemble.persistent_watches,
+                              ensemble.recursive_watches],
+            WatcherType.PERSISTENT: [ensemble.persistent_watches],
+            WatcherType.PERSISTENT_RECURSIVE: [ensemble.recursive_watches],
+        }.get(watcher_type)
+        if tables is None:
+            raise BadArgumentsError()
+        tables = [t for t in tables if self in t.get(path, ())]
+        if not tables:
+            raise NoWatcherError()
+        return path, tables
+
+    def _check_watches(self, txn, frame, offset):
+        self._watching(frame, offset)
+
+    def _remove_watches(self, txn, frame, offset):
+        path, tables = self._watching(frame, offset)
+        for watches in tables:
+            watches[path].discard(self)
+            if not watches[path]:
+                del watches[path]
+
+    def _add_watch(self, txn, frame, offset):
+        path, offset = read_string(frame, offset)
+        mode, offset = _read_int(frame, offset)
+        ensemble = self.ensemble
+        if mode == AddWatchMode.PERSISTENT:
+            ensemble.persistent_watches[path].add(self)
+        elif mode == AddWatchMode.PERSISTENT_RECURSIVE:
+            ensemble.recursive_watches[path].add(self)
+        else:
+            raise BadArgumentsError()
+
+    handlers = {
+        Create.type: _create,
+        Delete.type: _delete,
+        Exists.type: _exists,
+        GetData.type: _get_data,
+        SetData.type: _set_data,
+        GetACL.type: _get_acl,
+        SetACL.type: _set_acl,
+        GetChildren.type: _get_children,
+        Sync.type: _sync,
+        GetChildren2.type: _get_children2,
+        Transaction.type: _multi,
+        MultiRead.type: _multi_read,
+        CheckWatches.type: _check_watches,
+        RemoveWatches.type: _remove_watches,
+        AddWatch.type: _add_watch,
+    }
+
+
+class StandInZooKeeper(object):
+    """A ZooKeeper server stand-in, running in the current process
+
+    It has the same methods and properties as
+    :class:`~kazoo.testing.common.ManagedZooKeeper`, so it can be used
+    in its place.
+
+    :param port: The port to listen on, 0 to pick a free one when first
+                 run and keep it afterwards.
+    :param host: The address to listen on.
+    :param tick_time: ZooKeeper's tickTime in milliseconds, session
+                      timeouts are negotiated to between 2 and 20 of
+                      them.
+    :param version: The ZooKeeper version reported by the ``envi``,
+                    ``srvr`` and ``stat`` commands. The requests added
+                    in later versions, like multiRead in 3.6, get an
+                    UNIMPLEMENTED error.
+
+    Example::
+
+        server = StandInZooKeeper()
+        server.run()
+        zk = KazooClient(server.address)
+
+    """
+    def __init__(self, port=0, host='127.0.0.1', tick_time=2000,
+                 version=(3, 6, 0), _ensemble=None):
+        self.host = host
+        self._port = port
+        if _ensemble is None:
+            _ensemble = _Ensemble(tick_time, version)
+            _ensemble.servers.append(self)
+        self.ensemble = _ensemble
+        self.connections = set()
+        self._listener = None
+        self._acceptor = None
+        self._running = False
+        self.commands = {
+            b'ruok': lambda: 'imok',
+            b'isro': lambda: 'rw' if self.ensemble.has_quorum() else 'ro',
+            b'envi': self._envi,
+            b'srvr': self._srvr,
+            b'stat': self._srvr,
+        }
+
+    @property
+    def address(self):
+        """Get the address of the server."""
+        return "%s:%s" % (self.host, self.client_port)
+
+    @property
+    def client_port(self):
+        return self._port
+
+    @property
+    def running(self):
+        return self._running
+
+    def run(self):
+        """Start serving clients"""
+        if self.running:
+            return
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self.host, self._port))
+        listener.listen(128)
+        self._port = listener.getsockname()[1]
+        self._listener = listener
+        self._running = True
+        self._acceptor = threading.Thread(target=self._accept,
+                                          args=(listener,))
+        self._acceptor.daemon = True
+        self._acceptor.start()
+        self.ensemble.start_reaper()
+        log.info("Started ZooKeeper stand-in on %s", self.address)
+
+    def _accept(self, listener):
+        while True:
+            try:
+                sock, address = listener.accept()
+            except (socket.error, OSError):
+                # Closed by stop()
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = _Connection(self, sock, address)
+            with self.ensemble.lock:
+                if not self.running:
+                    sock.close()
+                    return
+                self.connections.add(conn)
+            conn.thread.start()
+
+    def stop(self):
+        """Stop serving clients, dropping their connections. The data
+        and sessions are kept.
+
+        Returns once the threads serving them have ended, so none are
+        left running when the interpreter exits.
+
+        """
+        if not self.running:
+            return
+        ensemble = self.ensemble
+        with ensemble.lock:
+            self._running = False
+            listener, self._listener = self._listener, None
+            acceptor, self._acceptor = self._acceptor, None
+            own = list(self.connections)
+            conns = list(own)
+            if not ensemble.has_quorum():
+                # The rest of the ensemble only serves read-only clients
+                conns.extend(conn for conn in ensemble.connections()
+                             if not conn.read_only)
+        try:
+            listener.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        listener.close()
+        for conn in conns:
+            conn.close()
+        # The acceptor has started the threads of all the connections it
+        # added once it has ended
+        acceptor.join()
+        for conn in own:
+            conn.thread.join()
+        ensemble.join_reaper()
+
+    def reset(self):
+        """Stop the server, clearing the data and sessions."""
+        self.stop()
+        self.ensemble.reset()
+
+    def destroy(self):
+        """Stop the server and clear its data."""
+        self.reset()
+
+    def _version(self):
+        return '%s-standin' % '.'.join(str(v) for v in self.ensemble.version)
+
+    def _envi(self):
+        return ('Environment:\n'
+                'zookeeper.version=%s, built on 01/01/1970 00:00 GMT\n'
+                'host.name=%s\n' % (self._version(), self.host))
+
+    def _srvr(self):
+        ensemble = self.ensemble
+        if len(ensemble.servers) == 1:
+            mode = 'standalone'
+        elif ensemble.servers[0] is self:
+            mode = 'leader'
+        else:
+            mode = 'follower'
+        return ('Zookeeper version: %s, built on 01/01/1970 00:00 GMT\n'
+                'Latency min/avg/max: 0/0/0\n'
+                'Received: 0\n'
+                'Sent: 0\n'
+                'Connections: %s\n'
+                'Outstanding: 0\n'
+                'Zxid: 0x%x\n'
+                'Mode: %s\n'
+                'Node count: %s\n' % (
+                    self._version(), len(self.connections), ensemble.zxid,
+                    mode, len(ensemble.nodes)))
+
+
+class StandInCluster(object):
+    """Several :class:`StandInZooKeeper` sharing their data and
+    sessions, like an ensemble
+
+    It has the same methods as
+    :class:`~kazoo.testing.common.ZookeeperCluster`, so it can be used
+    in its place. With less than a majority of the servers running, the
+    others only accept read-only clients.
+
+    """
+    def __init__(self, size=3, port_offset=20000, tick_time=2000,
+                 version=(3, 6, 0)):
+        self._ensemble = _Ensemble(tick_time, version)
+        self._servers = []
+        for i in range(size):
+            port = port_offset + i * 10 if port_offset else 0
+            server = StandInZooKeeper(port, _ensemble=self._ensemble)
+            self._servers.append(server)
+            self._ensemble.servers.append(server)
+
+    def __getitem__(self, k):
+        return self._servers[k]
+
+    def __iter__(self):
+        return iter(self._servers)
+
+    def start(self):
+        for server in self:
+            server.run()
+
+    def stop(self):
+        for server in self:
+            server.stop()
+
+    def terminate(self):
+        for server in self:
+            server.destroy()
+
+    def reset(self):
+        for server in self:
+            server.reset()
@@ -0,0 +1,186 @@
+import threading
+import unittest
+import uuid
+
+from nose import SkipTest
+from nose.tools import eq_
+from nose.tools import raises
+
+from kazoo.client import KazooClient
+from kazoo.exceptions import NoNodeError
+from kazoo.protocol import states as kazoo_states
+from kazoo.testing import KazooTestCase
+from kazoo.tests import test_client
+
+try:
+    import asyncio
+    from kazoo.handlers import asyncio as asyncio_handler
+    ASYNCIO_HANDLER_AVAILABLE = True
+except ImportError:
+    ASYNCIO_HANDLER_AVAILABLE = False
+
+
+class TestAsyncioHandler(unittest.TestCase):
+    def setUp(self):
+        if not ASYNCIO_HANDLER_AVAILABLE:
+            raise SkipTest('asyncio handler not available.')
+        self.loop = asyncio.new_event_loop()
+        self.handler = asyncio_handler.AsyncioHandler(self.loop)
+        self.handler.start()
+
+    def tearDown(self):
+        self.handler.stop()
+        self.loop.close()
+
+    def test_results_share_one_wakeup(self):
+        calls = []
+        call_soon_threadsafe = self.loop.call_soon_threadsafe
+
+        def counting(*args):
+            calls.append(args)
+            return call_soon_threadsafe(*args)
+        self.loop.call_soon_threadsafe = counting
+
+        results = [self.handler.async_result() for i in range(10)]
+        gathered = asyncio.gather(*results, loop=self.loop)
+        # let the tasks start awaiting
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        for i, r in enumerate(results):
+            r.set(i)
+        eq_(self.loop.run_until_complete(gathered), list(range(10)))
+        eq_(len(calls), 1)
+
+    def test_callbacks_in_worker_thread(self):
+        captures = []
+
+        def cb():
+            captures.append(threading.current_thread())
+
+        self.handler.dispatch_callback(kazoo_states.Callback('watch', cb, []))
+        self.handler.stop()
+        eq_(len(captures), 1)
+        assert captures[0] is not threading.current_thread()
+
+    def test_await_result(self):
+        r = self.handler.async_result()
+        self.loop.call_soon(r.set, 'fred')
+        eq_(self.loop.run_until_complete(r), 'fred')
+
+        # awaiting a result that's already set
+        eq_(self.loop.run_until_complete(r), 'fred')
+
+    def test_await_result_from_thread(self):
+        r = self.handler.async_result()
+        t = threading.Thread(target=r.set, args=(1,))
+        self.loop.call_soon(t.start)
+        eq_(self.loop.run_until_complete(r), 1)
+        t.join()
+
+    def test_await_exception(self):
+        r = self.handler.async_result()
+        self.loop.call_soon(r.set_exception, IOError("Failed"))
+
+        @raises(IOError)
+        def check_exc():
+            self.loop.run_until_complete(r)
+        check_exc()
+        self.assertFalse(r.successful())
+
+    def test_await_cancelled(self):
+        r = self.handler.async_result()
+        waiter = asyncio.wait_for(r, 0.01, loop=self.loop)
+
+        @raises(asyncio.TimeoutError)
+        def check_timeout():
+            self.loop.run_until_complete(waiter)
+        check_timeout()
+
+        # setting the value later doesn't trip over the cancelled future
+        r.set(1)
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+        eq_(r.get(), 1)
+
+    def test_nothing_allocated_until_awaited(self):
+        r = self.handler.async_result()
+        assert not hasattr(r, '__dict__')
+        r.set(1)
+        eq_(r._event, None)
+        eq_(r._futures, None)
+
+    def test_await_event(self):
+        ev = self.handler.event_object()
+        t = threading.Thread(target=ev.set)
+        self.loop.call_soon(t.start)
+        eq_(self.loop.run_until_complete(ev), True)
+        t.join()
+        assert ev.is_set()
+        eq_(self.loop.run_until_complete(ev), True)
+
+    def test_blocking_get(self):
+        r = self.handler.async_result()
+        t = threading.Thread(target=r.set, args=(2,))
+        t.start()
+        eq_(r.get(timeout=5), 2)
+        t.join()
+
+    @raises(asyncio_handler.KazooTimeoutError if ASYNCIO_HANDLER_AVAILABLE
+            else Exception)
+    def test_get_with_no_block(self):
+        self.handler.async_result().get(block=False)
+
+
+class TestAsyncioAwait(KazooTestCase):
+    def setUp(self):
+        if not ASYNCIO_HANDLER_AVAILABLE:
+            raise SkipTest('asyncio handler not available.')
+        self.loop = asyncio.new_event_loop()
+        super(TestAsyncioAwait, self).setUp()
+
+    def tearDown(self):
+        super(TestAsyncioAwait, self).tearDown()
+        self.loop.close()
+
+    def test_await_many(self):
+        client = self._get_client(
+            handler=asyncio_handler.AsyncioHandler(self.loop))
+        self.loop.run_until_complete(
+            asyncio.wait_for(client.start_async(), 15, loop=self.loop))
+        path = "/" + uuid.uuid4().hex
+        client.create(path)
+        creates = [client.create_async('%s/%s' % (path, i),
+                                       str(i).encode('ascii'))
+                   for i in range(200)]
+        self.loop.run_until_complete(
+            asyncio.gather(*creates, loop=self.loop))
+        gets = [client.get_async('%s/%s' % (path, i))
+                for i in range(200)]
+        results = self.loop.run_until_complete(
+            asyncio.gather(*gets, loop=self.loop))
+        eq_([data for data, stat in results],
+            [str(i).encode('ascii') for i in range(200)])
+
+        @raises(NoNodeError)
+        def check_missing():
+            self.loop.run_until_complete(
+                client.get_async(path + '/missing'))
+        check_missing()
+
+
+class TestAsyncioClient(test_client.TestClient):
+    def setUp(self):
+        if not ASYNCIO_HANDLER_AVAILABLE:
+            raise SkipTest('asyncio handler not available.')
+        # the blocking API doesn't need the loop to be running
+        self.loop = asyncio.new_event_loop()
+        super(TestAsyncioClient, self).setUp()
+
+    def tearDown(self):
+        super(TestAsyncioClient, self).tearDown()
+        self.loop.close()
+
+    def _makeOne(self, *args):
+        return asyncio_handler.AsyncioHandler(self.loop)
+
+    def _get_client(self, **kwargs):
+        kwargs["handler"] = self._makeOne()
+        return KazooClient(self.hosts, **kwargs)
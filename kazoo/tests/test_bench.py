@@ -0,0 +1,45 @@
+import json
+import unittest
+
+from mock import patch
+from nose.tools import eq_
+from six import StringIO
+
+
+class TestBenchmarks(unittest.TestCase):
+    """Runs each benchmark once on tiny inputs, so they don't rot"""
+    def _run(self, module, *args):
+        main = __import__('kazoo.bench.' + module, fromlist=['main']).main
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            main(list(args))
+        output = stdout.getvalue()
+        assert output
+        return output
+
+    def test_load(self):
+        output = self._run('load', '--ops', '5', '--nodes', '2',
+                           '--mode', 'sync,async,transaction',
+                           '--depth', '2', '--batch', '2')
+        runs = json.loads(output)['runs']
+        eq_([run['mode'] for run in runs], ['sync', 'async', 'transaction'])
+
+    def test_serialization(self):
+        self._run('serialization', '--min-time', '0')
+
+    def test_reads(self):
+        self._run('reads', '1')
+
+    def test_writes(self):
+        self._run('writes', '1')
+
+    def test_results(self):
+        self._run('results', '10')
+
+    def test_stats(self):
+        self._run('stats', '10')
+
+    def test_paths(self):
+        self._run('paths', '10')
+
+    def test_connect(self):
+        self._run('connect', '0.05', '0.01')
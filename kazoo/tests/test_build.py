@@ -8,9 +8,9 @@ from kazoo.testing import KazooTestCase
 class TestBuildEnvironment(KazooTestCase):
 
     def setUp(self):
-        KazooTestCase.setUp(self)
         if not os.environ.get('TRAVIS'):
             raise SkipTest('Only run build config tests on Travis.')
+        KazooTestCase.setUp(self)
 
     def test_gevent_version(self):
         try:
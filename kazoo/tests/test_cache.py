@@ -0,0 +1,177 @@
+import uuid
+
+from nose.tools import eq_
+
+from kazoo.protocol.states import KazooState
+from kazoo.recipe.cache import TreeCache, TreeEvent
+from kazoo.testing import KazooTestCase
+from kazoo.tests.util import wait
+
+
+class TestTreeCache(KazooTestCase):
+    recursive_watch = False
+
+    def setUp(self):
+        super(TestTreeCache, self).setUp()
+        self.path = "/" + uuid.uuid4().hex
+        self.events = []
+        self.caches = []
+
+    def tearDown(self):
+        for cache in self.caches:
+            cache.close()
+        super(TestTreeCache, self).tearDown()
+
+    def _makeOne(self, path=None):
+        cache = TreeCache(self.client, path or self.path,
+                          recursive_watch=self.recursive_watch)
+        cache.listen(self.events.append)
+        self.caches.append(cache)
+        cache.start()
+        cache.initialized.wait(10)
+        assert cache.initialized.is_set()
+        return cache
+
+    def _wait_data(self, cache, path, data):
+        wait(lambda: cache.get(path) is not None and
+             cache.get(path).data == data)
+
+    def _event_paths(self, event_type):
+        return [event.node.path for event in list(self.events)
+                if event.event_type == event_type]
+
+    def test_initial_load(self):
+        self.client.create(self.path, b'root')
+        self.client.create(self.path + '/a/b', b'b', makepath=True)
+        self.client.create(self.path + '/c', b'c')
+        cache = self._makeOne()
+
+        eq_(sorted(cache.snapshot()), [
+            self.path, self.path + '/a', self.path + '/a/b',
+            self.path + '/c'])
+        eq_(cache.get(self.path).data, b'root')
+        eq_(cache.get(self.path + '/a/b').data, b'b')
+        eq_(cache.get(self.path + '/a/b').stat.version, 0)
+        eq_(cache.get_children(self.path), frozenset(['a', 'c']))
+        eq_(cache.get_children(self.path + '/a/b'), frozenset())
+        eq_(cache.get(self.path + '/d'), None)
+        eq_(cache.get_children(self.path + '/d'), None)
+        eq_(sorted(self._event_paths(TreeEvent.NODE_ADDED)),
+            sorted(cache.snapshot()))
+        eq_(self.events[-1], TreeEvent(TreeEvent.INITIALIZED, None))
+
+    def test_changes(self):
+        self.client.create(self.path + '/a', b'a', makepath=True)
+        cache = self._makeOne()
+
+        self.client.create(self.path + '/a/b/c', b'c', makepath=True)
+        self._wait_data(cache, self.path + '/a/b/c', b'c')
+        eq_(cache.get_children(self.path + '/a'), frozenset(['b']))
+
+        self.client.set(self.path + '/a', b'new')
+        self._wait_data(cache, self.path + '/a', b'new')
+        eq_(cache.get(self.path + '/a').stat.version, 1)
+        eq_(self._event_paths(TreeEvent.NODE_UPDATED), [self.path + '/a'])
+
+        self.client.delete(self.path + '/a', recursive=True)
+        wait(lambda: cache.get(self.path + '/a') is None)
+        eq_(cache.get_children(self.path), frozenset())
+        eq_(sorted(cache.snapshot()), [self.path])
+        eq_(sorted(self._event_paths(TreeEvent.NODE_REMOVED)), [
+            self.path + '/a', self.path + '/a/b', self.path + '/a/b/c'])
+
+    def test_root_created_later(self):
+        cache = self._makeOne()
+        eq_(cache.snapshot(), {})
+
+        self.client.create(self.path + '/a', b'a', makepath=True)
+        self._wait_data(cache, self.path + '/a', b'a')
+
+        self.client.delete(self.path, recursive=True)
+        wait(lambda: not cache.snapshot())
+
+        self.client.create(self.path, b'again')
+        self._wait_data(cache, self.path, b'again')
+
+    def test_reconnect(self):
+        self.client.create(self.path + '/a', b'a', makepath=True)
+        cache = self._makeOne()
+
+        other = self._get_client()
+        other.start()
+
+        def change_while_disconnected(state):
+            if state == KazooState.SUSPENDED:
+                other.set(self.path + '/a', b'missed')
+                other.create(self.path + '/b', b'b')
+                return True
+        self.client.add_listener(change_while_disconnected)
+        self.lose_connection(self.client.handler.event_object)
+
+        self._wait_data(cache, self.path + '/a', b'missed')
+        self._wait_data(cache, self.path + '/b', b'b')
+
+    def test_session_expired(self):
+        self.client.create(self.path + '/a', b'a', makepath=True)
+        cache = self._makeOne()
+
+        self.expire_session(self.client.handler.event_object)
+        self.client.set(self.path + '/a', b'after')
+        self._wait_data(cache, self.path + '/a', b'after')
+
+        self.client.create(self.path + '/b', b'b')
+        self._wait_data(cache, self.path + '/b', b'b')
+
+    def test_memory_usage(self):
+        self.client.create(self.path + '/a', b'x' * 1000, makepath=True)
+        cache = self._makeOne()
+
+        usage = cache.memory_usage()
+        eq_(sorted(usage), sorted(cache.snapshot()))
+        assert usage[self.path + '/a'] > 1000
+        assert usage[self.path] < 1000
+
+    def test_snapshot_unaffected(self):
+        self.client.create(self.path, b'')
+        cache = self._makeOne()
+        snapshot = cache.snapshot()
+
+        self.client.create(self.path + '/a', b'a')
+        self._wait_data(cache, self.path + '/a', b'a')
+        eq_(list(snapshot), [self.path])
+
+    def test_close(self):
+        self.client.create(self.path, b'')
+        cache = self._makeOne()
+        cache.close()
+        eq_(cache.snapshot(), {})
+
+        self.client.create(self.path + '/a', b'a')
+        self.client.sync(self.path)
+        eq_(cache.snapshot(), {})
+        eq_(self._event_paths(TreeEvent.NODE_ADDED), [self.path])
+
+    def test_listener_error(self):
+        self.client.create(self.path, b'')
+
+        def broken(event):
+            raise ValueError(event)
+        cache = TreeCache(self.client, self.path,
+                          recursive_watch=self.recursive_watch)
+        cache.listen(broken)
+        cache.listen(self.events.append)
+        self.caches.append(cache)
+        cache.start()
+        cache.initialized.wait(10)
+        eq_(self._event_paths(TreeEvent.NODE_ADDED), [self.path])
+
+        cache.unlisten(broken)
+        eq_(cache._listeners, [self.events.append])
+
+
+class TestTreeCacheDetected(TestTreeCache):
+    recursive_watch = None
+
+    def test_mode_detected(self):
+        cache = self._makeOne()
+        eq_(cache._recursive, self.client.server_version() >= (3, 6))
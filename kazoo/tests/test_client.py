@@ -23,12 +23,15 @@ from kazoo.exceptions import (
     NoAuthError,
     NoNodeError,
     NodeExistsError,
+    NoWatcherError,
     SessionExpiredError,
     KazooException,
+    TooManyRequestsError,
 )
 from kazoo.protocol.connection import _CONNECTION_DROP
 from kazoo.protocol.states import KeeperState, KazooState
-from kazoo.tests.util import TRAVIS_ZK_VERSION
+from kazoo.testing.server import StandInCluster
+from kazoo.tests.util import TRAVIS_ZK_VERSION, wait
 
 
 if sys.version_info > (3, ):  # pragma: nocover
@@ -279,6 +282,45 @@ class TestConnection(KazooTestCase):
         cv.wait(3)
         assert cv.is_set()
 
+    def test_watches_kept_across_reconnect(self):
+        from kazoo.protocol.states import EventType
+        client = self.client
+        client.create('/changed', b'a')
+        client.create('/same', b'a')
+        client.create('/parent')
+        events = []
+
+        def watch(event):
+            events.append(event)
+        client.get('/changed', watch=watch)
+        client.get('/same', watch=watch)
+        client.get_children('/parent', watch=watch)
+        client.exists('/created', watch=watch)
+
+        other = self._get_client()
+        other.start()
+
+        def change_while_disconnected(state):
+            if state == KazooState.SUSPENDED:
+                other.set('/changed', b'b')
+                other.create('/created')
+                return True
+        client.add_listener(change_while_disconnected)
+        self.lose_connection(self.make_event)
+
+        # only the watches of the nodes that changed fired on reconnect
+        wait(lambda: len(events) == 2)
+        eq_(sorted((event.type, event.path) for event in events),
+            [(EventType.CHANGED, '/changed'), (EventType.CREATED, '/created')])
+
+        # the others are still set
+        del events[:]
+        other.set('/same', b'b')
+        other.create('/parent/child')
+        wait(lambda: len(events) == 2)
+        eq_(sorted((event.type, event.path) for event in events),
+            [(EventType.CHANGED, '/same'), (EventType.CHILD, '/parent')])
+
     def test_bad_session_expire(self):
         from kazoo.protocol.states import KazooState
 
@@ -683,6 +725,130 @@ class TestClient(KazooTestCase):
         eq_(newstat.children_count, stat.numChildren)
         eq_(newstat.children_version, stat.cversion)
 
+    def test_get_zero_copy(self):
+        client = self._get_client(zero_copy_reads=True)
+        client.start()
+        big = b"x" * (512 * 1024)
+        client.create("/small", b"sandwich")
+        client.create("/big", big)
+        client.create("/none")
+        client.set("/none", None)
+
+        data, stat = client.get("/small")
+        assert isinstance(data, memoryview)
+        eq_(data.tobytes(), b"sandwich")
+
+        data, stat = client.get("/big")
+        assert isinstance(data, memoryview)
+        eq_(data.tobytes(), big)
+        eq_(stat.dataLength, len(big))
+
+        eq_(client.get("/none")[0], None)
+
+    def test_compact_stats(self):
+        from kazoo.protocol.states import CompactStat
+        from kazoo.security import OPEN_ACL_UNSAFE
+        client = self._get_client(compact_stats=True)
+        client.start()
+        client.create("/compact", b"value")
+        client.create("/compact/child")
+
+        data, stat = client.get("/compact")
+        assert isinstance(stat, CompactStat)
+        eq_(data, b"value")
+        eq_(stat, self.client.get("/compact")[1])
+        eq_(stat.data_length, 5)
+        eq_(stat.children_count, 1)
+        eq_(stat.last_modified, stat.mtime / 1000.0)
+
+        stat = client.set("/compact", b"other")
+        assert isinstance(stat, CompactStat)
+        eq_(stat.version, 1)
+        assert isinstance(client.exists("/compact"), CompactStat)
+        eq_(client.exists("/missing"), None)
+        children, stat = client.get_children("/compact", include_data=True)
+        eq_(children, ["child"])
+        eq_(stat.numChildren, 1)
+        stat = client.set_acls("/compact", OPEN_ACL_UNSAFE)
+        eq_(stat.aversion, 1)
+
+    def test_compact_stats_zero_copy(self):
+        from kazoo.protocol.states import CompactStat
+        client = self._get_client(compact_stats=True, zero_copy_reads=True)
+        client.start()
+        big = b"x" * (512 * 1024)
+        client.create("/small", b"sandwich")
+        client.create("/big", big)
+        for path, value in (("/small", b"sandwich"), ("/big", big)):
+            data, stat = client.get(path)
+            assert isinstance(data, memoryview)
+            assert isinstance(stat, CompactStat)
+            eq_(data.tobytes(), value)
+            eq_(stat.dataLength, len(value))
+
+    def test_stats(self):
+        client = self.client
+        before = client.stats()
+        client.create("/stats", b"x" * 100)
+        client.get("/stats")
+        client.get("/stats")
+        self.assertRaises(NoNodeError, client.get, "/missing")
+        eq_(client.exists("/missing"), None)
+
+        stats = client.stats()
+        get = stats['ops']['GetData']
+        eq_(get['count'], 3)
+        eq_(get['errors'], 1)
+        assert 0 < get['p50'] <= get['p99'] <= get['max']
+        eq_(stats['ops']['Exists']['errors'], 0)
+        eq_(stats['ops']['Create']['count'],
+            before['ops']['Create']['count'] + 1)
+        eq_(stats['queue_depth'], 0)
+        eq_(stats['pending_depth'], 0)
+        assert stats['bytes_sent'] > 100
+        assert stats['bytes_received'] > 200
+        eq_(stats['connections'], 1)
+        eq_(stats['reconnects'], 0)
+
+    def test_max_requests(self):
+        client = self._get_client(max_requests=3)
+        client.start()
+        results = [client.exists_async("/") for i in range(50)]
+        for result in results:
+            assert result.get(timeout=5) is not None
+        stats = client.stats()
+        eq_(stats['rejected'], 0)
+        eq_(stats['dropped'], 0)
+
+    def test_coalesce_reads(self):
+        client = self._get_client(coalesce_reads=True)
+        client.start()
+        client.create("/coalesce", b"value")
+        client.create("/coalesce/child")
+        # The chroot was checked by start()
+        before = client.stats()
+        gets = [client.get_async("/coalesce") for i in range(20)]
+        children = [client.get_children_async("/coalesce")
+                    for i in range(20)]
+        for result in gets:
+            eq_(result.get(timeout=5)[0], b"value")
+        for result in children:
+            eq_(result.get(timeout=5), ["child"])
+        assert children[0].get() is not children[1].get()
+
+        stats = client.stats()
+        misses = stats['coalesce_misses'] - before['coalesce_misses']
+        eq_(stats['coalesce_hits'] + misses, 40)
+        assert stats['coalesce_hits'] > 0
+        eq_(stats['ops']['GetData']['count'], misses -
+            stats['ops']['GetChildren']['count'])
+
+        # a read sent after a write sees it
+        get = client.get_async("/coalesce")
+        client.set("/coalesce", b"new")
+        eq_(client.get("/coalesce")[0], b"new")
+        eq_(get.get(timeout=5)[0], b"value")
+
     def test_get_invalid_arguments(self):
         client = self.client
         self.assertRaises(TypeError, client.get, ('a', 'b'))
@@ -701,6 +867,102 @@ class TestClient(KazooTestCase):
         client.ensure_path("/1/2/3/4")
         self.assertTrue(client.exists("/1/2/3/4"))
 
+    def _op_counts(self):
+        ops = self.client._connection.stats.snapshot()['ops']
+        return dict((name, op['count']) for name, op in ops.items())
+
+    def test_ensure_path_round_trips(self):
+        client = self.client
+        client.ensure_path("/1")
+        before = self._op_counts()
+        eq_(client.ensure_path("/1/2/3/4"), "/1/2/3/4")
+        self.assertTrue(client.exists("/1/2/3/4"))
+        after = self._op_counts()
+        # the missing nodes are created in one transaction
+        eq_(after.get('Transaction', 0) - before.get('Transaction', 0), 1)
+        eq_(after.get('Create', 0), before.get('Create', 0))
+
+        # and known to exist after that, only the node itself is
+        # checked again
+        eq_(client.ensure_path("/1/2/3"), True)
+        eq_(client.ensure_path("/1/2/3/4"), True)
+        expected = dict(after, Exists=after['Exists'] + 2)
+        eq_(self._op_counts(), expected)
+        client.ensure_path("/1/2/3/4/5")
+        expected['Create'] = expected.get('Create', 0) + 1
+        eq_(self._op_counts(), expected)
+
+    def test_ensure_path_trailing_slash(self):
+        client = self.client
+        eq_(client.ensure_path("/1/2/"), "/1/2")
+        self.assertTrue(client.exists("/1/2"))
+        eq_(client.ensure_path("1//2/3/"), "/1/2/3")
+        self.assertTrue(client.exists("/1/2/3"))
+        eq_(client.ensure_path("/1/2/"), True)
+
+    def test_ensure_path_deleted_by_other(self):
+        client = self.client
+        client.ensure_path("/1/2")
+        other = self._get_client()
+        other.start()
+        try:
+            other.delete("/1/2")
+            # Still known to client, without a watch telling otherwise
+            assert "/1/2" in client._known_paths
+            eq_(client.ensure_path("/1/2"), "/1/2")
+            self.assertTrue(other.exists("/1/2"))
+
+            other.delete("/1", recursive=True)
+            eq_(client.ensure_path("/1/2"), "/1/2")
+            self.assertTrue(other.exists("/1/2"))
+        finally:
+            other.stop()
+
+    def test_ensure_path_some_exist(self):
+        client = self.client
+        client.create("/1/2/3", makepath=True)
+        client.ensure_path("/1/2/3/4/5")
+        self.assertTrue(client.exists("/1/2/3/4/5"))
+        client.ensure_path("/1/2")
+        self.assertTrue(client.exists("/1/2"))
+
+    def test_ensure_path_created_meanwhile(self):
+        client = self.client
+        client.create("/1/2", makepath=True)
+
+        def not_found(requests, async_result):
+            async_result.set([None] * len(requests))
+        with mock.patch.object(client, '_read_pipelined', not_found):
+            client.ensure_path("/1/2/3/4")
+        self.assertTrue(client.exists("/1/2/3/4"))
+        eq_(client._known_paths, set(["/", "/1", "/1/2", "/1/2/3",
+                                      "/1/2/3/4"]))
+
+    def test_ensure_path_forgotten(self):
+        client = self.client
+        client.ensure_path("/1/2")
+        client.delete("/1/2")
+        client.ensure_path("/1/2")
+        self.assertTrue(client.exists("/1/2"))
+
+        # deleted by someone else
+        other = self._get_client()
+        other.start()
+        other.delete("/1", recursive=True)
+        client.ensure_path("/1/2/3")
+        self.assertTrue(client.exists("/1/2/3"))
+
+        other.delete("/1", recursive=True)
+        client.create("/1/2/3", makepath=True)
+        self.assertTrue(client.exists("/1/2/3"))
+
+        client.ensure_path("/1/2/3/4")
+        self.expire_session(client.handler.event_object)
+        eq_(client._known_paths, set())
+        other.delete("/1", recursive=True)
+        client.ensure_path("/1/2/3/4")
+        self.assertTrue(client.exists("/1/2/3/4"))
+
     def test_sync(self):
         client = self.client
         self.assertTrue(client.sync('/'), '/')
@@ -858,6 +1120,55 @@ class TestClient(KazooTestCase):
         client.delete('/a/b/c', recursive=True)
         self.assertFalse('b' in client.get_children('a'))
 
+    def test_delete_recursive_progress(self):
+        client = self.client
+        transaction = client.transaction()
+        transaction.create('/a')
+        for i in range(10):
+            transaction.create('/a/%s' % i)
+            for j in range(3):
+                transaction.create('/a/%s/%s' % (i, j))
+        transaction.commit()
+        calls = []
+
+        def progress(deleted, rate):
+            calls.append(deleted)
+            assert rate > 0
+        client._delete_recursive('/a', progress, window=4, batch_size=7)
+        eq_(client.exists('/a'), None)
+        # the 30 leaves, then the 10 nodes above them, then '/a'
+        eq_(calls, [7, 14, 21, 28, 30, 37, 40, 41])
+
+        client.ensure_path('/a/b')
+        del calls[:]
+        client.delete('/a', recursive=True, progress=progress)
+        eq_(client.exists('/a'), None)
+        eq_(calls, [1, 2])
+
+    def test_delete_recursive_changed_meanwhile(self):
+        client = self.client
+        client.ensure_path('/a/b/c')
+        client.ensure_path('/a/d/e')
+        other = self._get_client()
+        other.start()
+        delete_batch_async = client._delete_batch_async
+
+        def change_first(paths):
+            if paths == ['/a/b/c', '/a/d/e']:
+                other.delete('/a/b/c')
+                other.create('/a/d/e/f')
+            return delete_batch_async(paths)
+
+        calls = []
+
+        def progress(deleted, rate):
+            calls.append(deleted)
+        with mock.patch.object(client, '_delete_batch_async', change_first):
+            eq_(client.delete('/a', recursive=True, progress=progress), True)
+        eq_(client.exists('/a'), None)
+        # /a/d/e and the /a/d/e/f it gained, then /a/b, /a/d and /a
+        eq_(calls, [2, 4, 5])
+
     def test_delete_invalid_arguments(self):
         client = self.client
         client.ensure_path('/a/b')
@@ -891,6 +1202,26 @@ class TestClient(KazooTestCase):
         self.assertEqual(set(children), set(['b', 'c', 'd']))
         self.assertEqual(stat2.version, stat.version)
 
+    def test_get_children_lazy(self):
+        from kazoo.protocol.states import ChildNames
+        client = self.client
+        client.ensure_path('/a/b')
+        client.ensure_path('/a/c')
+        children = client.get_children('/a', lazy=True)
+        assert isinstance(children, ChildNames)
+        self.assertEqual(sorted(children), ['b', 'c'])
+        assert 'b' in children
+        children, stat = client.get_children('/a', include_data=True,
+                                             lazy=True)
+        self.assertEqual(sorted(children), ['b', 'c'])
+        self.assertEqual(stat.numChildren, 2)
+
+        # A lazy and an eager listing of the same path aren't coalesced
+        eager = client.get_children_async('/a')
+        lazy = client.get_children_async('/a', lazy=True)
+        assert type(eager.get()) is list
+        assert isinstance(lazy.get(), ChildNames)
+
     def test_get_children_no_node(self):
         client = self.client
         self.assertRaises(NoNodeError, client.get_children, '/none')
@@ -907,6 +1238,7 @@ class TestClient(KazooTestCase):
         self.assertRaises(TypeError, client.get_children, 'a', watch=True)
         self.assertRaises(TypeError, client.get_children,
                           'a', include_data='yes')
+        self.assertRaises(TypeError, client.get_children, 'a', lazy='yes')
 
     def test_invalid_auth(self):
         from kazoo.exceptions import AuthFailedError
@@ -947,6 +1279,8 @@ class TestClient(KazooTestCase):
             eq_(client.client_state, KeeperState.CONNECTED)
         finally:
             self.cluster[0].run()
+            client.stop()
+            client.close()
 
 
 dummy_dict = {
@@ -1132,6 +1466,218 @@ class TestCallbacks(unittest.TestCase):
         eq_(client.state, KazooState.SUSPENDED)
 
 
+class TestRequestLimit(unittest.TestCase):
+    def _makeOne(self, **kw):
+        from kazoo.client import KazooClient
+        client = KazooClient(**kw)
+        client._state = KeeperState.CONNECTED
+        return client
+
+    def _append(self, client):
+        from kazoo.protocol.serialization import Exists
+        async_object = client.handler.async_result()
+        added = client._bounded_append(Exists('/', None), async_object)
+        return added, async_object
+
+    def _fill_pending(self, client, count):
+        from kazoo.protocol.serialization import Exists
+        from kazoo.protocol.stats import now
+        for xid in range(count):
+            client._pending.append((Exists('/', None),
+                                    client.handler.async_result(), xid,
+                                    now()))
+
+    def _complete_later(self, client, state=None):
+        def complete():
+            time.sleep(0.1)
+            if state is not None:
+                client._state = state
+            client._pending.popleft()
+            client._notify_room()
+        thread = threading.Thread(target=complete)
+        thread.start()
+        return thread
+
+    def test_invalid_policy(self):
+        from kazoo.client import KazooClient
+        self.assertRaises(ConfigurationError, KazooClient,
+                          max_requests=1, overflow_policy='wait')
+
+    def test_raise(self):
+        client = self._makeOne(max_requests=2, overflow_policy='raise')
+        self._fill_pending(client, 1)
+        eq_(self._append(client)[0], True)
+        added, async_object = self._append(client)
+        eq_(added, False)
+        self.assertRaises(TooManyRequestsError, async_object.get,
+                          timeout=0)
+        eq_(len(client._queue), 1)
+        eq_(client.stats()['rejected'], 1)
+
+    def test_drop_oldest(self):
+        client = self._makeOne(max_requests=2, overflow_policy='drop_oldest')
+        oldest = self._append(client)[1]
+        newer = self._append(client)[1]
+        eq_(self._append(client)[0], True)
+        self.assertRaises(TooManyRequestsError, oldest.get, timeout=0)
+        eq_([entry[1] for entry in client._queue][0], newer)
+        eq_(len(client._queue), 2)
+
+        # requests already sent can't be dropped
+        client._queue.clear()
+        self._fill_pending(client, 2)
+        added, async_object = self._append(client)
+        eq_(added, False)
+        self.assertRaises(TooManyRequestsError, async_object.get,
+                          timeout=0)
+        stats = client.stats()
+        eq_(stats['dropped'], 1)
+        eq_(stats['rejected'], 1)
+
+    def test_raise_without_result(self):
+        client = self._makeOne(max_requests=1, overflow_policy='raise')
+        self._fill_pending(client, 1)
+        eq_(client._bounded_append(_CONNECTION_DROP, None), False)
+        eq_(client.stats()['rejected'], 1)
+
+    def test_block(self):
+        client = self._makeOne(max_requests=1)
+        self._fill_pending(client, 1)
+        thread = self._complete_later(client)
+        eq_(self._append(client)[0], True)
+        thread.join()
+        eq_(len(client._queue), 1)
+        eq_(client._blocked, 0)
+
+    def test_block_completed_while_checking(self):
+        from collections import deque
+        client = self._makeOne(max_requests=1, request_timeout=5)
+        self._fill_pending(client, 1)
+        completed = []
+
+        def complete():
+            client._pending.popleft()
+            client._notify_room()
+            completed.append(True)
+
+        class Pending(deque):
+            def __len__(self):
+                length = deque.__len__(self)
+                if not completed:
+                    # The reply arrives after the caller found the
+                    # queue full, before it counts itself as blocked
+                    thread = threading.Thread(target=complete)
+                    thread.start()
+                    thread.join(0.2)
+                    completed.append(False)
+                return length
+
+        client._pending = Pending(client._pending)
+        start = time.time()
+        eq_(self._append(client)[0], True)
+        assert time.time() - start < 4
+        eq_(client._blocked, 0)
+
+    def test_block_request_timeout(self):
+        client = self._makeOne(max_requests=1, request_timeout=0.05)
+        self._fill_pending(client, 1)
+        added, async_object = self._append(client)
+        eq_(added, False)
+        self.assertRaises(client.handler.timeout_exception,
+                          async_object.get, timeout=0)
+        eq_(len(client._queue), 0)
+
+    def test_block_connection_lost(self):
+        client = self._makeOne(max_requests=1)
+        self._fill_pending(client, 1)
+        thread = self._complete_later(client, KeeperState.CONNECTING)
+        added, async_object = self._append(client)
+        thread.join()
+        eq_(added, False)
+        self.assertRaises(ConnectionLoss, async_object.get, timeout=0)
+
+
+class TestReadCoalescing(unittest.TestCase):
+    def _makeOne(self, **kw):
+        from kazoo.client import KazooClient
+        client = KazooClient(coalesce_reads=True, **kw)
+        client._state = KeeperState.CONNECTED
+        client._connection._write_sock = mock.Mock()
+        return client
+
+    def _reply(self, client, value):
+        request, async_object, started = client._queue.popleft()
+        async_object.set(value)
+
+    def test_identical_reads(self):
+        client = self._makeOne()
+        first = client.get_async("/a")
+        second = client.get_async("/a")
+        eq_(len(client._queue), 1)
+        self._reply(client, (b"a", None))
+        eq_(first.get(timeout=0), (b"a", None))
+        eq_(second.get(timeout=0), (b"a", None))
+
+        # the reply is in, the next read is sent
+        client.get_async("/a")
+        eq_(len(client._queue), 1)
+        stats = client.stats()
+        eq_(stats['coalesce_hits'], 1)
+        eq_(stats['coalesce_misses'], 2)
+
+    def test_different_reads(self):
+        client = self._makeOne()
+        client.get_async("/a")
+        client.get_async("/b")
+        client.exists_async("/a")
+        client.get_children_async("/a")
+        client.get_children_async("/a", include_data=True)
+        client.get_async("/a", watch=lambda event: None)
+        eq_(len(client._queue), 6)
+        eq_(client.stats()['coalesce_hits'], 0)
+
+    def test_children_copied(self):
+        client = self._makeOne()
+        first = client.get_children_async("/a")
+        second = client.get_children_async("/a")
+        self._reply(client, ["b"])
+        first.get(timeout=0).append("c")
+        eq_(second.get(timeout=0), ["b"])
+
+    def test_exception(self):
+        client = self._makeOne()
+        first = client.exists_async("/a")
+        second = client.exists_async("/a")
+        request, async_object, started = client._queue.popleft()
+        async_object.set_exception(ConnectionLoss())
+        self.assertRaises(ConnectionLoss, first.get, timeout=0)
+        self.assertRaises(ConnectionLoss, second.get, timeout=0)
+
+    def test_write_between(self):
+        client = self._makeOne()
+        client.get_async("/a")
+        client.set_async("/a", b"value")
+        client.get_async("/a")
+        eq_(len(client._queue), 3)
+
+    def test_test_hooks(self):
+        client = self._makeOne()
+        client.get_async("/a")
+        client._call(_CONNECTION_DROP, None)
+        eq_(len(client._queue), 2)
+        eq_(client._queue[1][0], _CONNECTION_DROP)
+        # reads after the hook are sent again
+        client.get_async("/a")
+        eq_(len(client._queue), 3)
+
+    def test_disabled(self):
+        client = self._makeOne()
+        client.coalesce_reads = False
+        client.get_async("/a")
+        client.get_async("/a")
+        eq_(len(client._queue), 2)
+
+
 class TestNonChrootClient(KazooTestCase):
 
     def test_create(self):
@@ -1150,15 +1696,201 @@ class TestNonChrootClient(KazooTestCase):
         self.assertEquals(client.unchroot('/b/c'), '/b/c')
 
 
+class TestMultiRead(KazooTestCase):
+
+    def _server_version(self):
+        if TRAVIS_ZK_VERSION:
+            return TRAVIS_ZK_VERSION
+        return self.client.server_version()
+
+    def test_get_many(self):
+        client = self.client
+        client.create('/a', b'1')
+        client.create('/b', b'2')
+        client.set('/b', b'3')
+        first, missing, second = client.get_many(['/a', '/missing', '/b'])
+        eq_(first[0], b'1')
+        eq_(first[1].version, 0)
+        assert isinstance(missing, NoNodeError)
+        eq_(second[0], b'3')
+        eq_(second[1].version, 1)
+        eq_(client._multi_read, self._server_version() >= (3, 6))
+
+        # Once known, the server isn't asked again
+        connections = client.stats()['connections']
+        eq_(client.get_many(['/b'])[0][0], b'3')
+        eq_(client.stats()['connections'], connections)
+
+    def test_get_children_many(self):
+        client = self.client
+        client.create('/a/x', makepath=True)
+        client.create('/a/y')
+        client.create('/b')
+        listed, missing, empty = client.get_children_many(
+            ['/a', '/missing', '/b'])
+        eq_(sorted(listed), ['x', 'y'])
+        assert isinstance(missing, NoNodeError)
+        eq_(empty, [])
+
+    def test_no_paths(self):
+        eq_(self.client.get_many([]), [])
+        eq_(self.client.get_children_many([]), [])
+
+    def test_invalid_paths(self):
+        self.assertRaises(TypeError, self.client.get_many, '/a')
+        self.assertRaises(TypeError, self.client.get_many, ['/a', None])
+
+
+class TestMultiReadFallback(unittest.TestCase):
+    def setUp(self):
+        from kazoo.client import KazooClient
+        from kazoo.testing.server import StandInZooKeeper
+        # Replies UNIMPLEMENTED to multiRead, and keeps the connection
+        self.server = StandInZooKeeper(version=(3, 5, 8))
+        self.server.run()
+        self.client = KazooClient(self.server.address)
+        self.client.start()
+
+    def tearDown(self):
+        self.client.stop()
+        self.client.close()
+        self.server.destroy()
+
+    def test_fallback(self):
+        client = self.client
+        client.create('/a', b'1')
+        client.create('/a/x')
+        connections = client.stats()['connections']
+        result = client.get_many_async(['/a', '/missing'])
+        assert result.wait(5)
+        first, missing = result.get()
+        eq_(first[0], b'1')
+        assert isinstance(missing, NoNodeError)
+        eq_(client._multi_read, False)
+        eq_(client.stats()['connections'], connections)
+
+        # Not asked again
+        eq_(client.get_children_many(['/a']), [['x']])
+        eq_(client.stats()['ops']['MultiRead']['count'], 1)
+
+
+class TestPersistentWatches(KazooTestCase):
+
+    def setUp(self):
+        KazooTestCase.setUp(self)
+        if TRAVIS_ZK_VERSION:
+            version = TRAVIS_ZK_VERSION
+        else:
+            version = self.client.server_version()
+        if not version or version < (3, 6):
+            KazooTestCase.tearDown(self)
+            raise SkipTest("Must use Zookeeper 3.6 or above")
+        self.events = []
+
+    def _watch(self, event):
+        self.events.append(event)
+
+    def _wait_events(self, count):
+        wait(lambda: len(self.events) >= count)
+        return [(event.type, event.path) for event in self.events]
+
+    def test_persistent(self):
+        from kazoo.protocol.states import EventType
+        client = self.client
+        client.create('/node', b'a')
+        client.add_watch('/node', self._watch)
+        client.set('/node', b'b')
+        client.create('/node/child')
+        client.create('/node/child/grandchild')
+        client.set('/node', b'c')
+        eq_(self._wait_events(3), [(EventType.CHANGED, '/node'),
+                                   (EventType.CHILD, '/node'),
+                                   (EventType.CHANGED, '/node')])
+
+    def test_persistent_recursive(self):
+        from kazoo.protocol.states import AddWatchMode, EventType
+        client = self.client
+        client.add_watch('/tree', self._watch,
+                         AddWatchMode.PERSISTENT_RECURSIVE)
+        client.create('/tree')
+        client.create('/tree/a/b', makepath=True)
+        client.create('/treetop')
+        client.set('/tree/a/b', b'x')
+        client.delete('/tree/a', recursive=True)
+        eq_(self._wait_events(5), [(EventType.CREATED, '/tree'),
+                                   (EventType.CREATED, '/tree/a'),
+                                   (EventType.CREATED, '/tree/a/b'),
+                                   (EventType.CHANGED, '/tree/a/b'),
+                                   (EventType.DELETED, '/tree/a/b'),
+                                   (EventType.DELETED, '/tree/a')])
+
+    def test_check_and_remove_watches(self):
+        from kazoo.protocol.states import WatcherType
+        client = self.client
+        client.create('/node')
+        client.add_watch('/node', self._watch)
+        eq_(client.check_watches('/node'), True)
+        eq_(client.check_watches('/node', WatcherType.PERSISTENT), True)
+        eq_(client.check_watches('/node', WatcherType.DATA), False)
+
+        client.remove_watches('/node')
+        eq_(client.check_watches('/node'), False)
+        self.assertRaises(NoWatcherError, client.remove_watches, '/node')
+
+        barrier = []
+
+        def barrier_watch(event):
+            barrier.append(event)
+        client.get('/node', watch=barrier_watch)
+        client.set('/node', b'b')
+        wait(lambda: barrier)
+        eq_(self.events, [])
+
+    def test_remove_one_watcher(self):
+        from kazoo.protocol.states import WatcherType
+        client = self.client
+        client.create('/node')
+        other = []
+
+        def other_watch(event):
+            other.append(event)
+        client.add_watch('/node', self._watch)
+        client.add_watch('/node', other_watch)
+        client.remove_watches('/node', self._watch, WatcherType.PERSISTENT)
+        client.set('/node', b'b')
+        wait(lambda: other)
+        eq_(self.events, [])
+
+    def test_kept_across_reconnect(self):
+        from kazoo.protocol.states import AddWatchMode, EventType
+        client = self.client
+        client.add_watch('/tree', self._watch,
+                         AddWatchMode.PERSISTENT_RECURSIVE)
+        self.lose_connection(threading.Event)
+        client.create('/tree')
+        eq_(self._wait_events(1), [(EventType.CREATED, '/tree')])
+
+    def test_invalid_arguments(self):
+        client = self.client
+        self.assertRaises(TypeError, client.add_watch, '/node', None)
+        self.assertRaises(TypeError, client.add_watch, '/node',
+                          self._watch, 2)
+        self.assertRaises(TypeError, client.remove_watches, '/node',
+                          watcher_type=0)
+
+
 class TestReconfig(KazooTestCase):
 
     def setUp(self):
+        if isinstance(self.cluster, StandInCluster):
+            raise SkipTest("The ZooKeeper stand-in doesn't reconfig")
         KazooTestCase.setUp(self)
         if TRAVIS_ZK_VERSION:
             version = TRAVIS_ZK_VERSION
         else:
             version = self.client.server_version()
         if not version or version < (3, 5):
+            KazooTestCase.tearDown(self)
             raise SkipTest("Must use Zookeeper 3.5 or above")
 
     def test_add_remove_observer(self):
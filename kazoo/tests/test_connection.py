@@ -1,7 +1,9 @@
+from collections import deque
 from collections import namedtuple
 import os
 import threading
 import time
+import unittest
 import uuid
 import struct
 
@@ -14,12 +16,19 @@ from kazoo.exceptions import ConnectionLoss
 from kazoo.protocol.serialization import (
     Connect,
     int_struct,
+    reply_header_struct,
+    stat_struct,
     write_string,
 )
 from kazoo.protocol.states import KazooState
-from kazoo.protocol.connection import _CONNECTION_DROP
+from kazoo.protocol.stats import now
+from kazoo.protocol.connection import (
+    READ_BUFFER_SIZE,
+    ZERO_COPY_THRESHOLD,
+    _CONNECTION_DROP,
+)
 from kazoo.testing import KazooTestCase
-from kazoo.tests.util import wait
+from kazoo.tests.util import Blackhole, wait
 from kazoo.tests.util import TRAVIS_ZK_VERSION
 
 
@@ -41,7 +50,7 @@ class TestConnectionHandler(KazooTestCase):
     def test_bad_deserialization(self):
         async_object = self.client.handler.async_result()
         self.client._queue.append(
-            (Delete(self.client.chroot, -1), async_object))
+            (Delete(self.client.chroot, -1), async_object, now()))
         self.client._connection._write_sock.send(b'\0')
 
         @raises(ValueError)
@@ -49,6 +58,45 @@ class TestConnectionHandler(KazooTestCase):
             async_object.get()
         testit()
 
+    def test_pipelined_flush(self):
+        from kazoo.protocol.serialization import Exists
+        client = self.client
+        connection = client._connection
+        flushes = connection.flushes
+        flushed = connection.requests_flushed
+
+        # queue a batch of requests behind a single wakeup byte, they
+        # should all go out in one flush
+        results = []
+        for i in range(20):
+            async_object = client.handler.async_result()
+            client._queue.append(
+                (Exists(client.chroot + '/%s' % i, None), async_object,
+                 now()))
+            results.append(async_object)
+        connection._write_sock.send(b'\0')
+
+        for result in results:
+            eq_(result.get(timeout=5), None)
+        eq_(connection.flushes, flushes + 1)
+        eq_(connection.requests_flushed, flushed + 20)
+
+    def test_connect_past_unresponsive_host(self):
+        from kazoo.client import KazooClient
+        blackhole = Blackhole()
+        server = self.servers.split(',')[0]
+        hosts = '%s:%s,%s' % (blackhole.address + (server,))
+        # connecting to the first host alone would take the whole
+        # session timeout
+        client = KazooClient(hosts, timeout=10, randomize_hosts=False)
+        try:
+            client.start(timeout=5)
+            eq_(client.connected, True)
+        finally:
+            client.stop()
+            client.close()
+            blackhole.close()
+
     def test_with_bad_sessionid(self):
         ev = threading.Event()
 
@@ -229,6 +277,301 @@ class TestConnectionHandler(KazooTestCase):
         wait(lambda: client.handler.select([read_sock], [], [], 0)[0] == [])
 
 
+class FakeSocket(object):
+    """A socket handing out pre-recorded chunks to recv_into"""
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def recv_into(self, buf):
+        chunk = self.chunks.pop(0)
+        if len(chunk) > len(buf):
+            # the rest is left for the next read
+            self.chunks.insert(0, chunk[len(buf):])
+            chunk = chunk[:len(buf)]
+        buf[:len(chunk)] = chunk
+        return len(chunk)
+
+
+class TestReadBuffer(unittest.TestCase):
+    def _makeOne(self, chunks, zero_copy_reads=False):
+        from kazoo.handlers.threading import SequentialThreadingHandler
+        from kazoo.protocol.connection import ConnectionHandler
+        handler = SequentialThreadingHandler()
+        client = mock.Mock()
+        client.handler = handler
+        client.zero_copy_reads = zero_copy_reads
+        client.compact_stats = False
+        client._pending = deque()
+        conn = ConnectionHandler(client, mock.Mock())
+        conn._socket = FakeSocket(chunks)
+        handler.select = lambda r, w, x, timeout: (r, w, x)
+        return conn
+
+    def _frame(self, payload):
+        return int_struct.pack(len(payload)) + payload
+
+    def test_many_frames_per_recv(self):
+        data = b''.join(self._frame(p) for p in (b'a', b'bb', b'ccc'))
+        conn = self._makeOne([data])
+        conn._fill(1)
+        frames = []
+        frame = conn._next_frame()
+        while frame is not None:
+            frames.append(frame.tobytes())
+            frame = conn._next_frame()
+        eq_(frames, [b'a', b'bb', b'ccc'])
+
+    def test_partial_frames(self):
+        data = self._frame(b'hello') + self._frame(b'world')
+        conn = self._makeOne([data[:2], data[2:7], data[7:]])
+        eq_(conn._read_frame(1).tobytes(), b'hello')
+        eq_(conn._read_frame(1).tobytes(), b'world')
+        eq_(conn._next_frame(), None)
+
+    def test_frame_larger_than_buffer(self):
+        big = b'x' * (READ_BUFFER_SIZE * 3)
+        data = self._frame(b'small') + self._frame(big)
+        step = READ_BUFFER_SIZE // 2
+        chunks = [data[i:i + step] for i in range(0, len(data), step)]
+        conn = self._makeOne(chunks)
+        eq_(conn._read_frame(1).tobytes(), b'small')
+        eq_(conn._read_frame(1).tobytes(), big)
+        assert len(conn._rbuf) > READ_BUFFER_SIZE
+
+        # once drained the buffer goes back to its normal size
+        conn._socket.chunks.append(self._frame(b'after'))
+        eq_(conn._read_frame(1).tobytes(), b'after')
+        eq_(len(conn._rbuf), READ_BUFFER_SIZE)
+
+    def _get_reply(self, xid, data):
+        stat = stat_struct.pack(*range(11))
+        return self._frame(reply_header_struct.pack(xid, 1, 0) +
+                           int_struct.pack(len(data)) + data + stat)
+
+    def _read_gets(self, conn, values):
+        from kazoo.protocol.serialization import GetData
+        results = []
+        for xid, value in enumerate(values):
+            result = conn.handler.async_result()
+            conn.client._pending.append(
+                (GetData('/a', None), result, xid, now()))
+            results.append(result)
+        while not results[-1].ready():
+            conn._read_socket(1)
+        return [done.get()[0] for done in results]
+
+    def test_get_copies(self):
+        big = b'x' * (READ_BUFFER_SIZE * 2)
+        data = self._get_reply(0, b'small') + self._get_reply(1, big)
+        conn = self._makeOne([data])
+        eq_(self._read_gets(conn, [b'small', big]), [b'small', big])
+
+    def test_get_zero_copy(self):
+        big = b'x' * (ZERO_COPY_THRESHOLD * 2)
+        other = b'y' * (ZERO_COPY_THRESHOLD * 3)
+        # the first reply arrives in the shared buffer, the large ones
+        # have their header received before the rest of their data
+        data = (self._get_reply(0, b'small') + self._get_reply(1, big) +
+                self._get_reply(2, other) + self._get_reply(3, b'after'))
+        chunks = [data[:100]] + [data[i:i + 1000]
+                                 for i in range(100, len(data), 1000)]
+        conn = self._makeOne(chunks, zero_copy_reads=True)
+        values = self._read_gets(conn, [b'small', big, other, b'after'])
+
+        for value in values:
+            assert isinstance(value, memoryview)
+        eq_([value.tobytes() for value in values],
+            [b'small', big, other, b'after'])
+        # the small values were copied to bytes, the large ones are views
+        # of the buffers they were received in
+        eq_([value.readonly for value in values], [True, False, False, True])
+
+        # those buffers are never written to again
+        conn._socket.chunks.append(self._get_reply(0, b'z' * len(big)))
+        eq_(self._read_gets(conn, [b'next'])[0].tobytes(), b'z' * len(big))
+        eq_(values[1].tobytes(), big)
+        eq_(values[2].tobytes(), other)
+
+
+class TestRequestTimeout(unittest.TestCase):
+    def _makeOne(self, replies, request_timeout):
+        from kazoo.handlers.threading import SequentialThreadingHandler
+        from kazoo.protocol.connection import ConnectionHandler
+        handler = SequentialThreadingHandler()
+        client = mock.Mock()
+        client.handler = handler
+        client.zero_copy_reads = False
+        client.compact_stats = False
+        client.request_timeout = request_timeout
+        client._pending = deque()
+        conn = ConnectionHandler(client, mock.Mock())
+        conn._socket = FakeSocket(replies)
+        handler.select = lambda r, w, x, timeout: (r, w, x)
+        return conn
+
+    def _get_reply(self, xid, data):
+        reply = (reply_header_struct.pack(xid, 1, 0) +
+                 int_struct.pack(len(data)) + data +
+                 stat_struct.pack(*range(11)))
+        return int_struct.pack(len(reply)) + reply
+
+    def _queue_gets(self, conn, ages):
+        from kazoo.protocol.serialization import GetData
+        results = []
+        for xid, age in enumerate(ages):
+            result = conn.handler.async_result()
+            conn.client._pending.append(
+                (GetData('/a', None), result, xid, now() - age))
+            results.append(result)
+        return results
+
+    def test_late_replies_discarded(self):
+        from kazoo.handlers.threading import KazooTimeoutError
+        replies = b''.join(self._get_reply(xid, value) for xid, value in
+                           enumerate([b'late', b'later', b'in time']))
+        conn = self._makeOne([replies], 5)
+        results = self._queue_gets(conn, [10, 6, 0])
+
+        remaining = conn._expire_requests()
+        assert 4 < remaining <= 5
+        for result in results[:2]:
+            self.assertRaises(KazooTimeoutError, result.get, timeout=0)
+        assert not results[2].ready()
+        # already timed out requests are left alone
+        assert 4 < conn._expire_requests() <= 5
+
+        conn._read_socket(1)
+        eq_(results[2].get(timeout=0)[0], b'in time')
+        eq_(len(conn.client._pending), 0)
+        self.assertRaises(KazooTimeoutError, results[0].get, timeout=0)
+
+        stats = conn.stats.snapshot()
+        eq_(stats['timeouts'], 2)
+        eq_(stats['ops']['GetData']['count'], 3)
+        eq_(stats['ops']['GetData']['errors'], 2)
+
+    def test_no_request_timeout(self):
+        conn = self._makeOne([], None)
+        results = self._queue_gets(conn, [3600])
+        eq_(conn._expire_requests(), None)
+        assert not results[0].ready()
+        eq_(conn.stats.timeouts, 0)
+
+
+class TestReadWatchEvent(unittest.TestCase):
+    def _makeOne(self):
+        from collections import defaultdict
+        from kazoo.protocol.connection import ConnectionHandler
+        client = mock.Mock()
+        client._stopped.is_set.return_value = False
+        client.unchroot = lambda path: path
+        for table in ('_data_watchers', '_child_watchers',
+                      '_persistent_watchers',
+                      '_persistent_recursive_watchers'):
+            setattr(client, table, defaultdict(set))
+        client._exist_watches = set()
+        return ConnectionHandler(client, mock.Mock())
+
+    def _triggered(self, conn, event_type, path):
+        dispatch = conn.client.handler.dispatch_callback
+        dispatch.reset_mock()
+        conn._read_watch_event(
+            struct.pack('!ii', event_type, 3) + write_string(path), 0)
+        return sorted(args[0].func for args, kwargs in
+                      dispatch.call_args_list)
+
+    def test_persistent_not_popped(self):
+        from kazoo.protocol.connection import CHANGED_EVENT, CHILD_EVENT
+        conn = self._makeOne()
+        client = conn.client
+        client._data_watchers['/a'].add('once')
+        client._persistent_watchers['/a'].add('always')
+        eq_(self._triggered(conn, CHANGED_EVENT, '/a'), ['always', 'once'])
+        eq_(self._triggered(conn, CHANGED_EVENT, '/a'), ['always'])
+        eq_(self._triggered(conn, CHILD_EVENT, '/a'), ['always'])
+
+    def test_recursive(self):
+        from kazoo.protocol.connection import (
+            CHILD_EVENT,
+            CREATED_EVENT,
+            DELETED_EVENT,
+        )
+        conn = self._makeOne()
+        recursive = conn.client._persistent_recursive_watchers
+        recursive['/'].add('root')
+        recursive['/a'].add('a')
+        recursive['/a/b'].add('b')
+        eq_(self._triggered(conn, CREATED_EVENT, '/a/b/c'),
+            ['a', 'b', 'root'])
+        eq_(self._triggered(conn, DELETED_EVENT, '/a'), ['a', 'root'])
+        eq_(self._triggered(conn, CREATED_EVENT, '/ab'), ['root'])
+        eq_(self._triggered(conn, CHILD_EVENT, '/a'), [])
+
+    def test_triggered_once(self):
+        from kazoo.protocol.connection import DELETED_EVENT
+        conn = self._makeOne()
+        client = conn.client
+        client._data_watchers['/a'].add('watch')
+        client._child_watchers['/a'].add('watch')
+        client._persistent_recursive_watchers['/'].add('watch')
+        eq_(self._triggered(conn, DELETED_EVENT, '/a'), ['watch'])
+
+
+class TestSetWatches(unittest.TestCase):
+    def _makeOne(self):
+        from kazoo.handlers.threading import SequentialThreadingHandler
+        from kazoo.protocol.connection import ConnectionHandler
+        client = mock.Mock()
+        client.handler = SequentialThreadingHandler()
+        client.last_zxid = 42
+        client._data_watchers = {'/a': set([1]), '/b': set([2])}
+        client._exist_watches = set(['/b'])
+        client._child_watchers = {'/c': set([3])}
+        client._persistent_watchers = {}
+        client._persistent_recursive_watchers = {}
+        conn = ConnectionHandler(client, mock.Mock())
+        conn._submit = mock.Mock()
+        return conn
+
+    def _sent(self, conn):
+        from kazoo.protocol.connection import SET_WATCHES_XID
+        requests = []
+        for args, kwargs in conn._submit.call_args_list:
+            request, timeout, xid = args
+            eq_(xid, SET_WATCHES_XID)
+            requests.append(request)
+        return requests
+
+    def test_set_watches(self):
+        from kazoo.protocol.serialization import SetWatches
+        conn = self._makeOne()
+        conn._set_watches(10)
+        eq_(self._sent(conn), [SetWatches(42, ['/a'], ['/b'], ['/c'])])
+
+    def test_no_watches(self):
+        conn = self._makeOne()
+        conn.client._data_watchers = {}
+        conn.client._child_watchers = {}
+        conn._set_watches(10)
+        eq_(self._sent(conn), [])
+
+    def test_split(self):
+        from kazoo.protocol.serialization import SetWatches
+        conn = self._makeOne()
+        with mock.patch('kazoo.protocol.connection.SET_WATCHES_MAX_SIZE', 3):
+            conn._set_watches(10)
+        eq_(self._sent(conn), [SetWatches(42, ['/a'], ['/b'], []),
+                               SetWatches(42, [], [], ['/c'])])
+
+    def test_persistent(self):
+        from kazoo.protocol.serialization import SetWatches2
+        conn = self._makeOne()
+        conn.client._persistent_recursive_watchers = {'/d': set([4])}
+        conn._set_watches(10)
+        eq_(self._sent(conn),
+            [SetWatches2(42, ['/a'], ['/b'], ['/c'], [], ['/d'])])
+
+
 class TestConnectionDrop(KazooTestCase):
     def test_connection_dropped(self):
         ev = threading.Event()
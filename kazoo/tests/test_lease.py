@@ -35,6 +35,7 @@ class KazooLeaseTests(KazooTestCase):
                 cl.close()
         del self.client2
         del self.client3
+        super(KazooLeaseTests, self).tearDown()
 
 
 class NonBlockingLeaseTests(KazooLeaseTests):
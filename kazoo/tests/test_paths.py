@@ -99,3 +99,68 @@ class NormRootTestCase(TestCase):
         self.assertEquals(paths._norm_root('/'), '/')
         self.assertEquals(paths._norm_root('//a'), '/a')
         self.assertEquals(paths._norm_root('//a./b'), '/a./b')
+
+
+class IsNormalizedTestCase(TestCase):
+
+    def test_is_normalized(self):
+        self.assertTrue(paths._is_normalized('a'))
+        self.assertTrue(paths._is_normalized('a/b.c/..d'))
+
+    def test_is_normalized_false(self):
+        self.assertFalse(paths._is_normalized(''))
+        self.assertFalse(paths._is_normalized('a//b'))
+        self.assertFalse(paths._is_normalized('a/b/'))
+        self.assertFalse(paths._is_normalized('a/./b'))
+        self.assertFalse(paths._is_normalized('..'))
+
+
+class PathCacheTestCase(TestCase):
+
+    def test_bounded(self):
+        cache = paths._PathCache(10)
+        for i in range(100):
+            cache.set(str(i), i)
+        self.assertEqual(len(cache), 10)
+        self.assertEqual(cache.get('99'), 99)
+        self.assertEqual(cache.get('0'), None)
+
+    def test_recently_used_kept(self):
+        cache = paths._PathCache(10)
+        cache.set('kept', 'value')
+        for i in range(20):
+            cache.set(str(i), i)
+            self.assertEqual(cache.get('kept'), 'value')
+        self.assertEqual(cache.get('0'), None)
+
+
+class ChrootTestCase(TestCase):
+
+    def test_prefix(self):
+        for root in ('', '/', '/a', '/a/', '//a./b'):
+            chroot = paths._Chroot(root)
+            for path in ('', '/', 'b', '/b/c', '//b/c.', 'b//c', 'b/',
+                         u('/\xe4/b')):
+                expected = paths._prefix_root(root, path)
+                self.assertEqual(chroot.prefix(path), expected)
+                # Again from the cache
+                self.assertEqual(chroot.prefix(path), expected)
+
+    def test_prefix_trailing(self):
+        chroot = paths._Chroot('/a')
+        self.assertEqual(chroot.prefix('b/', trailing=True), '/a/b/')
+        self.assertEqual(chroot.prefix('b/'), '/a/b')
+
+    def test_prefix_relative(self):
+        chroot = paths._Chroot('/a')
+        self.assertRaises(ValueError, chroot.prefix, '/b/../c')
+        # Paths that fail aren't cached, so they fail every time
+        self.assertEqual(chroot._prefixed.get('/b/../c'), None)
+        self.assertRaises(ValueError, chroot.prefix, '/b/../c')
+
+    def test_strip(self):
+        chroot = paths._Chroot('/a')
+        self.assertEqual(chroot.strip('/a/b'), '/b')
+        self.assertEqual(chroot.strip('/a/b'), '/b')
+        self.assertEqual(chroot.strip('/b/c'), '/b/c')
+        self.assertEqual(paths._Chroot('').strip('/a/b'), '/a/b')
@@ -0,0 +1,359 @@
+import struct
+import unittest
+
+from nose.tools import assert_raises
+from nose.tools import eq_
+
+from kazoo.security import OPEN_ACL_UNSAFE
+
+
+def _string(s):
+    s = s.encode('utf-8')
+    return struct.pack('!i', len(s)) + s
+
+
+class TestWriteRequest(unittest.TestCase):
+    def _write(self, request, xid=None, b=None):
+        from kazoo.protocol.serialization import write_request
+        return bytes(write_request(bytearray() if b is None else b,
+                                   request, xid))
+
+    def _frame(self, body):
+        return struct.pack('!i', len(body)) + body
+
+    def test_create(self):
+        from kazoo.protocol.serialization import Create
+        request = Create(u'/n\xf8de', b'data', OPEN_ACL_UNSAFE, 3)
+        body = (struct.pack('!ii', 7, 1) + _string(u'/n\xf8de') +
+                struct.pack('!i', 4) + b'data' + struct.pack('!ii', 1, 31) +
+                _string('world') + _string('anyone') + struct.pack('!i', 3))
+        eq_(self._write(request, 7), self._frame(body))
+        eq_(bytes(request.serialize()), body[8:])
+
+    def test_set_data_null(self):
+        from kazoo.protocol.serialization import SetData
+        body = (struct.pack('!ii', 1, 5) + _string('/a') +
+                struct.pack('!ii', -1, 2))
+        eq_(self._write(SetData('/a', None, 2), 1), self._frame(body))
+
+    def test_transaction(self):
+        from kazoo.protocol.serialization import (
+            CheckVersion,
+            Delete,
+            Transaction,
+        )
+        request = Transaction([CheckVersion('/a', 1), Delete('/b', -1)])
+        body = (struct.pack('!ii', 2, 14) +
+                struct.pack('!iBi', 13, 0, -1) + _string('/a') +
+                struct.pack('!i', 1) +
+                struct.pack('!iBi', 2, 0, -1) + _string('/b') +
+                struct.pack('!i', -1) +
+                struct.pack('!iBi', -1, 1, -1))
+        eq_(self._write(request, 2), self._frame(body))
+
+    def test_set_watches(self):
+        from kazoo.protocol.serialization import SetWatches
+        request = SetWatches(5, ['/a'], [], ['/b', '/c'])
+        body = (struct.pack('!ii', -8, 101) + struct.pack('!q', 5) +
+                struct.pack('!i', 1) + _string('/a') + struct.pack('!i', 0) +
+                struct.pack('!i', 2) + _string('/b') + _string('/c'))
+        eq_(self._write(request, -8), self._frame(body))
+
+    def test_set_watches2(self):
+        from kazoo.protocol.serialization import SetWatches2
+        request = SetWatches2(5, [], [], [], ['/a'], ['/b'])
+        body = (struct.pack('!ii', -8, 105) + struct.pack('!q', 5) +
+                struct.pack('!iii', 0, 0, 0) +
+                struct.pack('!i', 1) + _string('/a') +
+                struct.pack('!i', 1) + _string('/b'))
+        eq_(self._write(request, -8), self._frame(body))
+
+    def test_watch_requests(self):
+        from kazoo.protocol.serialization import (
+            AddWatch,
+            CheckWatches,
+            RemoveWatches,
+        )
+        eq_(self._write(AddWatch('/a', lambda event: None, 1), 3),
+            self._frame(struct.pack('!ii', 3, 106) + _string('/a') +
+                        struct.pack('!i', 1)))
+        eq_(self._write(CheckWatches('/a', 2, None), 4),
+            self._frame(struct.pack('!ii', 4, 17) + _string('/a') +
+                        struct.pack('!i', 2)))
+        eq_(self._write(RemoveWatches('/a', 3), 5),
+            self._frame(struct.pack('!ii', 5, 18) + _string('/a') +
+                        struct.pack('!i', 3)))
+
+    def test_no_xid(self):
+        from kazoo.protocol.serialization import Connect
+        request = Connect(0, 5, 10000, 0, b'\0' * 16, True)
+        body = (struct.pack('!iqiq', 0, 5, 10000, 0) +
+                struct.pack('!i', 16) + b'\0' * 16 + b'\1')
+        eq_(self._write(request), self._frame(body))
+
+    def test_appends(self):
+        from kazoo.protocol.serialization import Close, Exists
+        b = bytearray(b'previous')
+        eq_(self._write(Exists('/a', True), 3, b),
+            b'previous' + self._frame(struct.pack('!ii', 3, 3) +
+                                      _string('/a') + b'\1'))
+        eq_(self._write(Close(), 4, b)[-12:],
+            self._frame(struct.pack('!ii', 4, -11)))
+
+    def test_serialize_only(self):
+        from kazoo.protocol.serialization import int_struct
+
+        class Legacy(object):
+            type = 42
+
+            def serialize(self):
+                return b'legacy'
+        eq_(self._write(Legacy(), 9),
+            self._frame(int_struct.pack(9) + int_struct.pack(42) +
+                        b'legacy'))
+
+
+class TestMultiRead(unittest.TestCase):
+    def test_serialize(self):
+        from kazoo.protocol.serialization import (
+            GetChildren,
+            GetData,
+            MultiRead,
+        )
+        request = MultiRead([GetData('/a', None), GetChildren('/b', None)])
+        eq_(bytes(request.serialize()),
+            struct.pack('!iBi', 4, 0, -1) + _string('/a') + b'\0' +
+            struct.pack('!iBi', 8, 0, -1) + _string('/b') + b'\0' +
+            struct.pack('!iBi', -1, 1, -1))
+
+    def test_deserialize(self):
+        from kazoo.exceptions import NoNodeError
+        from kazoo.protocol.serialization import MultiRead
+        stat = tuple(range(11))
+        reply = (struct.pack('!iBi', 4, 0, 0) + struct.pack('!i', 4) +
+                 b'data' + struct.pack('!qqqqiiiqiiq', *stat) +
+                 struct.pack('!iBi', -1, 0, -101) + struct.pack('!i', -101) +
+                 struct.pack('!iBi', 8, 0, 0) + struct.pack('!i', 2) +
+                 _string('x') + _string('y') +
+                 struct.pack('!iBi', -1, 1, -1))
+        data, error, children = MultiRead.deserialize(memoryview(reply), 0)
+        eq_(data[0], b'data')
+        eq_(tuple(data[1]), stat)
+        assert isinstance(error, NoNodeError)
+        eq_(children, ['x', 'y'])
+
+    def test_deserialize_children(self):
+        from kazoo.protocol.serialization import MultiRead
+        lists = [[u'a', u'bb', u'ccc'], [u'n-01', u'n-02'], [u'\xe9'],
+                 [], [u'x', u'y']]
+        reply = b''
+        for names in lists:
+            reply += (struct.pack('!iBi', 8, 0, 0) +
+                      struct.pack('!i', len(names)) +
+                      b''.join(_string(name) for name in names))
+            # Binary data after each of them
+            reply += (struct.pack('!iBi', 4, 0, 0) + struct.pack('!i', 2) +
+                      b'\xff\xfe' + struct.pack('!qqqqiiiqiiq', *range(11)))
+        reply += struct.pack('!iBi', -1, 1, -1)
+        results = MultiRead.deserialize(memoryview(reply), 0)
+        eq_(results[::2], lists)
+        eq_([data for data, stat in results[1::2]], [b'\xff\xfe'] * 5)
+
+
+class TestStringVector(unittest.TestCase):
+    def _vector(self, names, trailer=b''):
+        return (struct.pack('!i', len(names)) +
+                b''.join(_string(name) for name in names) + trailer)
+
+    def _read(self, names, trailer=b''):
+        from kazoo.protocol.serialization import (
+            read_child_names,
+            read_string_vector,
+        )
+        buffer = memoryview(bytearray(b'xx' + self._vector(names, trailer)))
+        eager, offset = read_string_vector(buffer, 2)
+        lazy, lazy_offset = read_child_names(buffer, 2)
+        eq_(offset, len(buffer) - len(trailer))
+        eq_(lazy_offset, offset)
+        eq_(list(lazy), eager)
+        return eager, lazy
+
+    def test_same_length(self):
+        names = [u'entry-%010d' % i for i in range(100)]
+        eq_(self._read(names)[0], names)
+
+    def test_same_long_length(self):
+        from kazoo.protocol.serialization import GetChildren
+        # Length prefixes with bytes of 0x80 and above aren't UTF-8
+        for length in (128, 195, 200, 256, 0x8080):
+            names = [(u'%d-' % i).ljust(length, u'x') for i in range(3)]
+            eq_(self._read(names)[0], names)
+            eq_(GetChildren.deserialize(self._vector(names), 0), names)
+        names = [u'\xe9'.ljust(200, u'x'), u'a'.ljust(201, u'x')]
+        eq_(self._read(names)[0], names)
+
+    def test_invalid_utf8(self):
+        from kazoo.protocol.serialization import read_string_vector
+        buffer = struct.pack('!ii', 2, 1) + b'\xff' + _string(u'a')
+        assert_raises(UnicodeDecodeError, read_string_vector, buffer, 0)
+
+    def test_lengths(self):
+        names = [u'a', u'bb', u'', u'ccc' * 50]
+        eq_(self._read(names, b'\xff' * 68)[0], names)
+
+    def test_non_ascii(self):
+        names = [u'n\xf8de', u'\u4e2d\u6587', u'ascii']
+        eq_(self._read(names, b'\x80')[0], names)
+        names = [u'\xe9t\xe9', u'\xe0 la']
+        eq_(self._read(names)[0], names)
+
+    def test_followed_by_more(self):
+        from kazoo.protocol.serialization import (
+            read_child_names,
+            read_string_vector,
+        )
+        for names in ([u'n-1', u'n-2'], [u'a', u'bb'], [u'only'],
+                      [u'n-1', u'n-2', u'n-3x']):
+            buffer = memoryview(bytearray(
+                self._vector(names) + _string(u'next') * 3))
+            end = len(buffer) - len(_string(u'next')) * 3
+            eq_(read_string_vector(buffer, 0), (names, end))
+            lazy, offset = read_child_names(buffer, 0)
+            eq_((list(lazy), offset), (names, end))
+
+    def test_not_names(self):
+        from kazoo.protocol.serialization import read_string_vector
+        for strings in ([u'a/b', u'c'], [u'a', None]):
+            buffer = struct.pack('!i', 2) + b''.join(
+                _string(string) if string is not None
+                else struct.pack('!i', -1) for string in strings)
+            eq_(read_string_vector(buffer, 0), (strings, len(buffer)))
+
+    def test_empty(self):
+        from kazoo.protocol.serialization import read_string_vector
+        eq_(self._read([])[0], [])
+        eq_(read_string_vector(struct.pack('!i', -1), 0), ([], 4))
+
+    def test_get_children(self):
+        from kazoo.protocol.serialization import (
+            GetChildren2,
+            LazyGetChildren2,
+            stat_struct,
+        )
+        from kazoo.protocol.states import ChildNames
+        stat = stat_struct.pack(*range(1, 12))
+        buffer = self._vector([u'a', u'b'], stat)
+        children, znodestat = GetChildren2.deserialize(buffer, 0)
+        eq_(children, [u'a', u'b'])
+        eq_(znodestat.pzxid, 11)
+        children, znodestat = LazyGetChildren2.deserialize(buffer, 0)
+        assert isinstance(children, ChildNames)
+        eq_(children, [u'a', u'b'])
+        eq_(znodestat.pzxid, 11)
+
+
+class TestChildNames(unittest.TestCase):
+    def _makeOne(self, names):
+        from kazoo.protocol.serialization import read_child_names
+        return read_child_names(
+            struct.pack('!i', len(names)) +
+            b''.join(_string(name) for name in names), 0)[0]
+
+    def test_sequence(self):
+        names = self._makeOne([u'one', u'two', u'thr\xe9e', u'four'])
+        eq_(len(names), 4)
+        eq_(names[0], u'one')
+        eq_(names[-1], u'four')
+        eq_(names[1:3], [u'two', u'thr\xe9e'])
+        eq_(names.index(u'four'), 3)
+        self.assertRaises(IndexError, names.__getitem__, 4)
+        eq_(list(reversed(names)), [u'four', u'thr\xe9e', u'two', u'one'])
+        eq_(names, [u'one', u'two', u'thr\xe9e', u'four'])
+        assert names != [u'one']
+
+    def test_contains(self):
+        names = self._makeOne([u'ab', u'b', u'\xe9'])
+        assert u'ab' in names
+        assert u'b' in names
+        assert u'\xe9' in names
+        # Part of a name, or of a name and the next one's length
+        assert u'a' not in names
+        assert u'ab\x00' not in names
+        assert u'c' not in names
+
+    def test_same_length(self):
+        names = self._makeOne([u'n-%04d' % i for i in range(1000)])
+        eq_(names[999], u'n-0999')
+        eq_(names[-2], u'n-0998')
+        assert u'n-0500' in names
+        assert u'n-1000' not in names
+
+
+class TestCompactStat(unittest.TestCase):
+    def _stats(self):
+        from kazoo.protocol.serialization import (
+            read_compact_stat,
+            stat_struct,
+        )
+        from kazoo.protocol.states import ZnodeStat
+        values = (2 ** 40 + 1, 2 ** 40 + 2, 1500000000123, 1500000001456,
+                  3, 4, 5, 0, 6, 7, -8)
+        buffer = memoryview(bytearray(b'xx' + stat_struct.pack(*values)))
+        return ZnodeStat(*values), read_compact_stat(buffer, 2)
+
+    def test_fields(self):
+        stat, compact = self._stats()
+        for name in stat._fields:
+            eq_(getattr(compact, name), getattr(stat, name))
+        for name in ('acl_version', 'children_version', 'created',
+                     'last_modified', 'owner_session_id',
+                     'creation_transaction_id',
+                     'last_modified_transaction_id', 'data_length',
+                     'children_count'):
+            eq_(getattr(compact, name), getattr(stat, name))
+        eq_(compact.owner_session_id, None)
+
+    def test_tuple(self):
+        import pickle
+        stat, compact = self._stats()
+        eq_(len(compact), 11)
+        eq_(tuple(compact), tuple(stat))
+        eq_(compact[4], 3)
+        eq_(compact[-1], -8)
+        eq_(compact, stat)
+        eq_(stat, compact)
+        eq_(hash(compact), hash(stat))
+        assert not compact != stat
+        assert compact != stat._replace(version=4)
+        eq_(compact.to_znodestat(), stat)
+        eq_(pickle.loads(pickle.dumps(compact)), compact)
+        eq_(repr(compact), repr(stat).replace('ZnodeStat', 'CompactStat'))
+
+    def test_wrong_size(self):
+        from kazoo.protocol.states import CompactStat
+        self.assertRaises(ValueError, CompactStat, b'\x00' * 67)
+
+    def test_deserialize_compact(self):
+        from kazoo.protocol.serialization import (
+            Exists,
+            GetChildren2,
+            GetData,
+            LazyGetChildren2,
+            SetData,
+        )
+        stat, compact = self._stats()
+        raw = compact._data
+        eq_(Exists.deserialize_compact(raw, 0), stat)
+        eq_(Exists.deserialize_compact(b'\xff' * 68, 0), None)
+        eq_(SetData.deserialize_compact(raw, 0), stat)
+        reply = _string(u'value') + raw
+        eq_(GetData.deserialize_compact(reply, 0), (b'value', stat))
+        data, view_stat = GetData.deserialize_view(
+            memoryview(reply), 0, compact=True)
+        eq_(data.tobytes(), b'value')
+        eq_(view_stat._data, raw)
+        reply = struct.pack('!i', 1) + _string(u'child') + raw
+        for request in (GetChildren2, LazyGetChildren2):
+            children, child_stat = request.deserialize_compact(reply, 0)
+            eq_(list(children), [u'child'])
+            eq_(child_stat._data, raw)
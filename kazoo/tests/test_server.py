@@ -0,0 +1,192 @@
+import socket
+import threading
+import unittest
+
+from nose.tools import eq_
+
+from kazoo.client import KazooClient
+from kazoo.exceptions import (
+    NoAuthError,
+    NoNodeError,
+    NotReadOnlyCallError,
+    RolledBackError,
+    RuntimeInconsistency,
+)
+from kazoo.protocol.states import KazooState, KeeperState
+from kazoo.security import ACL, Id, Permissions, make_digest_acl
+from kazoo.testing.server import StandInCluster, StandInZooKeeper
+from kazoo.tests.util import wait
+
+
+class TestStandInZooKeeper(unittest.TestCase):
+    def setUp(self):
+        self.server = StandInZooKeeper()
+        self.server.run()
+        self._clients = []
+
+    def tearDown(self):
+        for client in self._clients:
+            client.stop()
+            client.close()
+        self.server.destroy()
+
+    def _client(self, **kwargs):
+        client = KazooClient(self.server.address, **kwargs)
+        client.start()
+        self._clients.append(client)
+        return client
+
+    def _command(self, command):
+        sock = socket.create_connection(('127.0.0.1',
+                                         self.server.client_port))
+        try:
+            sock.sendall(command)
+            data = b''
+            while True:
+                chunk = sock.recv(1024)
+                if not chunk:
+                    return data.decode('utf-8')
+                data += chunk
+        finally:
+            sock.close()
+
+    def test_four_letter_words(self):
+        eq_(self._command(b'ruok'), 'imok')
+        eq_(self._command(b'isro'), 'rw')
+        assert 'Mode: standalone' in self._command(b'srvr')
+        eq_(self._client().server_version(), (3, 6, 0))
+
+    def test_stop_ends_threads(self):
+        client = self._client()
+        serving = [conn.thread for conn in self.server.connections]
+        acceptor = self.server._acceptor
+        eq_(len(serving), 1)
+        self.server.stop()
+        assert not acceptor.is_alive()
+        assert not serving[0].is_alive()
+        assert self.server.ensemble._reaper is None
+        client.stop()
+
+    def test_port_kept(self):
+        port = self.server.client_port
+        assert port
+        self.server.stop()
+        assert not self.server.running
+        self.server.run()
+        eq_(self.server.client_port, port)
+
+    def test_sequence_and_ephemeral(self):
+        client = self._client()
+        client.create('/seq')
+        eq_(client.create('/seq/n-', sequence=True), '/seq/n-0000000000')
+        client.create('/seq/other')
+        eq_(client.create('/seq/n-', sequence=True, ephemeral=True),
+            '/seq/n-0000000002')
+        eq_(client.exists('/seq/n-0000000002').ephemeralOwner,
+            client.client_id[0])
+
+        client.stop()
+        eq_(sorted(self._client().get_children('/seq')),
+            ['n-0000000000', 'other'])
+
+    def test_failed_transaction(self):
+        client = self._client()
+        t = client.transaction()
+        t.create('/fine')
+        t.delete('/missing')
+        t.create('/later')
+        results = t.commit()
+        eq_([type(r) for r in results],
+            [RolledBackError, NoNodeError, RuntimeInconsistency])
+        eq_(client.exists('/fine'), None)
+
+    def test_watch_before_reply(self):
+        client = self._client()
+        other = self._client()
+        events = []
+
+        def watch(event):
+            events.append(event)
+
+        client.exists('/watched', watch=watch)
+        other.create('/watched')
+        # The event reaches the client before the reply to a read sent
+        # after the change
+        client.sync('/')
+        wait(lambda: events)
+        eq_([(e.type, e.path) for e in events], [('CREATED', '/watched')])
+
+    def test_acls(self):
+        acl = make_digest_acl('user', 'secret', all=True)
+        client = self._client(auth_data=[('digest', 'user:secret')])
+        client.create('/private', b'data', acl=[acl])
+        eq_(client.get('/private')[0], b'data')
+        self.assertRaises(NoAuthError, self._client().get, '/private')
+
+        client.create('/local', acl=[ACL(Permissions.READ,
+                                         Id('ip', '127.0.0.0/8'))])
+        self._client().get('/local')
+
+    def test_too_large(self):
+        client = self._client()
+        lost = threading.Event()
+
+        @client.add_listener
+        def listener(state):
+            if state == KazooState.SUSPENDED:
+                lost.set()
+
+        client.create_async('/large', b'a' * 0x100000)
+        lost.wait(5)
+        assert lost.is_set()
+
+    def test_session_expiry(self):
+        client = self._client()
+        client.create('/gone', ephemeral=True)
+        session_id = client.client_id[0]
+        with self.server.ensemble.lock:
+            session = self.server.ensemble.sessions[session_id]
+            session.expires = 0
+        wait(lambda: client.client_state == KeeperState.CONNECTED and
+             client.client_id[0] != session_id)
+        eq_(client.exists('/gone'), None)
+
+
+class TestStandInCluster(unittest.TestCase):
+    def setUp(self):
+        self.cluster = StandInCluster(port_offset=0)
+        self.cluster.start()
+
+    def tearDown(self):
+        self.cluster.terminate()
+
+    def test_shared_data(self):
+        first = KazooClient(self.cluster[0].address)
+        second = KazooClient(self.cluster[1].address)
+        first.start()
+        second.start()
+        try:
+            first.create('/shared', b'value')
+            eq_(second.get('/shared')[0], b'value')
+        finally:
+            first.stop()
+            second.stop()
+
+    def test_no_quorum(self):
+        client = KazooClient(self.cluster[0].address, read_only=True)
+        client.start()
+        try:
+            client.create('/node')
+            self.cluster[1].stop()
+            self.cluster[2].stop()
+            wait(lambda: client.client_state == KeeperState.CONNECTED_RO)
+            eq_(client.get_children('/'), ['node'])
+            self.assertRaises(NotReadOnlyCallError, client.create, '/other')
+
+            self.cluster[1].run()
+            client.stop()
+            client.start()
+            eq_(client.client_state, KeeperState.CONNECTED)
+            client.create('/other')
+        finally:
+            client.stop()
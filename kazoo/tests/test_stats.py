@@ -0,0 +1,72 @@
+import unittest
+
+from nose.tools import eq_
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def _makeOne(self, latencies=()):
+        from kazoo.protocol.stats import LatencyHistogram
+        histogram = LatencyHistogram()
+        for latency in latencies:
+            histogram.add(latency)
+        return histogram
+
+    def test_empty(self):
+        histogram = self._makeOne()
+        eq_(histogram.count, 0)
+        eq_(histogram.max, 0.0)
+        eq_(histogram.percentile(50), None)
+
+    def test_percentiles(self):
+        from kazoo.protocol.stats import LATENCY_BUCKETS
+        histogram = self._makeOne([0.001] * 98 + [0.1, 0.5])
+        eq_(histogram.count, 100)
+        eq_(histogram.max, 0.5)
+        p50 = histogram.percentile(50)
+        assert p50 in LATENCY_BUCKETS
+        assert 0.001 <= p50 < 0.001 * 1.19
+        eq_(histogram.percentile(99), histogram.percentile(98.5))
+        assert 0.1 <= histogram.percentile(99) < 0.1 * 1.19
+        eq_(histogram.percentile(100), 0.5)
+
+    def test_capped_at_max(self):
+        histogram = self._makeOne([0.0011])
+        eq_(histogram.percentile(50), 0.0011)
+
+    def test_tiny_and_huge(self):
+        from kazoo.protocol.stats import LATENCY_BUCKETS
+        histogram = self._makeOne([0, 1e-9, 3600])
+        eq_(histogram.counts[0], 2)
+        eq_(histogram.counts[-1], 1)
+        eq_(histogram.percentile(50), LATENCY_BUCKETS[0])
+        eq_(histogram.percentile(99), 3600)
+
+
+class TestConnectionStats(unittest.TestCase):
+    def _makeOne(self):
+        from kazoo.protocol.stats import ConnectionStats
+        return ConnectionStats()
+
+    def test_record(self):
+        from kazoo.protocol.serialization import Exists, GetData
+        from kazoo.protocol.stats import now
+        stats = self._makeOne()
+        started = now()
+        stats.record(GetData('/a', None), started)
+        stats.record(GetData('/b', None), started, error=True)
+        stats.record(Exists('/a', None), started)
+        stats.connections = 3
+
+        snapshot = stats.snapshot()
+        eq_(sorted(snapshot['ops']), ['Exists', 'GetData'])
+        get = snapshot['ops']['GetData']
+        eq_(get['count'], 2)
+        eq_(get['errors'], 1)
+        assert 0 <= get['p50'] <= get['p99'] <= get['max']
+        eq_(snapshot['connections'], 3)
+        eq_(snapshot['reconnects'], 2)
+
+    def test_no_connections(self):
+        snapshot = self._makeOne().snapshot()
+        eq_(snapshot['ops'], {})
+        eq_(snapshot['reconnects'], 0)
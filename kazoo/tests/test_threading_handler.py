@@ -1,11 +1,16 @@
+import socket
 import threading
+import time
 import unittest
 
 import mock
+from nose import SkipTest
 from nose.tools import assert_raises
 from nose.tools import eq_
 from nose.tools import raises
 
+from kazoo.tests.util import wait
+
 
 class TestThreadingHandler(unittest.TestCase):
     def _makeOne(self, *args):
@@ -46,6 +51,221 @@ class TestThreadingHandler(unittest.TestCase):
         h.stop()
         self.assertFalse(h._running)
 
+    def _watch_callback(self, func, path):
+        from kazoo.protocol.states import Callback, EventType, WatchedEvent
+        event = WatchedEvent(EventType.CHANGED, None, path)
+        return Callback('watch', func, (event,))
+
+    def test_callback_workers_order(self):
+        h = self._makeOne(4)
+        h.start()
+        try:
+            events = []
+            done = threading.Event()
+
+            def watch(event):
+                events.append(event.path)
+                if len(events) == 40:
+                    done.set()
+            paths = ['/a', '/b', '/c', '/d']
+            for i in range(10):
+                for path in paths:
+                    h.dispatch_callback(self._watch_callback(watch, path))
+            done.wait(10)
+            eq_(len(events), 40)
+            for path in paths:
+                eq_(events.count(path), 10)
+        finally:
+            h.stop()
+
+    def test_callback_workers_parallel(self):
+        h = self._makeOne(2)
+        h.start()
+        try:
+            release = threading.Event()
+            fast = threading.Event()
+            # two paths landing on different workers
+            paths = ['/%s' % i for i in range(20)]
+            slow_path = paths[0]
+            fast_path = [p for p in paths
+                         if hash(p) % 2 != hash(slow_path) % 2][0]
+            h.dispatch_callback(self._watch_callback(
+                lambda event: release.wait(10), slow_path))
+            h.dispatch_callback(self._watch_callback(
+                lambda event: fast.set(), fast_path))
+            fast.wait(5)
+            assert fast.is_set()
+            stats = h.callback_stats()
+            eq_(sum(stats['queue_depths']), 0)
+            release.set()
+        finally:
+            h.stop()
+
+    def test_callback_stats(self):
+        h = self._makeOne()
+        h.start()
+        try:
+            done = threading.Event()
+            h.dispatch_callback(self._watch_callback(
+                lambda event: time.sleep(0.05), '/slow'))
+            h.dispatch_callback(self._watch_callback(
+                lambda event: done.set(), '/fast'))
+            done.wait(5)
+            # the last one is timed once it returns
+            wait(lambda: len(h.callback_stats()['slowest']) == 2)
+            slowest = h.callback_stats()['slowest']
+            eq_(slowest[0][2], '/slow')
+            assert slowest[0][0] >= 0.04
+        finally:
+            h.stop()
+
+    def test_callback_workers_invalid(self):
+        assert_raises(ValueError, self._makeOne, 0)
+
+    def test_select(self):
+        h = self._makeOne()
+        r, w = h.create_socket_pair()
+        try:
+            eq_(h.select([r], [w], [], 0), ([], [w], []))
+            w.send(b'\0')
+            eq_(h.select([r, w], [r, w], [], 1), ([r], [r, w], []))
+        finally:
+            r.close()
+            w.close()
+
+    def test_select_high_fd(self):
+        from kazoo.handlers import utils
+        if not utils.HAS_POLL:
+            raise SkipTest('select.select is the only way to wait here')
+        try:
+            import resource
+        except ImportError:
+            raise SkipTest('Can\'t check the limit of open files')
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY and soft < 1200:
+            if hard != resource.RLIM_INFINITY and hard < 1200:
+                raise SkipTest('Not allowed to open enough sockets')
+            resource.setrlimit(resource.RLIMIT_NOFILE, (1200, hard))
+        h = self._makeOne()
+        # keep enough sockets open that the pair lands past FD_SETSIZE
+        # where select.select gives up
+        socks = []
+        try:
+            for i in range(520):
+                socks.extend(h.create_socket_pair())
+            r, w = socks[-2:]
+            assert r.fileno() >= 1024
+            w.send(b'\0')
+            eq_(h.select([r], [], [], 1)[0], [r])
+            selector = h.selector_object()
+            selector.register(r)
+            eq_(selector.select(1), [r])
+            selector.close()
+        finally:
+            for sock in socks:
+                sock.close()
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+    @mock.patch('kazoo.handlers.utils.selectors', None)
+    def test_select_poll(self):
+        # Without the selectors module, as on Python 2
+        self.test_select()
+        self.test_selector_object()
+
+    @mock.patch('kazoo.handlers.utils.selectors', None)
+    def test_select_high_fd_poll(self):
+        self.test_select_high_fd()
+
+    def test_selector_object(self):
+        h = self._makeOne()
+        r1, w1 = h.create_socket_pair()
+        r2, w2 = h.create_socket_pair()
+        selector = h.selector_object()
+        try:
+            selector.register(r1)
+            selector.register(r2)
+            eq_(selector.select(0), [])
+
+            # ready sockets come back in registration order
+            w2.send(b'\0')
+            w1.send(b'\0')
+            eq_(selector.select(1), [r1, r2])
+            r1.recv(1)
+            eq_(selector.select(1), [r2])
+        finally:
+            selector.close()
+            for sock in (r1, w1, r2, w2):
+                sock.close()
+
+    def test_select_selector_fallback(self):
+        from kazoo.handlers.utils import SelectSelector
+        select = mock.Mock(return_value=([1], [], []))
+        selector = SelectSelector(select)
+        selector.register(1)
+        selector.register(2)
+        eq_(selector.select(3), [1])
+        select.assert_called_once_with([1, 2], [], [], 3)
+
+
+class TestCreateFirstConnection(unittest.TestCase):
+    def setUp(self):
+        from kazoo.tests.util import Blackhole
+        self.blackhole = Blackhole()
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(5)
+        self.live = self.listener.getsockname()
+        # nothing listens there anymore
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        self.closed = closed.getsockname()
+        closed.close()
+
+    def tearDown(self):
+        self.blackhole.close()
+        self.listener.close()
+
+    def _connect(self, addresses, timeout=5, stagger=0.05):
+        from kazoo.handlers.threading import SequentialThreadingHandler
+        h = SequentialThreadingHandler()
+        return h.create_first_connection(addresses, timeout, stagger)
+
+    def test_unresponsive_first(self):
+        start = time.time()
+        sock, address = self._connect([self.blackhole.address, self.live])
+        sock.close()
+        eq_(address, self.live)
+        assert time.time() - start < 2
+
+    def test_refused_first(self):
+        # no waiting for the stagger after a refused connection
+        start = time.time()
+        sock, address = self._connect([self.closed, self.live], stagger=5)
+        sock.close()
+        eq_(address, self.live)
+        assert time.time() - start < 2
+
+    def test_first_wins(self):
+        other = socket.socket()
+        other.bind(('127.0.0.1', 0))
+        other.listen(5)
+        try:
+            sock, address = self._connect([self.live, other.getsockname()])
+            sock.close()
+            eq_(address, self.live)
+            # the second one was never tried
+            other.settimeout(0)
+            self.assertRaises(socket.error, other.accept)
+        finally:
+            other.close()
+
+    def test_all_unresponsive(self):
+        assert_raises(socket.timeout, self._connect,
+                      [self.blackhole.address], timeout=0.2)
+
+    def test_all_refused(self):
+        assert_raises(socket.error, self._connect, [self.closed])
+
 
 class TestThreadingAsync(unittest.TestCase):
     def _makeOne(self, *args):
@@ -175,6 +395,55 @@ class TestThreadingAsync(unittest.TestCase):
         eq_(lst, [True])
         th.join()
 
+    def test_wait_when_ready(self):
+        mock_handler = mock.Mock()
+        result = self._makeOne(mock_handler)
+        result.set("fred")
+        start = time.time()
+        eq_(result.wait(10), True)
+        assert time.time() - start < 5
+
+    def test_lock_per_handler(self):
+        handler = self._makeHandler()
+        other = self._makeHandler()
+        first, second = handler.async_result(), handler.async_result()
+        assert first._lock is second._lock
+        assert other.async_result()._lock is not first._lock
+        assert self._makeOne(mock.Mock())._lock is not first._lock
+
+    def test_event_only_when_blocking(self):
+        mock_handler = mock.Mock()
+        result = self._makeOne(mock_handler)
+        result.set("fred")
+        eq_(result.get(), "fred")
+        eq_(result._event, None)
+
+        result = self._makeOne(mock_handler)
+        timeout = self._makeHandler().timeout_exception
+        assert_raises(timeout, result.get, timeout=0.01)
+        assert result._event is not None
+
+    def test_callbacks_batched(self):
+        mock_handler = mock.Mock()
+        result = self._makeOne(mock_handler)
+        lst = []
+
+        def fail(r):
+            raise ValueError()
+
+        result.rawlink(fail)
+        result.rawlink(lambda r: lst.append(r.get()))
+        result.set("fred")
+        eq_(mock_handler.completion_queue.put.call_count, 1)
+        mock_handler.completion_queue.put.call_args[0][0]()
+        eq_(lst, ["fred"])
+
+    def test_no_callbacks_not_queued(self):
+        mock_handler = mock.Mock()
+        result = self._makeOne(mock_handler)
+        result.set_exception(ImportError())
+        assert not mock_handler.completion_queue.put.called
+
     def test_set_before_wait(self):
         mock_handler = mock.Mock()
         async = self._makeOne(mock_handler)
@@ -2,6 +2,7 @@ import time
 import threading
 import uuid
 
+import mock
 from nose.tools import eq_
 from nose.tools import raises
 
@@ -129,6 +130,45 @@ class KazooDataWatcherTests(KazooTestCase):
         update.wait(25)
         eq_(data[0], b'fred')
 
+    def test_datawatch_no_read_after_reconnect(self):
+        update = threading.Event()
+        data = []
+
+        @self.client.DataWatch(self.path)
+        def changed(d, stat):
+            data.append(d)
+            update.set()
+
+        update.wait(10)
+        update.clear()
+        with mock.patch.object(self.client, 'get',
+                               wraps=self.client.get) as get:
+            self.lose_connection(threading.Event)
+            time.sleep(0.5)
+            # The watch was set again by the client
+            eq_(get.call_count, 0)
+            self.client.set(self.path, b'fred')
+            update.wait(10)
+        eq_(data[-1], b'fred')
+
+    def test_datawatch_reads_after_interrupted_read(self):
+        update = threading.Event()
+
+        def changed(d, stat):
+            update.set()
+        watch = self.client.DataWatch(self.path, changed)
+        update.wait(10)
+        with mock.patch.object(self.client, 'get',
+                               wraps=self.client.get) as get:
+            # As if the connection was lost during a read
+            watch._reading = True
+            self.lose_connection(threading.Event)
+            watch._reading = False
+            deadline = time.time() + 10
+            while not get.called and time.time() < deadline:
+                time.sleep(0.05)
+            assert get.called
+
     def test_func_stops(self):
         update = threading.Event()
         data = [True]
@@ -396,6 +436,45 @@ class KazooChildrenWatcherTests(KazooTestCase):
         update.wait(20)
         eq_(sorted(all_children), ['george', 'smith'])
 
+    def test_child_watch_no_read_after_reconnect(self):
+        update = threading.Event()
+        all_children = []
+
+        @self.client.ChildrenWatch(self.path)
+        def changed(children):
+            all_children.append(children)
+            update.set()
+
+        update.wait(10)
+        update.clear()
+        with mock.patch.object(self.client, 'get_children',
+                               wraps=self.client.get_children) as get:
+            self.lose_connection(threading.Event)
+            time.sleep(0.5)
+            # The watch was set again by the client
+            eq_(get.call_count, 0)
+            self.client.create(self.path + '/smith')
+            update.wait(10)
+        eq_(all_children[-1], ['smith'])
+
+    def test_child_watch_reads_after_interrupted_read(self):
+        update = threading.Event()
+
+        def changed(children):
+            update.set()
+        watch = self.client.ChildrenWatch(self.path, changed)
+        update.wait(10)
+        with mock.patch.object(self.client, 'get_children',
+                               wraps=self.client.get_children) as get:
+            # As if the connection was lost during a read
+            watch._reading = True
+            self.lose_connection(threading.Event)
+            watch._reading = False
+            deadline = time.time() + 10
+            while not get.called and time.time() < deadline:
+                time.sleep(0.05)
+            assert get.called
+
     def test_child_stop_on_session_loss(self):
         update = threading.Event()
         all_children = ['fred']
@@ -14,6 +14,7 @@
 
 import logging
 import os
+import socket
 import time
 
 TRAVIS = os.environ.get('TRAVIS', False)
@@ -75,6 +76,31 @@ class InstalledHandler(Handler):
         self.install()
 
 
+class Blackhole(object):
+    """A local address that never accepts connections
+
+    Its listen backlog is kept full, so connecting to it hangs until the
+    attempt times out, like connecting to a host that went away.
+
+    """
+    def __init__(self):
+        self._listener = socket.socket()
+        self._listener.bind(('127.0.0.1', 0))
+        self._listener.listen(0)
+        self.address = self._listener.getsockname()
+        self._fillers = []
+        for i in range(3):
+            sock = socket.socket()
+            sock.setblocking(0)
+            sock.connect_ex(self.address)
+            self._fillers.append(sock)
+
+    def close(self):
+        for sock in self._fillers:
+            sock.close()
+        self._listener.close()
+
+
 class Wait(object):
 
     class TimeOutWaitingFor(Exception):